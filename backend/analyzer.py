@@ -1,63 +1,119 @@
-import pandas as pd
-from datetime import datetime, date, timedelta
-from typing import List, Dict, Tuple
-from collections import Counter, defaultdict
+import os
+import time
+import numpy as np
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
 from database import db_manager
+from incremental import IncrementalStats, RECENT_WINDOW
+from draw_matrix import DrawMatrix
+from metrics import timed
+from logging_config import get_logger
+from combinations import (top_combinations, pair_deviation_matrix, COMBINATION_MAX_OVERLAP,
+                          COMBINATION_PAIR_PENALTY, PICK_COUNT)
+
+# 號碼共現因子在避免號碼評分中的權重（0 表示不使用）
+PAIR_WEIGHT = float(os.getenv("ANALYSIS_PAIR_WEIGHT", "0"))
+# 推薦組合的產生方式：slices 依號碼分數排序切片（預設，毫秒級）；
+# combinations 評分全部 C(38,6) 組並限制重疊，每次分析約需 1 秒 CPU
+SET_SELECTION = os.getenv("ANALYSIS_SET_SELECTION", "slices")
+
+logger = get_logger("analyzer")
 
 class LotteryAnalyzer:
     def __init__(self):
         self.number_range = range(1, 39)  # 威力彩號碼範圍 1-38
         self.special_range = range(1, 9)  # 特別號範圍 1-8
+        self.pair_weight = PAIR_WEIGHT
+        self.set_selection = SET_SELECTION
+        self.trend_periods = RECENT_WINDOW  # 趨勢分析期數（ANALYSIS_TREND_PERIODS）
     
-    def analyze_avoid_numbers(self, analysis_periods: int = None) -> Dict:
+    def analyze_avoid_numbers(self, analysis_periods: int = None, full_recompute: bool = False) -> Dict:
         """分析並產生避免號碼推薦"""
-        if analysis_periods is None:
-            # 使用所有可用的資料
-            draws = db_manager.get_all_draws()
-            print(f"開始分析所有 {len(draws)} 期的歷史資料...")
+        started = time.perf_counter()
+        if analysis_periods is None and not full_recompute:
+            # 使用增量狀態，不必重新掃描全部歷史資料
+            with timed("analysis.load_state"):
+                stats = db_manager.get_analysis_state()
+                if stats is None:
+                    logger.info("增量分析狀態不存在或已過期，重新建立")
+                    stats = db_manager.rebuild_analysis_state()
+            
+            if stats.total_draws < 3:
+                logger.warning("歷史資料不足，無法進行分析", extra={'total_draws': stats.total_draws})
+                return None
+            
+            mode = 'incremental'
+            with timed("analysis.from_state"):
+                frequency_analysis, gap_analysis, trend_analysis, special_analysis = self._analyze_from_state(stats)
+                pair_counts = np.array(stats.pair_counts)[1:, 1:]
+            latest_period = stats.latest_period
+            total_periods = stats.total_draws
         else:
-            # 使用指定期數的資料
-            draws = db_manager.get_all_draws(limit=analysis_periods)
-            print(f"開始分析最近 {analysis_periods} 期的資料...")
-        
-        if len(draws) < 3:
-            print("歷史資料不足，無法進行分析")
-            return None
-        
-        print(f"實際分析 {len(draws)} 期資料")
-        
-        # 建立資料框架
-        df = self._create_dataframe(draws)
-        
-        # 進行各項分析
-        frequency_analysis = self._analyze_frequency(df)
-        gap_analysis = self._analyze_gaps(df)
-        trend_analysis = self._analyze_trends(df)
-        
-        # 計算綜合評分
-        avoid_numbers = self._calculate_avoid_scores(
-            frequency_analysis, gap_analysis, trend_analysis
-        )
-        
-        # 計算可能開出的號碼
-        likely_numbers = self._calculate_likely_scores(
-            frequency_analysis, gap_analysis, trend_analysis
-        )
-        
-        # 分析特別號
-        special_analysis = self._analyze_special_numbers(df)
+            with timed("analysis.load_draws"):
+                if analysis_periods is None:
+                    # 使用所有可用的資料
+                    draws = db_manager.get_all_draws()
+                else:
+                    # 使用指定期數的資料
+                    draws = db_manager.get_all_draws(limit=analysis_periods)
+            
+            if len(draws) < 3:
+                logger.warning("歷史資料不足，無法進行分析", extra={'total_draws': len(draws)})
+                return None
+            
+            mode = 'full' if analysis_periods is None else 'window'
+            
+            # 建立開獎矩陣
+            with timed("analysis.create_matrix"):
+                matrix = self._create_matrix(draws)
+            
+            # 進行各項分析
+            with timed("analysis.frequency"):
+                frequency_analysis = self._analyze_frequency(matrix)
+            with timed("analysis.gaps"):
+                gap_analysis = self._analyze_gaps(matrix)
+            with timed("analysis.trends"):
+                trend_analysis = self._analyze_trends(matrix)
+            with timed("analysis.special"):
+                special_analysis = self._analyze_special_numbers(matrix)
+            with timed("analysis.pairs"):
+                pair_counts = matrix.pair_counts()
+            latest_period = matrix.latest_period
+            total_periods = len(draws)
+            
+            if analysis_periods is None:
+                # 完整重算時以已載入的資料一併重建增量狀態（get_all_draws 依期數遞減）
+                with timed("analysis.rebuild_state"):
+                    db_manager.rebuild_analysis_state(draws[::-1])
+        
+        with timed("analysis.scoring"):
+            # 計算綜合評分（共現因子為選用）
+            pair_scores = self._pair_avoid_scores(pair_counts) if self.pair_weight else None
+            pair_matrix = pair_deviation_matrix(pair_counts, total_periods)
+            avoid_numbers = self._calculate_avoid_scores(
+                frequency_analysis, gap_analysis, trend_analysis, pair_scores, pair_matrix
+            )
+            
+            # 計算可能開出的號碼
+            likely_numbers = self._calculate_likely_scores(
+                frequency_analysis, gap_analysis, trend_analysis, pair_matrix
+            )
         
         # 儲存分析結果（只儲存第一組作為主要推薦）
-        latest_draw = draws[0] if draws else None
-        if latest_draw:
+        with timed("analysis.save_result"):
             db_manager.save_analysis_result(
-                period=latest_draw.period,
+                period=latest_period,
                 avoid_numbers=avoid_numbers[0],  # 只儲存第一組作為主要推薦
                 frequency_data=frequency_analysis,
                 gap_analysis=gap_analysis,
-                total_periods=len(draws)
+                total_periods=total_periods
             )
         
+        logger.info("分析完成", extra={
+            'mode': mode, 'window': analysis_periods, 'total_periods': total_periods,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        })
+        
         return {
             'avoid_number_sets': avoid_numbers,
             'likely_number_sets': likely_numbers,
@@ -65,36 +121,59 @@ class LotteryAnalyzer:
             'gap_analysis': gap_analysis,
             'special_analysis': special_analysis,
             'trend_analysis': trend_analysis,
-            'total_periods': len(draws),
+            'total_periods': total_periods,
             'analysis_date': datetime.now().isoformat()
         }
     
-    def _create_dataframe(self, draws) -> pd.DataFrame:
-        """將開獎資料轉換為 pandas DataFrame"""
-        data = []
-        for draw in draws:
-            for number in draw.numbers:
-                data.append({
-                    'period': draw.period,
-                    'date': draw.draw_date,
-                    'number': number,
-                    'special_number': draw.special_number
-                })
-        
-        return pd.DataFrame(data)
+    def _analyze_from_state(self, stats: IncrementalStats) -> Tuple[Dict, Dict, Dict, Dict]:
+        """由增量狀態產生與完整分析相同格式的結果"""
+        total_periods = stats.total_draws
+        frequency_analysis = self._build_frequency(stats.counts[1:], total_periods)
+        gap_analysis = self._build_gaps(
+            stats.counts[1:], stats.last_seen[1:], stats.last_seen_period[1:], total_periods,
+            stats.gap_sum[1:], stats.gap_count[1:], stats.gap_max[1:]
+        )
+        # 環狀緩衝區即為最近期數
+        trend_analysis = self._build_trends(stats.recent_counts[1:], min(stats.window, total_periods))
+        special_analysis = self._build_special(stats.special_counts[1:], stats.special_last_seen[1:])
+        return frequency_analysis, gap_analysis, trend_analysis, special_analysis
+    
+    def _create_matrix(self, draws) -> DrawMatrix:
+        """將開獎資料轉換為 N x 38 開獎矩陣"""
+        return DrawMatrix.from_draws(draws)
     
-    def _analyze_frequency(self, df: pd.DataFrame) -> Dict:
+    def _analyze_frequency(self, matrix: DrawMatrix) -> Dict:
         """分析號碼出現頻率"""
-        total_periods = df['period'].nunique()
-        
-        # 計算每個號碼的出現次數
-        frequency_count = df['number'].value_counts().to_dict()
+        return self._build_frequency(matrix.counts(), matrix.total_draws)
+    
+    def _analyze_gaps(self, matrix: DrawMatrix) -> Dict:
+        """分析號碼間隔期數"""
+        last_seen = matrix.last_seen()
+        last_seen_period = [matrix.periods[index] if index >= 0 else None for index in last_seen]
+        gap_sum, gap_count, gap_max = matrix.gap_stats()
+        return self._build_gaps(
+            matrix.counts(), last_seen, last_seen_period, matrix.total_draws,
+            gap_sum, gap_count, gap_max
+        )
+    
+    def _analyze_trends(self, matrix: DrawMatrix, trend_periods: Optional[int] = None) -> Dict:
+        """分析號碼趨勢"""
+        recent_periods = min(trend_periods or self.trend_periods, matrix.total_draws)  # 根據實際資料調整分析期數
+        return self._build_trends(matrix.window_counts(recent_periods), recent_periods)
+    
+    def _build_frequency(self, counts, total_periods: int) -> Dict:
+        """由各號碼出現次數（索引 0 對應號碼 1）產生頻率分析"""
+        # 計算每個號碼的出現次數（只列出有出現的號碼，次數多的在前）
+        frequency_count = {
+            number: int(counts[number - 1])
+            for number in sorted(self.number_range, key=lambda n: -counts[n - 1])
+            if counts[number - 1] > 0
+        }
         
         # 計算頻率百分比
         frequency_percent = {}
         for number in self.number_range:
-            count = frequency_count.get(number, 0)
-            frequency_percent[number] = round(count / total_periods * 100, 2)
+            frequency_percent[number] = round(int(counts[number - 1]) / total_periods * 100, 2)
         
         # 找出最少出現的號碼
         min_frequency = min(frequency_percent.values())
@@ -107,37 +186,32 @@ class LotteryAnalyzer:
             'total_periods': total_periods
         }
     
-    def _analyze_gaps(self, df: pd.DataFrame) -> Dict:
-        """分析號碼間隔期數"""
-        periods = sorted(df['period'].unique(), reverse=True)
+    def _build_gaps(self, counts, last_seen, last_seen_period, total_periods: int,
+                    gap_sum, gap_count, gap_max) -> Dict:
+        """由各號碼最後出現的期序與間隔歷史產生間隔分析（以期序計算，不受跨年度期數影響）"""
         gap_data = {}
         
         for number in self.number_range:
-            # 找到該號碼出現的所有期數
-            number_periods = df[df['number'] == number]['period'].tolist()
-            number_periods = sorted(number_periods, reverse=True)
+            index = number - 1
+            last_index = int(last_seen[index])
             
-            if number_periods:
-                # 計算距離最新期的間隔
-                latest_period = periods[0]
-                last_appeared = number_periods[0]
-                
-                # 簡單計算間隔（假設期數是連續的）
-                try:
-                    gap = int(latest_period) - int(last_appeared)
-                except ValueError:
-                    gap = 0
-                
+            if last_index >= 0:
+                # 距離最新一期的期序間隔
+                gap = total_periods - 1 - last_index
                 gap_data[number] = {
-                    'last_appeared': last_appeared,
-                    'gap_periods': max(0, gap),
-                    'total_appearances': len(number_periods)
+                    'last_appeared': last_seen_period[index],
+                    'gap_periods': gap,
+                    'total_appearances': int(counts[index]),
+                    'mean_gap': round(int(gap_sum[index]) / int(gap_count[index]), 2) if gap_count[index] else None,
+                    'max_gap': max(int(gap_max[index]), gap)
                 }
             else:
                 gap_data[number] = {
                     'last_appeared': None,
-                    'gap_periods': len(periods),  # 從未出現
-                    'total_appearances': 0
+                    'gap_periods': total_periods,  # 從未出現
+                    'total_appearances': 0,
+                    'mean_gap': None,
+                    'max_gap': total_periods
                 }
         
         # 找出間隔最久的號碼
@@ -150,34 +224,176 @@ class LotteryAnalyzer:
             'max_gap_periods': max_gap
         }
     
-    def _analyze_trends(self, df: pd.DataFrame) -> Dict:
-        """分析號碼趨勢"""
-        total_periods = len(df['period'].unique())
-        recent_periods = min(20, total_periods)  # 根據實際資料調整分析期數
-        periods = sorted(df['period'].unique(), reverse=True)[:recent_periods]
-        
-        recent_df = df[df['period'].isin(periods)]
-        
-        # 計算最近期數的出現頻率
-        recent_frequency = recent_df['number'].value_counts().to_dict()
+    def _build_trends(self, recent_counts, recent_periods: int) -> Dict:
+        """由最近期數的出現次數產生趨勢分析"""
+        recent_frequency = {
+            number: int(recent_counts[number - 1])
+            for number in sorted(self.number_range, key=lambda n: -recent_counts[n - 1])
+            if recent_counts[number - 1] > 0
+        }
         
         # 計算冷門號碼（根據資料量調整標準）
         cold_threshold = max(1, recent_periods // 10)  # 動態調整冷門標準
         cold_numbers = []
         for number in self.number_range:
-            count = recent_frequency.get(number, 0)
-            if count <= cold_threshold:
+            if recent_counts[number - 1] <= cold_threshold:
                 cold_numbers.append(number)
         
         return {
             'recent_frequency': recent_frequency,
             'cold_numbers': cold_numbers,
-            'analysis_periods': len(periods)
+            'analysis_periods': recent_periods
         }
     
-    def _calculate_avoid_scores(self, frequency_analysis: Dict, 
-                              gap_analysis: Dict, trend_analysis: Dict) -> List[List[int]]:
-        """計算綜合評分並推薦10組避免號碼"""
+    def analyze_windows(self, windows: List[Optional[int]], trend_periods: Optional[int] = None) -> Optional[Dict]:
+        """一次載入歷史資料，產生多個分析期數（None 表示全部）的頻率、趨勢與推薦號碼
+        
+        各期數的出現次數皆由同一份累積計數陣列相減取得，不必逐一重新載入與掃描。
+        """
+        trend_periods = trend_periods or self.trend_periods
+        if None in windows:
+            draws = db_manager.get_all_draws()
+        else:
+            draws = db_manager.get_all_draws(limit=max(max(windows), trend_periods))
+        
+        if len(draws) < 3:
+            logger.warning("歷史資料不足，無法進行分析", extra={'total_draws': len(draws)})
+            return None
+        
+        matrix = self._create_matrix(draws)
+        total_draws = matrix.total_draws
+        last_seen = matrix.last_seen()
+        no_gap_history = [0] * len(self.number_range)
+        
+        results = []
+        for window in windows:
+            total_periods = total_draws if window is None else min(window, total_draws)
+            start = total_draws - total_periods
+            counts = matrix.window_counts(total_periods)
+            
+            # 轉為分析期數內的相對位置，早於分析期數視為未出現
+            window_last_seen = np.where(last_seen >= start, last_seen - start, -1)
+            last_seen_period = [matrix.periods[index] if index >= start else None for index in last_seen]
+            gap_analysis = self._build_gaps(
+                counts, window_last_seen, last_seen_period, total_periods,
+                no_gap_history, no_gap_history, no_gap_history
+            )
+            
+            frequency_analysis = self._build_frequency(counts, total_periods)
+            recent_periods = min(trend_periods, total_periods)
+            trend_analysis = self._build_trends(matrix.window_counts(recent_periods), recent_periods)
+            
+            pair_counts = matrix.pair_counts(recent=total_periods)
+            pair_scores = self._pair_avoid_scores(pair_counts) if self.pair_weight else None
+            pair_matrix = pair_deviation_matrix(pair_counts, total_periods)
+            
+            results.append({
+                'window': window,
+                'total_periods': total_periods,
+                'frequency_analysis': frequency_analysis,
+                'trend_analysis': trend_analysis,
+                'avoid_number_sets': self._calculate_avoid_scores(
+                    frequency_analysis, gap_analysis, trend_analysis, pair_scores, pair_matrix
+                ),
+                'likely_number_sets': self._calculate_likely_scores(
+                    frequency_analysis, gap_analysis, trend_analysis, pair_matrix
+                )
+            })
+        
+        return {
+            'latest_period': matrix.latest_period,
+            'trend_periods': trend_periods,
+            'windows': results,
+            'analysis_date': datetime.now().isoformat()
+        }
+    
+    def analyze_pairs(self, window: Optional[int] = None, top_k: int = 10) -> Optional[Dict]:
+        """分析號碼兩兩共現次數，回傳最常與最少一起開出的號碼組合
+        
+        未指定 window 時直接使用增量狀態中的共現矩陣，不掃描歷史資料。
+        """
+        if window is None:
+            stats = db_manager.get_analysis_state()
+            if stats is None:
+                stats = db_manager.rebuild_analysis_state()
+            pair_counts = np.array(stats.pair_counts)[1:, 1:]
+            total_periods = stats.total_draws
+        else:
+            draws = db_manager.get_all_draws(limit=window)
+            matrix = self._create_matrix(draws)
+            pair_counts = matrix.pair_counts()
+            total_periods = matrix.total_draws
+        
+        if not total_periods:
+            return None
+        
+        # 只取上三角（不含對角線），每個組合一筆
+        first, second = np.triu_indices(len(self.number_range), k=1)
+        counts = pair_counts[first, second]
+        order = np.argsort(-counts, kind='stable')
+        
+        def to_pairs(indices) -> List[Dict]:
+            return [
+                {'numbers': [int(first[i]) + 1, int(second[i]) + 1], 'count': int(counts[i])}
+                for i in indices
+            ]
+        
+        return {
+            'window': window,
+            'total_periods': total_periods,
+            'most_common': to_pairs(order[:top_k]),
+            'least_common': to_pairs(order[::-1][:top_k])
+        }
+    
+    def _pair_avoid_scores(self, pair_counts: np.ndarray) -> Dict[int, float]:
+        """由共現矩陣計算共現分數（與其他號碼一起開出越少分數越高，0-20分）"""
+        off_diagonal = pair_counts.sum(axis=1) - np.diag(pair_counts)
+        strength = off_diagonal / (len(self.number_range) - 1)
+        spread = strength.max() - strength.min()
+        if spread == 0:
+            return {number: 0.0 for number in self.number_range}
+        normalized = (strength - strength.min()) / spread
+        return {number: float(20 * (1 - normalized[number - 1])) for number in self.number_range}
+    
+    def combination_inputs(self, likely: bool = False) -> Optional[Tuple[List[float], np.ndarray]]:
+        """最新增量狀態的各號碼分數（依號碼 1-38）與共現偏差矩陣，供 combinations.py 命令列使用"""
+        stats = db_manager.get_analysis_state()
+        if stats is None:
+            stats = db_manager.rebuild_analysis_state()
+        if stats.total_draws < 3:
+            return None
+        
+        frequency_analysis, gap_analysis, trend_analysis, _ = self._analyze_from_state(stats)
+        pair_counts = np.array(stats.pair_counts)[1:, 1:]
+        if likely:
+            scores = self._likely_number_scores(frequency_analysis, gap_analysis, trend_analysis)
+        else:
+            pair_scores = self._pair_avoid_scores(pair_counts) if self.pair_weight else None
+            scores = self._avoid_number_scores(frequency_analysis, gap_analysis, trend_analysis, pair_scores)
+        return [scores[number] for number in self.number_range], pair_deviation_matrix(pair_counts, stats.total_draws)
+    
+    def _select_combinations(self, scores: Dict[int, float], pair_matrix: Optional[np.ndarray],
+                             pair_penalty: float) -> List[List[int]]:
+        """評分全部 C(38,6) 組號碼，挑選分數最高且任兩組重疊受限的 10 組
+        
+        在目前的執行緒中計算，不另外建立行程（分析可能在請求或工作執行緒中執行）。
+        重疊上限太嚴格而不足 10 組時（例如 COMBINATION_MAX_OVERLAP=0 最多只有 6 組），逐步放寬上限補足。
+        """
+        number_scores = [scores[number] for number in self.number_range]
+        number_sets: List[List[int]] = []
+        max_overlap = COMBINATION_MAX_OVERLAP
+        while True:
+            for item in top_combinations(number_scores, pair_matrix, pair_penalty, k=10,
+                                         max_overlap=max_overlap, processes=1):
+                if item['numbers'] not in number_sets and len(number_sets) < 10:
+                    number_sets.append(item['numbers'])
+            if len(number_sets) == 10 or max_overlap >= PICK_COUNT - 1:
+                return number_sets
+            max_overlap += 1
+    
+    def _avoid_number_scores(self, frequency_analysis: Dict, gap_analysis: Dict, trend_analysis: Dict,
+                             pair_scores: Optional[Dict[int, float]] = None) -> Dict[int, float]:
+        """各號碼的避免分數"""
         scores = {}
         
         for number in self.number_range:
@@ -194,7 +410,22 @@ class LotteryAnalyzer:
             
             # 綜合評分
             total_score = freq_score * 0.4 + gap_score * 0.4 + trend_score * 0.2
+            
+            # 共現分數 (較少與其他號碼一起開出的號碼加分)
+            if pair_scores:
+                total_score += pair_scores[number] * self.pair_weight
             scores[number] = round(total_score, 2)
+        return scores
+    
+    def _calculate_avoid_scores(self, frequency_analysis: Dict, 
+                              gap_analysis: Dict, trend_analysis: Dict,
+                              pair_scores: Optional[Dict[int, float]] = None,
+                              pair_matrix: Optional[np.ndarray] = None) -> List[List[int]]:
+        """計算綜合評分並推薦10組避免號碼"""
+        scores = self._avoid_number_scores(frequency_analysis, gap_analysis, trend_analysis, pair_scores)
+        if self.set_selection == 'combinations':
+            # 常一起開出的號碼對扣分
+            return self._select_combinations(scores, pair_matrix, COMBINATION_PAIR_PENALTY)
         
         # 排序所有號碼
         sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
@@ -266,9 +497,9 @@ class LotteryAnalyzer:
         
         return final_sets
     
-    def _calculate_likely_scores(self, frequency_analysis: Dict, 
-                               gap_analysis: Dict, trend_analysis: Dict) -> List[List[int]]:
-        """計算可能開出的號碼並推薦10組"""
+    def _likely_number_scores(self, frequency_analysis: Dict, gap_analysis: Dict,
+                              trend_analysis: Dict) -> Dict[int, float]:
+        """各號碼可能開出的分數"""
         scores = {}
         
         for number in self.number_range:
@@ -294,6 +525,16 @@ class LotteryAnalyzer:
             # 綜合評分
             total_score = freq_score * 0.5 + gap_score * 0.3 + trend_score * 0.2
             scores[number] = round(total_score, 2)
+        return scores
+    
+    def _calculate_likely_scores(self, frequency_analysis: Dict, 
+                               gap_analysis: Dict, trend_analysis: Dict,
+                               pair_matrix: Optional[np.ndarray] = None) -> List[List[int]]:
+        """計算可能開出的號碼並推薦10組"""
+        scores = self._likely_number_scores(frequency_analysis, gap_analysis, trend_analysis)
+        if self.set_selection == 'combinations':
+            # 與避免號碼相反，常一起開出的號碼對加分
+            return self._select_combinations(scores, pair_matrix, -COMBINATION_PAIR_PENALTY)
         
         # 排序所有號碼
         sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
@@ -365,22 +606,28 @@ class LotteryAnalyzer:
         
         return final_sets
     
-    def _analyze_special_numbers(self, df: pd.DataFrame) -> Dict:
+    def _analyze_special_numbers(self, matrix: DrawMatrix) -> Dict:
         """分析特別號"""
-        special_numbers = df['special_number'].dropna().tolist()
+        return self._build_special(matrix.special_counts(), matrix.special_last_seen())
+    
+    def _build_special(self, special_counts, special_last_seen) -> Dict:
+        """由特別號出現次數與最後出現位置產生特別號分析"""
+        # 頻率分析（依最近出現順序排列）
+        special_frequency = {
+            number: int(special_counts[number - 1])
+            for number in sorted(self.special_range, key=lambda n: -special_last_seen[n - 1])
+            if special_counts[number - 1] > 0
+        }
         
-        if not special_numbers:
+        if not special_frequency:
             return {'frequency': {}, 'avoid_special': []}
         
-        # 頻率分析
-        special_frequency = Counter(special_numbers)
-        
         # 找出最少出現的特別號
-        min_count = min(special_frequency.values()) if special_frequency else 0
+        min_count = min(special_frequency.values())
         avoid_special = [num for num, count in special_frequency.items() if count == min_count]
         
         return {
-            'frequency': dict(special_frequency),
+            'frequency': special_frequency,
             'avoid_special': avoid_special[:2]  # 推薦避免前2個
         }
     
@@ -400,29 +647,31 @@ class LotteryAnalyzer:
         }
     
     def get_statistics(self) -> Dict:
-        """取得統計資料"""
-        draws = db_manager.get_all_draws()
-        if not draws:
+        """取得統計資料（讀取寫入時維護的統計彙總，不掃描歷史資料）"""
+        rows = db_manager.get_statistics_rows()
+        total = next((row for row in rows if row.kind == 'total'), None)
+        if not total or not total.count:
             return {}
         
-        df = self._create_dataframe(draws)
-        
-        # 基本統計
-        total_periods = len(draws)
-        number_frequency = df['number'].value_counts().to_dict()
-        special_frequency = df['special_number'].value_counts().to_dict()
+        # 基本統計（次數多的在前）
+        number_rows = sorted((row for row in rows if row.kind == 'number' and row.count > 0),
+                             key=lambda row: (-row.count, row.number))
+        special_rows = sorted((row for row in rows if row.kind == 'special' and row.count > 0),
+                              key=lambda row: (-row.count, row.number))
+        number_frequency = {row.number: row.count for row in number_rows}
+        special_frequency = {row.number: row.count for row in special_rows}
         
         # 號碼出現次數統計
         avg_frequency = sum(number_frequency.values()) / len(number_frequency)
         
         return {
-            'total_periods': total_periods,
+            'total_periods': total.count,
             'number_frequency': number_frequency,
             'special_frequency': special_frequency,
             'average_frequency': round(avg_frequency, 2),
             'date_range': {
-                'start': draws[-1].draw_date.isoformat(),
-                'end': draws[0].draw_date.isoformat()
+                'start': total.first_date.isoformat(),
+                'end': total.last_date.isoformat()
             }
         }
 
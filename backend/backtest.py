@@ -0,0 +1,193 @@
+"""
+回測引擎 - 逐期重播歷史資料，第 t 期只使用之前的開獎產生推薦號碼，再以第 t 期的開獎結果計分
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from math import comb
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from analyzer import LotteryAnalyzer
+from draw_matrix import DrawMatrix, NUMBER_COUNT
+from incremental import RECENT_WINDOW
+
+STRATEGIES = ('avoid', 'likely')  # 避免號碼與可能開出號碼兩種推薦
+MIN_HISTORY = 20  # 開始回測前至少需要的歷史期數
+TREND_WINDOW = RECENT_WINDOW  # 與分析器相同的趨勢期數
+
+# 隨機選 6 個號碼的理論基準
+BASELINE_MEAN_HITS = 6 * 6 / NUMBER_COUNT
+BASELINE_ZERO_HIT_RATE = comb(NUMBER_COUNT - 6, 6) / comb(NUMBER_COUNT, 6)
+
+class PrefixState:
+    """累積計數與「第 t 期之前最後出現位置」的前綴陣列，每期查詢只需 O(38)"""
+
+    def __init__(self, numbers: np.ndarray):
+        total = numbers.shape[0]
+        # cumulative[t] 為前 t 期各號碼出現次數
+        self.cumulative = np.zeros((total + 1, NUMBER_COUNT), dtype=np.int32)
+        np.cumsum(numbers, axis=0, out=self.cumulative[1:])
+        # last_before[t] 為第 t 期之前各號碼最後出現的列索引，未出現為 -1
+        hit_rows = np.where(numbers > 0, np.arange(total)[:, None], -1)
+        self.last_before = np.full((total + 1, NUMBER_COUNT), -1, dtype=np.int64)
+        if total:
+            np.maximum.accumulate(hit_rows, axis=0, out=self.last_before[1:])
+
+    def counts(self, t: int, window: int) -> np.ndarray:
+        """第 t 期之前最近 window 期的出現次數"""
+        return self.cumulative[t] - self.cumulative[t - window]
+
+def run_backtest(matrix: DrawMatrix, strategies: Sequence[str] = STRATEGIES,
+                 windows: Sequence[Optional[int]] = (None,), start: int = MIN_HISTORY,
+                 processes: Optional[int] = None, seed: int = 0, set_selection: str = "slices") -> Dict:
+    """對每個策略與分析期數組合進行回測，processes 預設為 CPU 數，大於 1 時以多個行程並行
+
+    set_selection 為推薦組合的產生方式（見 analyzer.SET_SELECTION）；combinations 每期需評分全部組合，
+    預設使用較快的 slices。start 與各分析期數至少為 1（第 t 期之前至少需要一期歷史資料）。
+    """
+    if start < 1:
+        raise ValueError(f"start 至少為 1: {start}")
+    if any(window is not None and window < 1 for window in windows):
+        raise ValueError(f"分析期數至少為 1: {list(windows)}")
+
+    tasks = [
+        (matrix.numbers, matrix.periods, strategy, window, start, seed, set_selection)
+        for strategy in strategies
+        for window in windows
+    ]
+
+    workers = min(processes or os.cpu_count() or 1, len(tasks))
+    started = time.perf_counter()
+    if workers <= 1:
+        reports = [_run_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            reports = list(executor.map(_run_task, tasks))
+
+    return {
+        'total_periods': matrix.total_draws,
+        'start_index': start,
+        'set_selection': set_selection,
+        'baseline': {
+            'mean_hits': round(BASELINE_MEAN_HITS, 4),
+            'zero_hit_rate': round(BASELINE_ZERO_HIT_RATE, 4)
+        },
+        'reports': reports,
+        'elapsed_seconds': round(time.perf_counter() - started, 3)
+    }
+
+def _run_task(task) -> Dict:
+    """執行單一策略與分析期數的回測（可在子行程中執行）"""
+    numbers, periods, strategy, window, start, seed, set_selection = task
+    # 推薦組合中有一組隨機組合，固定種子讓結果可重現
+    random.seed(seed)
+
+    analyzer = LotteryAnalyzer()
+    analyzer.set_selection = set_selection
+    prefix = PrefixState(numbers)
+    no_gap_history = [0] * NUMBER_COUNT
+    hit_counts = np.zeros((10, 7), dtype=np.int64)  # 每組推薦命中 0-6 個號碼的次數
+
+    for t in range(start, numbers.shape[0]):
+        total = t if window is None else min(t, window)
+        low = t - total
+
+        counts = prefix.counts(t, total)
+        last_before = prefix.last_before[t]
+        # 轉為分析期數內的相對位置，窗外視為未出現
+        last_seen = np.where(last_before >= low, last_before - low, -1)
+        last_seen_period = [periods[row] if row >= low else None for row in last_before]
+        recent = min(TREND_WINDOW, total)
+
+        frequency_analysis = analyzer._build_frequency(counts, total)
+        gap_analysis = analyzer._build_gaps(
+            counts, last_seen, last_seen_period, total, no_gap_history, no_gap_history, no_gap_history
+        )
+        trend_analysis = analyzer._build_trends(prefix.counts(t, recent), recent)
+
+        if strategy == 'avoid':
+            number_sets = analyzer._calculate_avoid_scores(frequency_analysis, gap_analysis, trend_analysis)
+        else:
+            number_sets = analyzer._calculate_likely_scores(frequency_analysis, gap_analysis, trend_analysis)
+
+        drawn = numbers[t]
+        for index, number_set in enumerate(number_sets):
+            hits = int(sum(drawn[number - 1] for number in number_set))
+            hit_counts[index, hits] += 1
+
+    return _build_report(strategy, window, hit_counts)
+
+def _build_report(strategy: str, window: Optional[int], hit_counts: np.ndarray) -> Dict:
+    """整理命中分佈為各組與整體的命中率報告"""
+    tested = int(hit_counts[0].sum())
+    hits_axis = np.arange(hit_counts.shape[1])
+
+    sets = []
+    for index, distribution in enumerate(hit_counts):
+        sets.append({
+            'set_index': index + 1,
+            'mean_hits': round(float((distribution * hits_axis).sum() / tested), 4) if tested else None,
+            'zero_hit_rate': round(float(distribution[0] / tested), 4) if tested else None,
+            'hit_distribution': distribution.tolist()
+        })
+
+    overall = hit_counts.sum(axis=0)
+    total_sets = int(overall.sum())
+    return {
+        'strategy': strategy,
+        'window': window,
+        'periods_tested': tested,
+        'mean_hits': round(float((overall * hits_axis).sum() / total_sets), 4) if total_sets else None,
+        'zero_hit_rate': round(float(overall[0] / total_sets), 4) if total_sets else None,
+        'sets': sets
+    }
+
+def _parse_windows(value: str) -> List[Optional[int]]:
+    """解析 "all,50,100" 格式的分析期數列表（argparse 的 type）"""
+    try:
+        windows = [None if item == 'all' else int(item) for item in value.split(',') if item]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分析期數格式錯誤: {value}")
+    if not windows or any(window is not None and window < 1 for window in windows):
+        raise argparse.ArgumentTypeError(f"分析期數需為 all 或至少為 1 的整數: {value}")
+    return windows
+
+def _parse_start(value: str) -> int:
+    """開始回測的期序（argparse 的 type），至少為 1"""
+    try:
+        start = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"期序格式錯誤: {value}")
+    if start < 1:
+        raise argparse.ArgumentTypeError(f"開始回測的期序至少為 1: {value}")
+    return start
+
+if __name__ == "__main__":
+    from database import db_manager
+
+    parser = argparse.ArgumentParser(description="威力彩推薦號碼回測")
+    parser.add_argument("--windows", type=_parse_windows, default="all", help="分析期數，以逗號分隔，例如 all,50,100")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES), help="策略，以逗號分隔")
+    parser.add_argument("--start", type=_parse_start, default=MIN_HISTORY, help="開始回測的期序（至少為 1）")
+    parser.add_argument("--processes", type=int, default=None, help="並行行程數")
+    parser.add_argument("--seed", type=int, default=0, help="隨機種子")
+    parser.add_argument("--set-selection", choices=("slices", "combinations"), default="slices",
+                        help="推薦組合的產生方式（combinations 每期約需 0.5 秒）")
+    args = parser.parse_args()
+
+    matrix = DrawMatrix.from_draws(db_manager.get_all_draws())
+    result = run_backtest(
+        matrix,
+        strategies=args.strategies.split(','),
+        windows=args.windows,
+        start=args.start,
+        processes=args.processes,
+        seed=args.seed,
+        set_selection=args.set_selection
+    )
+    print(json.dumps(result, ensure_ascii=False, indent=2))
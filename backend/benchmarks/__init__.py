@@ -0,0 +1,3 @@
+"""
+效能基準測試 - 以可重現的合成歷史資料量測分析、統計、寫入與 API 的耗時
+"""
@@ -0,0 +1,128 @@
+"""
+冷啟動測量 - 在全新的 Python 行程中匯入 main，並送出第一個 /health 與 /api/history 請求
+
+每次測量都啟動新的行程，結果包含匯入、啟動事件與兩個請求的耗時，以及行程中是否已載入
+只有分析或爬取才需要的模組。平均總耗時超過預算時以結束碼 1 結束，可用於 CI 檢查。
+
+用法（在 backend 目錄下）：
+    python -m benchmarks.cold_start --runs 5 --budget-ms 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# 將 backend 目錄加到 Python 路徑
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+# 匯入 main 加上 /health 與 /api/history 第一個請求的總耗時上限（毫秒）
+COLD_START_BUDGET_MS = float(os.getenv("COLD_START_BUDGET_MS", "1000"))
+
+# 查詢歷史資料與健康檢查不應載入的模組
+HEAVY_MODULES = ("numpy", "analyzer", "crawler", "TaiwanLottery", "requests", "sqlalchemy.dialects.postgresql")
+
+STAGES = ("import_ms", "startup_ms", "health_ms", "history_ms", "total_ms")
+
+def measure_once() -> Dict:
+    """在目前的（全新）行程中測量一次冷啟動；子行程執行，匯入本模組時不可載入其他模組"""
+    started = time.perf_counter()
+    import main
+    import_ms = (time.perf_counter() - started) * 1000
+
+    # httpx 只用於送出請求，不計入冷啟動時間
+    import httpx
+
+    async def first_requests() -> Dict:
+        timings = {}
+        step = time.perf_counter()
+        await main.startup_event()
+        timings['startup_ms'] = (time.perf_counter() - step) * 1000
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://cold-start") as client:
+            for name, url in (('health_ms', "/health"), ('history_ms', "/api/history?limit=10")):
+                step = time.perf_counter()
+                response = await client.get(url)
+                timings[name] = (time.perf_counter() - step) * 1000
+                response.raise_for_status()
+        return timings
+
+    timings = asyncio.run(first_requests())
+    result = {'import_ms': import_ms, **timings}
+    result['total_ms'] = sum(result[stage] for stage in STAGES[:-1])
+    result['heavy_modules'] = [name for name in HEAVY_MODULES if name in sys.modules]
+    return result
+
+def spawn(database_url: str, lazy: bool) -> Dict:
+    """在新的行程中執行 measure_once，回傳其 JSON 結果"""
+    env = dict(os.environ, DATABASE_URL=database_url, LAZY_INIT="1" if lazy else "0", LOG_LEVEL="WARNING")
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.cold_start", "--child"],
+        cwd=backend_dir, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def seed_database(database_url: str, size: int, seed: int):
+    """以合成資料建立測試資料庫（在子行程中執行，避免本行程載入資料庫模組）"""
+    code = (
+        "from database import db_manager\n"
+        "from benchmarks.synthetic import generate_draws, load_draws\n"
+        f"load_draws(db_manager, generate_draws({size}, seed={seed}))\n"
+    )
+    env = dict(os.environ, DATABASE_URL=database_url, LAZY_INIT="0", LOG_LEVEL="WARNING")
+    subprocess.run([sys.executable, "-c", code], cwd=backend_dir, env=env, check=True, capture_output=True)
+
+def main_cli(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="測量後端冷啟動時間")
+    parser.add_argument("--runs", type=int, default=5, help="測量次數（每次都是新的行程）")
+    parser.add_argument("--budget-ms", type=float, default=COLD_START_BUDGET_MS, help="平均總耗時上限（毫秒）")
+    parser.add_argument("--size", type=int, default=2000, help="測試資料庫的合成期數")
+    parser.add_argument("--seed", type=int, default=0, help="合成資料的隨機種子")
+    parser.add_argument("--eager", action="store_true", help="停用延遲初始化（LAZY_INIT=0）作為比較")
+    parser.add_argument("--database-url", default=None, help="使用既有資料庫（預設建立暫存 SQLite 並載入合成資料）")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_once()))
+        return 0
+
+    from benchmarks.run import summarize
+
+    temp_dir = None
+    database_url = args.database_url
+    if database_url is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(temp_dir.name, 'cold_start.db')}"
+        seed_database(database_url, args.size, args.seed)
+
+    lazy = not args.eager
+    # 第一次執行會編譯 .pyc，不列入結果
+    spawn(database_url, lazy)
+    runs = [spawn(database_url, lazy) for _ in range(args.runs)]
+
+    summary = {stage: summarize([run[stage] for run in runs]) for stage in STAGES}
+    mean_total = summary['total_ms']['mean_ms']
+    report = {
+        'lazy_init': lazy,
+        'budget_ms': args.budget_ms,
+        'within_budget': mean_total <= args.budget_ms,
+        'heavy_modules': sorted({name for run in runs for name in run['heavy_modules']}),
+        'summary': summary,
+        'runs': [{**run, **{stage: round(run[stage], 3) for stage in STAGES}} for run in runs]
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if temp_dir is not None:
+        temp_dir.cleanup()
+    return 0 if report['within_budget'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
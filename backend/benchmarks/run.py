@@ -0,0 +1,163 @@
+"""
+執行效能基準測試並輸出 JSON 結果
+
+用法（在 backend 目錄下）：
+    python -m benchmarks.run --sizes 1000,10000,100000 --output bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+# 將 backend 目錄加到 Python 路徑
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+from benchmarks.synthetic import generate_draws, load_draws
+
+def measure(function: Callable, repeat: int = 1, items: int = 1) -> Dict:
+    """執行 repeat 次並回傳耗時統計（毫秒），items 為每次處理的筆數"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarize(timings, items)
+
+def summarize(timings: List[float], items: int = 1) -> Dict:
+    """整理多次耗時（毫秒）為統計結果"""
+    mean = sum(timings) / len(timings)
+    return {
+        'runs': len(timings),
+        'mean_ms': round(mean, 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'per_item_ms': round(mean / items, 4)
+    }
+
+def run_size(size: int, repeat: int, ingest_sample: int, seed: int) -> Dict:
+    """以 size 期合成資料執行所有情境"""
+    import httpx
+    from database import db_manager
+    from analyzer import analyzer
+    from cache import analysis_cache
+    import main
+
+    # 前 size 期預先載入，其後各 ingest_sample 期分別用於逐筆與批次寫入
+    draws = generate_draws(size + 2 * ingest_sample, seed=seed)
+    history, single_draws, bulk_draws = (
+        draws[:size], draws[size:size + ingest_sample], draws[size + ingest_sample:]
+    )
+
+    db_manager.clear_all_data()
+    scenarios = {}
+    scenarios['bulk_load'] = measure(lambda: load_draws(db_manager, history), items=size)
+
+    scenarios['analyze_incremental'] = measure(analyzer.analyze_avoid_numbers, repeat)
+    scenarios['analyze_full_recompute'] = measure(
+        lambda: analyzer.analyze_avoid_numbers(full_recompute=True), repeat
+    )
+    scenarios['get_statistics'] = measure(analyzer.get_statistics, repeat)
+
+    def add_single():
+        for draw in single_draws:
+            db_manager.add_lottery_draw(draw['period'], draw['date'], draw['numbers'], draw['special_number'])
+    scenarios['add_lottery_draw'] = measure(add_single, items=ingest_sample)
+    scenarios['bulk_upsert_draws'] = measure(lambda: db_manager.bulk_upsert_draws(bulk_draws), items=ingest_sample)
+
+    async def request_scenarios() -> Dict:
+        results = {}
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            async def timed_get(url: str, before: Callable = None) -> Dict:
+                timings = []
+                for _ in range(repeat):
+                    if before:
+                        before()
+                    started = time.perf_counter()
+                    response = await client.get(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    response.raise_for_status()
+                return summarize(timings)
+
+            results['api_latest_number_cold'] = await timed_get(
+                "/api/latest-number", before=lambda: analysis_cache.invalidate('latest-number')
+            )
+            results['api_latest_number_cached'] = await timed_get("/api/latest-number")
+            results['api_history_first_page'] = await timed_get("/api/history?limit=20")
+            middle_period = history[size // 2]['period']
+            results['api_history_keyset'] = await timed_get(f"/api/history?before={middle_period}&limit=20")
+        return results
+
+    scenarios.update(asyncio.run(request_scenarios()))
+    return {'size': size, 'scenarios': scenarios}
+
+def git_commit() -> str:
+    """目前的 git commit，無法取得時回傳 None"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=backend_dir,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main_cli(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="威力彩後端效能基準測試")
+    parser.add_argument("--sizes", default="1000,10000", help="合成歷史期數，以逗號分隔（1000 至 1000000）")
+    parser.add_argument("--repeat", type=int, default=3, help="每個情境重複次數")
+    parser.add_argument("--ingest-sample", type=int, default=100, help="逐筆與批次寫入的期數")
+    parser.add_argument("--seed", type=int, default=0, help="合成資料的隨機種子")
+    parser.add_argument("--database-url", default=None, help="測試用資料庫（預設為暫存 SQLite 檔案，資料會被清空）")
+    parser.add_argument("--output", default=None, help="輸出 JSON 檔案（預設輸出到標準輸出）")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    temp_dir = None
+    database_url = args.database_url
+    if database_url is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(temp_dir.name, 'benchmark.db')}"
+    # 必須在匯入資料庫模組之前設定
+    os.environ["DATABASE_URL"] = database_url
+
+    results = []
+    # 資料庫與分析的進度訊息改寫到標準錯誤，標準輸出只保留 JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        for size in sizes:
+            print(f"基準測試: {size} 期")
+            results.append(run_size(size, args.repeat, args.ingest_sample, args.seed))
+
+    report = {
+        'generated_at': datetime.now().isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': database_url.split(':', 1)[0],
+        'repeat': args.repeat,
+        'ingest_sample': args.ingest_sample,
+        'seed': args.seed,
+        'results': results
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output)
+    else:
+        print(output)
+
+    if temp_dir is not None:
+        temp_dir.cleanup()
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,70 @@
+"""
+合成開獎資料產生器 - 相同 seed 產生相同的歷史資料，格式與爬蟲輸出相同
+"""
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+NUMBER_COUNT = 38  # 威力彩號碼 1-38
+PICK_COUNT = 6
+SPECIAL_COUNT = 8
+DRAWS_PER_YEAR = 104  # 每週開獎兩次
+FIRST_YEAR = 100  # 第一期的民國年份
+END_DATE = date(2025, 7, 7)  # 合成資料最後一期的開獎日期
+GENERATE_CHUNK = 100_000  # 每次向量化產生的期數，限制暫存記憶體
+
+def year_width(count: int) -> int:
+    """count 期資料的年份欄位寬度：與真實資料相同為 3 位，年份超過 999 時全部補零到相同寬度"""
+    return max(3, len(str(FIRST_YEAR + (count - 1) // DRAWS_PER_YEAR)))
+
+def make_period(index: int, width: int = 3) -> str:
+    """第 index 期（從 0 開始）的期數，例如 "100001"，每年 104 期
+
+    期數為固定寬度，字串排序與期序相同（與真實資料一致）；width 為年份位數，由 year_width 決定。
+    """
+    return f"{FIRST_YEAR + index // DRAWS_PER_YEAR:0{width}d}{index % DRAWS_PER_YEAR + 1:03d}"
+
+def make_dates(count: int) -> List[date]:
+    """依每週一、四開獎排列的日期，最後一期為 END_DATE
+
+    期數太多、日期會早於西元 1 年時改為每日一期，從西元 1 年 1 月 1 日開始。
+    """
+    weekly_span = (count - 1) // 2 * 7 + (count - 1) % 2 * 3
+    if weekly_span < (END_DATE - date(1, 1, 1)).days:
+        start = END_DATE - timedelta(days=weekly_span)
+        return [start + timedelta(days=index // 2 * 7 + index % 2 * 3) for index in range(count)]
+    start = date(1, 1, 1)
+    return [start + timedelta(days=index) for index in range(count)]
+
+def generate_draws(count: int, seed: int = 0) -> List[Dict]:
+    """產生 count 期依期數遞增排列的合成開獎資料"""
+    rng = np.random.default_rng(seed)
+    dates = make_dates(count)
+    width = year_width(count)
+    specials = rng.integers(1, SPECIAL_COUNT + 1, size=count).tolist()
+
+    draws = []
+    for start in range(0, count, GENERATE_CHUNK):
+        size = min(GENERATE_CHUNK, count - start)
+        # 亂數鍵最小的 6 欄即為不重複的 6 個號碼
+        keys = rng.random((size, NUMBER_COUNT), dtype=np.float32)
+        picks = np.sort(np.argpartition(keys, PICK_COUNT, axis=1)[:, :PICK_COUNT], axis=1) + 1
+        for offset, numbers in enumerate(picks.tolist()):
+            index = start + offset
+            draws.append({
+                'period': make_period(index, width),
+                'date': dates[index],
+                'numbers': numbers,
+                'special_number': specials[index]
+            })
+    return draws
+
+def load_draws(manager, draws: List[Dict], batch_size: int = 10_000) -> Dict[str, int]:
+    """透過 DatabaseManager.bulk_upsert_draws 分批載入合成資料"""
+    totals = {'added_count': 0, 'updated_count': 0, 'unchanged_count': 0}
+    for start in range(0, len(draws), batch_size):
+        result = manager.bulk_upsert_draws(draws[start:start + batch_size])
+        for key in totals:
+            totals[key] += result[key]
+    return totals
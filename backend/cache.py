@@ -0,0 +1,65 @@
+"""
+行程內快取 - 以資料版本為鍵，資料未變動時直接回傳先前計算的結果
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+# 快取保存的名稱數上限（依查詢參數產生的名稱超過時移除最久未使用的）
+CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "64"))
+
+class VersionedCache:
+    """每個名稱保存一份 (資料版本, 結果)，版本不同時重新計算；超過 max_entries 個名稱時移除最久未使用的"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self._entries: "OrderedDict[str, Tuple[Any, Any]]" = OrderedDict()
+        self._max_entries = max_entries
+        self._entries_lock = threading.Lock()  # 保護 _entries，只在存取字典時持有
+        self._lock = threading.Lock()  # 計算期間持有，相同結果只計算一次
+
+    def get(self, name: str, version: Any) -> Optional[Any]:
+        """取得指定版本的快取結果，不存在或版本不符時回傳 None"""
+        with self._entries_lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(name)
+                return entry[1]
+        return None
+
+    def get_or_compute(self, name: str, version: Any, compute: Callable[[], Any]) -> Any:
+        """取得快取結果，版本不符時呼叫 compute 重新計算（同時只會計算一次）"""
+        value = self.get(name, version)
+        if value is not None:
+            return value
+
+        with self._lock:
+            # 等待期間可能已由其他請求算好
+            value = self.get(name, version)
+            if value is not None:
+                return value
+            value = compute()
+            if value is not None:
+                self._store(name, version, value)
+            return value
+
+    def _store(self, name: str, version: Any, value: Any):
+        with self._entries_lock:
+            self._entries[name] = (version, value)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, name: Optional[str] = None):
+        """清除指定名稱（或全部）的快取"""
+        with self._entries_lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# 全域分析快取實例
+analysis_cache = VersionedCache()
@@ -0,0 +1,198 @@
+"""
+號碼組合評分 - 以位元遮罩表示全部 C(38,6) 組號碼，分塊向量化計算目標分數，以 heap 取出彼此重疊受限的前 k 組
+
+目標分數 = 6 個號碼的分數總和 - pair_penalty x 15 個號碼對的共現偏差總和
+共現偏差為實際共現次數相對於隨機期望值的比例差（多於期望為正），pair_penalty 為負時改為獎勵常一起開出的號碼。
+
+依第一個號碼分塊：第一個號碼為 a 的組合，其餘 5 個號碼恰為「1-37 取 5」字典序中最後 C(37-a, 5) 組，
+因此只需預先計算一次這 435,897 組的分數，每塊再加上號碼 a 本身與它和其餘 5 個號碼的共現項。
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from math import comb
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from simulation import popcount
+
+NUMBER_COUNT = 38  # 威力彩號碼 1-38
+PICK_COUNT = 6
+TOTAL_COMBINATIONS = comb(NUMBER_COUNT, PICK_COUNT)  # 2,760,681
+
+# 候選池大小：先保留分數最高的組合，再從中依序挑選重疊不超過上限的組合
+COMBINATION_POOL_SIZE = int(os.getenv("COMBINATION_POOL_SIZE", "5000"))
+# 任兩組推薦號碼最多重複的號碼數
+COMBINATION_MAX_OVERLAP = int(os.getenv("COMBINATION_MAX_OVERLAP", "2"))
+# 共現偏差的權重
+COMBINATION_PAIR_PENALTY = float(os.getenv("COMBINATION_PAIR_PENALTY", "5.0"))
+
+@lru_cache(maxsize=1)
+def _tails() -> Tuple[np.ndarray, np.ndarray]:
+    """號碼索引 1-37 取 5 的全部組合（字典序）與其位元遮罩"""
+    count = comb(NUMBER_COUNT - 1, PICK_COUNT - 1)
+    indices = np.fromiter(
+        itertools.chain.from_iterable(itertools.combinations(range(1, NUMBER_COUNT), PICK_COUNT - 1)),
+        dtype=np.uint8, count=count * (PICK_COUNT - 1)
+    ).reshape(count, PICK_COUNT - 1)
+    masks = np.bitwise_or.reduce(np.left_shift(np.uint64(1), indices.astype(np.uint64)), axis=1)
+    return indices, masks
+
+def pair_deviation_matrix(pair_counts: np.ndarray, total_draws: int) -> np.ndarray:
+    """共現次數相對於隨機期望值的比例差（38 x 38，對角線為 0）"""
+    expected = total_draws * PICK_COUNT * (PICK_COUNT - 1) / (NUMBER_COUNT * (NUMBER_COUNT - 1))
+    if expected == 0:
+        return np.zeros((NUMBER_COUNT, NUMBER_COUNT))
+    deviation = np.asarray(pair_counts, dtype=np.float64) / expected - 1
+    np.fill_diagonal(deviation, 0)
+    return deviation
+
+def mask_to_numbers(mask: int) -> List[int]:
+    """位元遮罩轉為號碼（第 n-1 位元對應號碼 n）"""
+    return [index + 1 for index in range(NUMBER_COUNT) if mask >> index & 1]
+
+def _score_chunks(number_scores: np.ndarray, pair_matrix: Optional[np.ndarray], pair_penalty: float,
+                  firsts: Sequence[int], pool_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """計算第一個號碼索引在 firsts 中的所有組合，回傳各塊分數最高的 pool_size 組 (分數, 遮罩)"""
+    tail_indices, tail_masks = _tails()
+    tail_scores = number_scores[tail_indices].sum(axis=1)
+    use_pairs = pair_matrix is not None and pair_penalty != 0
+    if use_pairs:
+        for first, second in itertools.combinations(range(PICK_COUNT - 1), 2):
+            tail_scores -= pair_penalty * pair_matrix[tail_indices[:, first], tail_indices[:, second]]
+
+    total_tails = len(tail_indices)
+    scores_out, masks_out = [], []
+    for first in firsts:
+        start = total_tails - comb(NUMBER_COUNT - 1 - first, PICK_COUNT - 1)
+        scores = tail_scores[start:] + number_scores[first]
+        if use_pairs:
+            scores -= pair_penalty * pair_matrix[first][tail_indices[start:]].sum(axis=1)
+        masks = tail_masks[start:] | np.uint64(1 << first)
+        if len(scores) > pool_size:
+            # 保留與第 pool_size 名同分的組合，依 (分數, 遮罩) 排序的前 pool_size 組一定在其中
+            threshold = np.partition(scores, len(scores) - pool_size)[len(scores) - pool_size]
+            keep = scores >= threshold
+            scores, masks = scores[keep], masks[keep]
+        scores_out.append(scores)
+        masks_out.append(masks)
+    return np.concatenate(scores_out), np.concatenate(masks_out)
+
+def _select_from_all(number_scores: np.ndarray, pair_matrix: Optional[np.ndarray], pair_penalty: float,
+                     selected: List[Tuple[float, int]], k: int, max_overlap: int,
+                     size: int) -> List[Tuple[float, int]]:
+    """候選池不足時計算全部組合，依 (分數, 遮罩) 由高到低在逐步擴大的前 size 組中繼續挑選"""
+    firsts = list(range(NUMBER_COUNT - PICK_COUNT + 1))
+    scores, masks = _score_chunks(number_scores, pair_matrix, pair_penalty, firsts, TOTAL_COMBINATIONS)
+    selected = list(selected)
+    while True:
+        size = min(size, TOTAL_COMBINATIONS)
+        threshold = np.partition(scores, TOTAL_COMBINATIONS - size)[TOTAL_COMBINATIONS - size]
+        top = np.flatnonzero(scores >= threshold)
+        order = np.lexsort((masks[top], scores[top]))[::-1]
+        candidate_scores, candidate_masks = scores[top][order], masks[top][order]
+
+        compatible = np.ones(len(candidate_masks), dtype=bool)
+        for _, mask in selected:
+            compatible &= popcount(candidate_masks & np.uint64(mask)) <= max_overlap
+        while len(selected) < k:
+            remaining = np.flatnonzero(compatible)
+            if not len(remaining):
+                break
+            index = remaining[0]
+            selected.append((float(candidate_scores[index]), int(candidate_masks[index])))
+            compatible &= popcount(candidate_masks & candidate_masks[index]) <= max_overlap
+
+        if len(selected) == k or size == TOTAL_COMBINATIONS:
+            return selected
+        size *= 8
+
+def _select_diverse(candidates: List[Tuple[float, int]], k: int, max_overlap: int) -> List[Tuple[float, int]]:
+    """依分數由高到低挑選，與已選組合重複的號碼數不超過 max_overlap"""
+    selected = []
+    for score, mask in candidates:
+        if all(bin(mask & chosen).count('1') <= max_overlap for _, chosen in selected):
+            selected.append((score, mask))
+            if len(selected) == k:
+                break
+    return selected
+
+def top_combinations(number_scores: Sequence[float], pair_matrix: Optional[np.ndarray] = None,
+                     pair_penalty: float = COMBINATION_PAIR_PENALTY, k: int = 10,
+                     max_overlap: int = COMBINATION_MAX_OVERLAP, pool_size: int = COMBINATION_POOL_SIZE,
+                     processes: Optional[int] = None) -> List[Dict]:
+    """評分全部 C(38,6) 組號碼，回傳目標分數最高且彼此重疊受限的 k 組
+
+    number_scores 依號碼 1-38 排列；pair_matrix 為 38 x 38（例如 pair_deviation_matrix 的結果）。
+    結果與「全部組合依 (分數, 遮罩) 由高到低排序後依序挑選」相同：候選池中不足 k 組符合重疊限制時，
+    再計算全部組合並在更大的範圍中繼續挑選。重疊上限無法容納 k 組時回傳的組數會少於 k
+    （例如 max_overlap=0 時 38 個號碼最多只有 6 組互不重複）。processes 大於 1 時另外建立行程，
+    在伺服器的請求或工作執行緒中請使用 processes=1。
+    """
+    number_scores = np.asarray(number_scores, dtype=np.float64)
+    if pair_matrix is not None:
+        pair_matrix = np.asarray(pair_matrix, dtype=np.float64)
+
+    firsts = list(range(NUMBER_COUNT - PICK_COUNT + 1))
+    workers = min(processes or os.cpu_count() or 1, len(firsts))
+    if workers <= 1:
+        parts = [_score_chunks(number_scores, pair_matrix, pair_penalty, firsts, pool_size)]
+    else:
+        # 前面的號碼組合數較多，交錯分配讓各行程工作量相近
+        groups = [firsts[index::workers] for index in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(
+                _score_chunks, *zip(*[(number_scores, pair_matrix, pair_penalty, group, pool_size)
+                                      for group in groups])
+            ))
+
+    # 以最小堆積保留分數最高的 pool_size 組，分數相同時依遮罩排序以維持結果穩定
+    heap: List[Tuple[float, int]] = []
+    for scores, masks in parts:
+        if len(heap) == pool_size:
+            keep = scores >= heap[0][0]
+            scores, masks = scores[keep], masks[keep]
+        for score, mask in zip(scores.tolist(), masks.tolist()):
+            if len(heap) < pool_size:
+                heapq.heappush(heap, (score, mask))
+            elif (score, mask) > heap[0]:
+                heapq.heapreplace(heap, (score, mask))
+
+    selected = _select_diverse(sorted(heap, reverse=True), k, max_overlap)
+    if len(selected) < k:
+        selected = _select_from_all(number_scores, pair_matrix, pair_penalty, selected, k, max_overlap,
+                                    pool_size * 8)
+
+    return [{'numbers': mask_to_numbers(mask), 'score': round(score, 4)} for score, mask in selected]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="以最新分析分數評分全部 C(38,6) 組號碼")
+    parser.add_argument("--k", type=int, default=10, help="推薦組數")
+    parser.add_argument("--max-overlap", type=int, default=COMBINATION_MAX_OVERLAP, help="任兩組最多重複的號碼數")
+    parser.add_argument("--pair-penalty", type=float, default=COMBINATION_PAIR_PENALTY, help="共現偏差權重")
+    parser.add_argument("--pool-size", type=int, default=COMBINATION_POOL_SIZE, help="候選池大小")
+    parser.add_argument("--processes", type=int, default=None, help="並行行程數")
+    parser.add_argument("--likely", action="store_true", help="以可能開出號碼的分數評分（預設為避免號碼）")
+    args = parser.parse_args()
+
+    from analyzer import analyzer
+    started = time.perf_counter()
+    inputs = analyzer.combination_inputs(likely=args.likely)
+    if inputs is None:
+        raise SystemExit("歷史資料不足，無法評分")
+    number_scores, pair_matrix = inputs
+    sets = top_combinations(
+        number_scores, pair_matrix, pair_penalty=-args.pair_penalty if args.likely else args.pair_penalty,
+        k=args.k, max_overlap=args.max_overlap, pool_size=args.pool_size, processes=args.processes
+    )
+    print(json.dumps({
+        'objective': 'likely' if args.likely else 'avoid',
+        'sets': sets,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }, ensure_ascii=False, indent=2))
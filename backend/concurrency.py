@@ -0,0 +1,25 @@
+"""
+執行緒池 - 讓同步的資料庫存取與耗時的分析/爬蟲工作不阻塞 FastAPI 事件迴圈
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# 一般資料庫查詢使用的執行緒數
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+# 分析、爬蟲等耗時工作使用的執行緒數（與資料庫查詢分開，避免佔滿查詢用的執行緒）
+HEAVY_EXECUTOR_WORKERS = int(os.getenv("HEAVY_EXECUTOR_WORKERS", "2"))
+
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+heavy_executor = ThreadPoolExecutor(max_workers=HEAVY_EXECUTOR_WORKERS, thread_name_prefix="heavy")
+
+async def run_db(func, *args, **kwargs):
+    """在資料庫執行緒池中執行同步的資料庫操作"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
+
+async def run_heavy(func, *args, **kwargs):
+    """在耗時工作執行緒池中執行分析或爬蟲"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(heavy_executor, functools.partial(func, *args, **kwargs))
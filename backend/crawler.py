@@ -1,24 +1,72 @@
 """
 威力彩爬蟲模組 - 使用 TaiwanLotteryCrawler 獲取真實資料
 """
-import ssl
+import itertools
+import os
+import threading
+import time
 import urllib3
+from concurrent.futures import ThreadPoolExecutor
 from urllib3.exceptions import InsecureRequestWarning
-from datetime import datetime, date, timedelta
-from typing import List, Dict, Optional
+from datetime import datetime, date
+from typing import Callable, List, Dict, Optional, Tuple
 import requests
 from TaiwanLottery import TaiwanLotteryCrawler
 from database import db_manager
+from metrics import timed
+from logging_config import get_logger
+
+logger = get_logger("crawler")
 
 # 停用SSL警告和驗證
 urllib3.disable_warnings(InsecureRequestWarning)
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
+# 爬蟲並行與限速設定
+CRAWLER_MAX_WORKERS = int(os.getenv("CRAWLER_MAX_WORKERS", "4"))
+CRAWLER_REQUESTS_PER_SECOND = float(os.getenv("CRAWLER_REQUESTS_PER_SECOND", "2"))
+
+class TokenBucket:
+    """令牌桶限速器：平均每秒 rate 個請求，最多允許 capacity 個請求的突發"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """取得一個令牌，不足時等待"""
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            # 先預扣令牌，多個執行緒依序排隊等待
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            self.sleep(wait)
+
 class PowerballCrawler:
-    def __init__(self):
-        """初始化爬蟲"""
-        self.setup_ssl_bypass()
-        self.crawler = TaiwanLotteryCrawler()
+    def __init__(self, client=None, max_workers: int = CRAWLER_MAX_WORKERS,
+                 requests_per_second: float = CRAWLER_REQUESTS_PER_SECOND):
+        """初始化爬蟲
+        
+        client 需提供與 TaiwanLotteryCrawler 相同的 super_lotto(year_month=None) 方法，
+        可傳入本地替身以便測試與量測回補時間。
+        """
+        if client is None:
+            self.setup_ssl_bypass()
+            client = TaiwanLotteryCrawler()
+        self.crawler = client
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = TokenBucket(requests_per_second, capacity=self.max_workers)
         
     def setup_ssl_bypass(self):
         """設置SSL忽略"""
@@ -38,83 +86,136 @@ class PowerballCrawler:
     
     def fetch_latest_draws(self, max_pages: int = 5) -> List[Dict]:
         """獲取從2024年到現在的完整威力彩開獎資料"""
+        all_draws, _ = self._fetch_draws(self._full_month_list())
+        logger.info("已獲取完整開獎資料（從2024年到現在）", extra={'draws': len(all_draws)})
+        return all_draws
+    
+    def _full_month_list(self) -> List[Optional[List[str]]]:
+        """當月資料（None）加上從2024年1月到上個月的所有月份"""
+        return [None] + self._history_months(start_year=2024, start_month=1)
+    
+    def _incremental_month_list(self, completed_months: set) -> List[Optional[List[str]]]:
+        """當月資料加上尚未完整爬取的歷史月份"""
+        return [None] + [
+            year_month for year_month in self._history_months(start_year=2024, start_month=1)
+            if self._month_key(year_month) not in completed_months
+        ]
+    
+    def _fetch_draws(self, year_month_list: List[Optional[List[str]]],
+                     progress: Optional[Callable[..., None]] = None) -> Tuple[List[Dict], List[Dict]]:
+        """獲取指定月份的資料，回傳 (合併後的開獎資料, 各月份爬取結果)
+        
+        progress 會在每個月份完成時以 months_fetched=<已完成月份數> 呼叫。
+        """
+        started = time.perf_counter()
+        on_month_fetched = None
+        if progress:
+            fetched = itertools.count(1)
+            on_month_fetched = lambda year_month, draws: progress(months_fetched=next(fetched))
+        
+        current_key = self._month_key(None)
         all_draws = []
+        month_results = []
+        failed_months = 0
+        for year_month, monthly_draws in self.fetch_months(year_month_list, on_month_fetched):
+            if monthly_draws is None:
+                # 失敗的月份不記錄，下次更新時重試
+                failed_months += 1
+                continue
+            all_draws.extend(monthly_draws)
+            key = self._month_key(year_month)
+            month_results.append({
+                'year_month': key,
+                'draw_count': len(monthly_draws),
+                # 當月仍會有新開獎，已結束的月份有資料才算完整
+                'is_complete': key != current_key and len(monthly_draws) > 0
+            })
+        
+        merged = self._merge_draws(all_draws)
+        logger.info("月份資料獲取完成", extra={
+            'months': len(year_month_list), 'failed_months': failed_months, 'draws': len(merged),
+            'workers': self.max_workers, 'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        })
+        return merged, month_results
+    
+    def _month_key(self, year_month: Optional[List[str]]) -> str:
+        """年月鍵值，None 代表當月"""
+        if year_month is None:
+            today = date.today()
+            return f"{today.year}-{today.month:02d}"
+        return f"{year_month[0]}-{year_month[1]}"
+    
+    def fetch_months(self, year_month_list: List[Optional[List[str]]],
+                     on_month_fetched: Optional[Callable] = None) -> List[Tuple[Optional[List[str]], Optional[List[Dict]]]]:
+        """並行獲取多個月份的資料，回傳與輸入順序相同的 (月份, 解析後資料)
+        
+        單一月份失敗不影響其他月份，失敗的月份資料為 None。每個月份完成時呼叫 on_month_fetched(月份, 資料)。
+        """
+        if not year_month_list:
+            return []
         
+        def fetch(year_month):
+            draws = self._fetch_month(year_month)
+            if on_month_fetched:
+                on_month_fetched(year_month, draws)
+            return draws
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(year_month_list))) as executor:
+            results = list(executor.map(fetch, year_month_list))
+        
+        return list(zip(year_month_list, results))
+    
+    def _fetch_month(self, year_month: Optional[List[str]]) -> Optional[List[Dict]]:
+        """在限速下獲取單一月份的資料（None 代表當月）"""
+        label = f"{year_month[0]}-{year_month[1]}" if year_month else "當月"
         try:
-            print("正在使用 TaiwanLotteryCrawler 獲取威力彩完整歷史資料...")
-            
-            # 獲取當月資料
-            current_data = self.crawler.super_lotto()
-            if current_data:
-                print(f"成功獲取當月 {len(current_data)} 筆資料")
-                parsed_current = self._parse_crawler_data(current_data)
-                all_draws.extend(parsed_current)
-            
-            # 獲取從2024年1月到現在的所有資料
-            current_date = date.today()
-            start_year = 2024  # 改回2024年開始
-            start_month = 1
-            
-            # 計算需要獲取的年月組合
-            year_month_list = []
-            
-            # 從2024年1月開始
-            for year in range(start_year, current_date.year + 1):
-                start_m = start_month if year == start_year else 1
-                end_m = current_date.month if year == current_date.year else 12
-                
-                for month in range(start_m, end_m + 1):
-                    # 跳過當月（已經獲取）
-                    if year == current_date.year and month == current_date.month:
-                        continue
-                    year_month_list.append([str(year), f"{month:02d}"])
-            
-            print(f"準備獲取 {len(year_month_list)} 個月份的歷史資料...")
+            self.rate_limiter.acquire()
+            # 只計算上游請求的耗時，不含限速等待
+            with timed("crawler.fetch_month"):
+                if year_month:
+                    monthly_data = self.crawler.super_lotto(year_month)
+                else:
+                    monthly_data = self.crawler.super_lotto()
             
-            # 按倒序獲取（從最新的開始）
-            year_month_list.reverse()
+            if not monthly_data:
+                logger.debug("月份沒有資料", extra={'month': label})
+                return []
             
-            processed_months = 0
-            for year_month in year_month_list:
-                try:
-                    print(f"獲取 {year_month[0]}-{year_month[1]} 的資料...")
-                    monthly_data = self.crawler.super_lotto(year_month)
-                    
-                    if monthly_data:
-                        print(f"成功獲取 {year_month[0]}-{year_month[1]} {len(monthly_data)} 筆資料")
-                        parsed_monthly = self._parse_crawler_data(monthly_data)
-                        all_draws.extend(parsed_monthly)
-                    else:
-                        print(f"{year_month[0]}-{year_month[1]} 沒有資料")
-                    
-                    processed_months += 1
-                    
-                    # 每獲取5個月的資料就暫停一下，避免請求過快
-                    if processed_months % 5 == 0:
-                        print(f"已處理 {processed_months} 個月，暫停3秒避免請求過快...")
-                        import time
-                        time.sleep(3)
-                        
-                    # 每獲取12個月的資料就顯示進度
-                    if processed_months % 12 == 0:
-                        print(f"進度: 已處理 {processed_months}/{len(year_month_list)} 個月，目前共 {len(all_draws)} 筆資料")
-                        
-                except Exception as e:
-                    print(f"獲取 {year_month[0]}-{year_month[1]} 資料失敗: {e}")
-                    continue
-                        
+            logger.debug("已獲取月份資料", extra={'month': label, 'rows': len(monthly_data)})
+            return self._parse_crawler_data(monthly_data)
         except Exception as e:
-            print(f"TaiwanLotteryCrawler 獲取資料失敗: {e}")
+            logger.warning("獲取月份資料失敗", extra={'month': label, 'error': str(e)})
+            return None
+    
+    def _history_months(self, start_year: int, start_month: int) -> List[List[str]]:
+        """列出從指定年月到上個月的所有年月（由新到舊）"""
+        current_date = date.today()
+        year_month_list = []
         
-        # 按期數排序，最新的在前面
-        all_draws.sort(key=lambda x: int(x['period']), reverse=True)
+        for year in range(start_year, current_date.year + 1):
+            start_m = start_month if year == start_year else 1
+            end_m = current_date.month if year == current_date.year else 12
+            
+            for month in range(start_m, end_m + 1):
+                # 跳過當月（另外獲取）
+                if year == current_date.year and month == current_date.month:
+                    continue
+                year_month_list.append([str(year), f"{month:02d}"])
         
-        print(f"總共獲取 {len(all_draws)} 筆真實威力彩資料 (從2024年到現在)")
-        return all_draws
+        year_month_list.reverse()
+        return year_month_list
+    
+    def _merge_draws(self, draws: List[Dict]) -> List[Dict]:
+        """依期數去除重複並排序，最新的在前面"""
+        merged = {}
+        for draw in draws:
+            merged[draw['period']] = draw
+        return sorted(merged.values(), key=lambda x: int(x['period']), reverse=True)
     
     def _parse_crawler_data(self, data: List[Dict]) -> List[Dict]:
         """解析 TaiwanLotteryCrawler 返回的資料"""
         draws = []
+        skipped = 0
         
         for item in data:
             try:
@@ -126,13 +227,14 @@ class PowerballCrawler:
                 second_area = item.get('第二區', 0)  # 特別號
                 
                 if not period or not first_area or len(first_area) != 6:
-                    print(f"資料不完整，跳過: {item}")
+                    logger.debug("資料不完整，跳過", extra={'item': item})
+                    skipped += 1
                     continue
                 
                 # 解析日期
                 draw_date = self._parse_date_string(date_str)
                 if not draw_date:
-                    print(f"日期解析失敗: {date_str}")
+                    skipped += 1
                     continue
                 
                 # 號碼已經是整數列表，直接使用
@@ -146,12 +248,14 @@ class PowerballCrawler:
                     'special_number': special_number
                 })
                 
-                print(f"解析成功: 期數 {period}, 日期 {draw_date}, 號碼 {regular_numbers}+{special_number}")
-                
             except Exception as e:
-                print(f"解析單筆資料錯誤: {item}, 錯誤: {e}")
+                logger.debug("解析單筆資料錯誤", extra={'item': item, 'error': str(e)})
+                skipped += 1
                 continue
         
+        # 逐筆的解析結果不輸出，只記錄每批的摘要
+        if skipped:
+            logger.warning("部分資料無法解析", extra={'rows': len(data), 'parsed': len(draws), 'skipped': skipped})
         return draws
     
     def _parse_date_string(self, date_str: str) -> Optional[date]:
@@ -168,49 +272,59 @@ class PowerballCrawler:
                 except ValueError:
                     continue
             
-            print(f"無法解析日期格式: {date_str}")
+            logger.debug("無法解析日期格式", extra={'date': date_str})
             return None
             
         except Exception as e:
-            print(f"日期解析錯誤: {date_str}, {e}")
+            logger.debug("日期解析錯誤", extra={'date': date_str, 'error': str(e)})
             return None
     
-    def update_database(self, max_pages: int = 5) -> Dict[str, int]:
-        """更新資料庫中的開獎資料"""
-        print("開始更新威力彩開獎資料...")
+    @timed("crawler.update_database")
+    def update_database(self, max_pages: int = 5, full_resync: bool = False,
+                        progress: Optional[Callable[..., None]] = None) -> Dict[str, int]:
+        """更新資料庫中的開獎資料
+        
+        預設只爬取當月與尚未完整爬取的月份；full_resync 為 True 時重新爬取全部月份。
+        progress 以關鍵字參數回報進度：months_total、months_fetched、rows_written。
+        """
+        started = time.perf_counter()
+        
+        if full_resync:
+            year_month_list = self._full_month_list()
+            logger.info("開始完整重新同步所有月份", extra={'months': len(year_month_list)})
+        else:
+            watermark = db_manager.get_crawl_watermark()
+            year_month_list = self._incremental_month_list(watermark['completed_months'])
+            logger.info("開始更新威力彩開獎資料", extra={
+                'latest_period': watermark['latest_period'], 'months': len(year_month_list)
+            })
         
-        draws_data = self.fetch_latest_draws(max_pages)
+        if progress:
+            progress(months_total=len(year_month_list), months_fetched=0)
+        draws_data, month_results = self._fetch_draws(year_month_list, progress)
         
         if not draws_data:
-            print("沒有獲取到任何資料")
-            return {'added_count': 0, 'updated_count': 0, 'total_processed': 0}
+            logger.warning("沒有獲取到任何資料", extra={'months': len(year_month_list)})
+            return {'added_count': 0, 'updated_count': 0, 'unchanged_count': 0,
+                    'total_processed': 0, 'fetched_months': len(month_results)}
         
-        added_count = 0
-        updated_count = 0
+        # 以單一交易批次寫入，並取得正確的新增/更新/未變動筆數
+        result = db_manager.bulk_upsert_draws(draws_data)
         
-        for draw in draws_data:
-            try:
-                success = db_manager.add_lottery_draw(
-                    period=draw['period'],
-                    draw_date=draw['date'],
-                    numbers=draw['numbers'],
-                    special_number=draw['special_number']
-                )
-                
-                if success:
-                    added_count += 1
-                    print(f"已更新期數: {draw['period']}, 日期: {draw['date']}")
-                
-            except Exception as e:
-                print(f"儲存資料錯誤 (期數: {draw['period']}): {e}")
+        if progress:
+            progress(rows_written=result['added_count'] + result['updated_count'])
+        
+        # 資料寫入成功後才記錄月份完成狀態
+        db_manager.record_crawl_months(month_results)
+        result['fetched_months'] = len(month_results)
         
-        print(f"資料更新完成！新增/更新: {added_count} 筆資料")
+        logger.info("資料更新完成", extra={
+            'added': result['added_count'], 'updated': result['updated_count'],
+            'unchanged': result['unchanged_count'], 'months': len(month_results),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        })
         
-        return {
-            'added_count': added_count,
-            'updated_count': updated_count,
-            'total_processed': len(draws_data)
-        }
+        return result
 
 # 建立爬蟲實例
 crawler = PowerballCrawler()
@@ -1,16 +1,102 @@
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from models import LotteryDraw, AnalysisResult, get_database, create_tables
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import LotteryDraw, DrawNumber, NumberStatistic, AnalysisResult, AnalysisState, CrawlMonth, DataCounter, JobRecord, get_database, create_tables
+from incremental import IncrementalStats
+from metrics import timed
+from logging_config import get_logger
 from datetime import datetime, date
-from typing import List, Optional
-import json
+from typing import Dict, Iterator, List, Optional
+import os
+import threading
+import time
+
+logger = get_logger("database")
+
+# 批次寫入每次送出的筆數（避免超過 SQLite 參數數量上限）
+BULK_CHUNK_SIZE = 100
+
+# 開獎資料總數計數器名稱
+DRAW_COUNTER = "lottery_draws"
+# 資料版本計數器名稱：開獎資料每次異動時在同一交易中遞增，多個行程共用
+DATA_VERSION_COUNTER = "data_version"
+# 讀取資料版本的快取秒數（其他行程寫入後最多延遲此秒數才會反映）
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "1.0"))
+
+# 延遲初始化：資料表檢查與既有資料補齊延到第一次存取資料庫時才執行，啟動時也不自動爬取
+# 在 Vercel / AWS Lambda 等 serverless 環境預設啟用，縮短冷啟動時間
+_SERVERLESS = bool(os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+LAZY_INIT = os.getenv("LAZY_INIT", "1" if _SERVERLESS else "0") != "0"
+
+# 串流匯出時每次自資料庫游標取出的筆數
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+def numbers_to_mask(numbers: List[int]) -> int:
+    """將開獎號碼轉為位元遮罩，號碼 n 對應第 n-1 位元"""
+    mask = 0
+    for number in numbers:
+        mask |= 1 << (number - 1)
+    return mask
 
 class DatabaseManager:
     def __init__(self):
-        create_tables()
+        self._version_cache = None  # (讀取時間, 資料版本)
+        self._total_cache = None  # (資料版本, 開獎資料總數)
+        self._schema_ready = False
+        self._schema_initializing = False
+        self._schema_lock = threading.RLock()
+        if not LAZY_INIT:
+            self.ensure_schema()
+    
+    def ensure_schema(self):
+        """建立資料表並補齊既有資料（只執行一次；延遲初始化時由第一次存取資料庫觸發）"""
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            # 補齊資料時會再呼叫 get_db，同一執行緒重入時直接返回
+            if self._schema_ready or self._schema_initializing:
+                return
+            self._schema_initializing = True
+            try:
+                started = time.perf_counter()
+                create_tables()
+                self._backfill_sequences()
+                self._backfill_number_index()
+                self._backfill_statistics()
+                self._init_data_version()
+                self._schema_ready = True
+                logger.info("資料表檢查完成", extra={'duration_ms': round((time.perf_counter() - started) * 1000, 1)})
+            finally:
+                self._schema_initializing = False
     
     def get_db(self):
+        if not self._schema_ready:
+            self.ensure_schema()
         return next(get_database())
     
+    @property
+    def data_version(self) -> int:
+        """資料版本，供分析快取、總數快取與 ETag 判斷是否過期
+        
+        版本保存在資料庫的計數器，其他 worker、serverless 執行個體或命令列工具的寫入也會反映；
+        讀取結果快取 DATA_VERSION_TTL 秒，本行程寫入後立即失效。
+        """
+        cached = self._version_cache
+        now = time.monotonic()
+        if cached and now - cached[0] < DATA_VERSION_TTL:
+            return cached[1]
+        
+        db = self.get_db()
+        try:
+            counter = db.get(DataCounter, DATA_VERSION_COUNTER)
+            version = counter.value if counter else 0
+        finally:
+            db.close()
+        self._version_cache = (now, version)
+        return version
+    
+    @timed("db.add_lottery_draw")
     def add_lottery_draw(self, period: str, draw_date: date, numbers: List[int], special_number: int) -> bool:
         """新增開獎資料"""
         db = self.get_db()
@@ -18,41 +104,293 @@ class DatabaseManager:
             # 檢查是否已存在
             existing = db.query(LotteryDraw).filter(LotteryDraw.period == period).first()
             if existing:
+                content_changed = (existing.numbers != numbers
+                                   or existing.special_number != special_number
+                                   or existing.draw_date != draw_date)
+                # 號碼被修改代表歷史資料改寫，增量狀態需要重算
+                if existing.numbers != numbers or existing.special_number != special_number:
+                    self._mark_state_stale(db)
+                if existing.numbers != numbers:
+                    existing.number_mask = numbers_to_mask(numbers)
+                    self._replace_draw_numbers(db, [(existing.id, numbers)])
                 # 更新現有資料
                 existing.draw_date = draw_date
                 existing.numbers = numbers
                 existing.special_number = special_number
                 existing.updated_at = datetime.utcnow()
+                if content_changed:
+                    self._rebuild_statistics(db)
             else:
                 # 建立新資料
                 draw = LotteryDraw(
                     period=period,
                     draw_date=draw_date,
                     numbers=numbers,
-                    special_number=special_number
+                    special_number=special_number,
+                    number_mask=numbers_to_mask(numbers)
                 )
-                db.add(draw)
+                self._adjust_draw_count(db, 1)
+                if not self._assign_sequence(db, draw):
+                    # 插入較舊的期數，需重新編排期序
+                    db.add(draw)
+                    db.flush()
+                    self._renumber_sequences(db)
+                    self._mark_state_stale(db)
+                else:
+                    self._apply_draws_to_state(db, [
+                        {'period': period, 'numbers': numbers, 'special_number': special_number}
+                    ])
+                    db.add(draw)
+                    db.flush()
+                self._replace_draw_numbers(db, [(draw.id, numbers)])
+                self._apply_draws_to_statistics(db, [
+                    {'date': draw_date, 'numbers': numbers, 'special_number': special_number}
+                ])
             
-            db.commit()
+            self._commit_data_change(db)
             return True
-        except Exception as e:
+        except Exception:
             db.rollback()
-            print(f"新增開獎資料錯誤: {e}")
+            logger.exception("新增開獎資料錯誤")
             return False
         finally:
             db.close()
     
+    @timed("db.bulk_upsert_draws")
+    def bulk_upsert_draws(self, draws: List[dict]) -> Dict[str, int]:
+        """以單一交易批次新增或更新開獎資料
+        
+        draws 每筆包含 period、date、numbers、special_number（與爬蟲輸出格式相同）。
+        SQLite 與 PostgreSQL 使用 INSERT ... ON CONFLICT(period) DO UPDATE。
+        """
+        started = time.perf_counter()
+        # 同一批次中重複的期數以最後一筆為準
+        incoming = {}
+        for draw in draws:
+            incoming[str(draw['period'])] = draw
+        
+        db = self.get_db()
+        try:
+            # 一次查出已存在的期數，分類為新增、更新與未變動
+            existing = {}
+            periods = list(incoming.keys())
+            for start in range(0, len(periods), BULK_CHUNK_SIZE):
+                chunk = periods[start:start + BULK_CHUNK_SIZE]
+                for row in db.query(
+                    LotteryDraw.period, LotteryDraw.draw_date,
+                    LotteryDraw.numbers, LotteryDraw.special_number
+                ).filter(LotteryDraw.period.in_(chunk)):
+                    existing[row.period] = row
+            
+            new_draws = []
+            changed_draws = []
+            unchanged_count = 0
+            for period, draw in incoming.items():
+                current = existing.get(period)
+                if current is None:
+                    new_draws.append(draw)
+                elif (current.numbers != draw['numbers']
+                      or current.special_number != draw['special_number']
+                      or current.draw_date != draw['date']):
+                    changed_draws.append(draw)
+                else:
+                    unchanged_count += 1
+            
+            new_draws.sort(key=lambda d: int(d['period']))
+            
+            # 新資料皆比目前最新期數更新時直接接續期序，否則寫入後重新編排
+            latest = self._latest_sequence(db)
+            if latest is None:
+                next_sequence = 0
+            elif latest.sequence is not None and new_draws and int(new_draws[0]['period']) > int(latest.period):
+                next_sequence = latest.sequence + 1
+            else:
+                next_sequence = None
+            
+            # 歷史號碼被修改或插入舊期數時，增量狀態需要重算
+            numbers_changed = any(
+                existing[str(d['period'])].numbers != d['numbers']
+                or existing[str(d['period'])].special_number != d['special_number']
+                for d in changed_draws
+            )
+            inserted_older = bool(new_draws) and next_sequence is None
+            if numbers_changed or inserted_older:
+                self._mark_state_stale(db)
+            elif new_draws:
+                self._apply_draws_to_state(db, [
+                    {'period': str(d['period']), 'numbers': d['numbers'], 'special_number': d['special_number']}
+                    for d in new_draws
+                ])
+            
+            now = datetime.utcnow()
+            rows = []
+            for index, draw in enumerate(new_draws):
+                rows.append({
+                    'period': str(draw['period']),
+                    'draw_date': draw['date'],
+                    'numbers': draw['numbers'],
+                    'special_number': draw['special_number'],
+                    'number_mask': numbers_to_mask(draw['numbers']),
+                    'sequence': next_sequence + index if next_sequence is not None else None,
+                    'created_at': now,
+                    'updated_at': now
+                })
+            for draw in changed_draws:
+                rows.append({
+                    'period': str(draw['period']),
+                    'draw_date': draw['date'],
+                    'numbers': draw['numbers'],
+                    'special_number': draw['special_number'],
+                    'number_mask': numbers_to_mask(draw['numbers']),
+                    'sequence': None,  # 既有資料保留原本的期序
+                    'created_at': now,
+                    'updated_at': now
+                })
+            
+            self._upsert_rows(db, rows, set(existing.keys()))
+            self._adjust_draw_count(db, len(new_draws))
+            
+            # 更新新增或號碼變動期數的正規化號碼
+            indexed = new_draws + [
+                d for d in changed_draws if existing[str(d['period'])].numbers != d['numbers']
+            ]
+            if indexed:
+                numbers_by_period = {str(d['period']): d['numbers'] for d in indexed}
+                self._replace_draw_numbers(db, [
+                    (draw_id, numbers_by_period[period])
+                    for draw_id, period in self._ids_for_periods(db, list(numbers_by_period.keys()))
+                ])
+            if next_sequence is None and new_draws:
+                self._renumber_sequences(db)
+            
+            # 更新統計彙總：既有資料有變動時以 SQL 重建，否則只累加新資料
+            if changed_draws:
+                self._rebuild_statistics(db)
+            elif new_draws:
+                self._apply_draws_to_statistics(db, new_draws)
+            
+            self._commit_data_change(db, changed=bool(new_draws or changed_draws))
+            
+            result = {
+                'added_count': len(new_draws),
+                'updated_count': len(changed_draws),
+                'unchanged_count': unchanged_count,
+                'total_processed': len(incoming)
+            }
+            logger.info("批次寫入完成", extra={
+                'added': result['added_count'], 'updated': result['updated_count'],
+                'unchanged': result['unchanged_count'],
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+            })
+            return result
+        except Exception:
+            db.rollback()
+            logger.exception("批次寫入開獎資料錯誤")
+            raise
+        finally:
+            db.close()
+    
+    @timed("db.export_snapshot")
+    def export_snapshot(self, path: str) -> Dict[str, int]:
+        """將所有開獎資料依期序匯出為 .npz 快照（格式見 snapshot.py）"""
+        from snapshot import write_snapshot  # NumPy 只在匯出或匯入時載入
+        
+        db = self.get_db()
+        try:
+            rows = db.query(
+                LotteryDraw.period, LotteryDraw.draw_date, LotteryDraw.numbers, LotteryDraw.special_number
+            ).order_by(LotteryDraw.sequence).all()
+        finally:
+            db.close()
+        
+        write_snapshot(path, rows)
+        logger.info("已匯出快照", extra={'path': path, 'rows': len(rows)})
+        return {'exported_count': len(rows)}
+    
+    @timed("db.import_snapshot")
+    def import_snapshot(self, path: str) -> Dict[str, int]:
+        """載入 .npz 快照，以 bulk_upsert_draws 在單一交易中寫入（已存在的期數依快照內容更新）
+        
+        快照涵蓋的月份記錄為已完整爬取，之後的更新只爬取快照之後的月份；
+        快照最後一期所在的月份可能只有部分資料，與當月一樣留給爬蟲重新取得。
+        """
+        from snapshot import read_snapshot
+        
+        draws = read_snapshot(path)
+        result = self.bulk_upsert_draws(draws)
+        
+        month_counts: Dict[str, int] = {}
+        for draw in draws:
+            key = f"{draw['date'].year}-{draw['date'].month:02d}"
+            month_counts[key] = month_counts.get(key, 0) + 1
+        if draws:
+            last_month = max(month_counts)
+            today = date.today()
+            month_counts.pop(last_month)
+            month_counts.pop(f"{today.year}-{today.month:02d}", None)
+        completed = self.get_crawl_watermark()['completed_months']
+        months = [
+            {'year_month': key, 'draw_count': count, 'is_complete': True}
+            for key, count in sorted(month_counts.items()) if key not in completed
+        ]
+        if months:
+            self.record_crawl_months(months)
+        result['completed_months'] = len(months)
+        return result
+    
+    def _upsert_rows(self, db: Session, rows: List[dict], existing_periods: set):
+        """依資料庫方言批次寫入；衝突時只更新開獎內容，不動期序與建立時間"""
+        dialect = db.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                dialect_insert = sqlite_insert
+            else:
+                # PostgreSQL 方言只在使用時才載入，縮短冷啟動時間
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            if not rows:
+                return
+            stmt = dialect_insert(LotteryDraw)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[LotteryDraw.period],
+                set_={
+                    'draw_date': stmt.excluded.draw_date,
+                    'numbers': stmt.excluded.numbers,
+                    'special_number': stmt.excluded.special_number,
+                    'number_mask': stmt.excluded.number_mask,
+                    'updated_at': stmt.excluded.updated_at
+                }
+            )
+            # 以參數清單執行：語句只編譯一次，由驅動程式分批送出（不受 SQLite 參數數量上限影響）
+            db.execute(stmt, rows)
+            return
+        
+        # 其他資料庫逐筆寫入（仍在同一交易中）
+        for row in rows:
+            if row['period'] in existing_periods:
+                db.query(LotteryDraw).filter(LotteryDraw.period == row['period']).update({
+                    'draw_date': row['draw_date'],
+                    'numbers': row['numbers'],
+                    'special_number': row['special_number'],
+                    'number_mask': row['number_mask'],
+                    'updated_at': row['updated_at']
+                }, synchronize_session=False)
+            else:
+                db.add(LotteryDraw(**row))
+        db.flush()
+    
+    @timed("db.get_all_draws")
     def get_all_draws(self, limit: Optional[int] = None) -> List[LotteryDraw]:
         """取得所有開獎資料"""
         db = self.get_db()
         try:
-            query = db.query(LotteryDraw).order_by(LotteryDraw.period.desc())
+            query = db.query(LotteryDraw).order_by(LotteryDraw.sequence.desc())
             if limit:
                 query = query.limit(limit)
             return query.all()
         finally:
             db.close()
     
+    @timed("db.get_draws_paginated")
     def get_draws_paginated(self, page: int = 1, limit: int = 10) -> List[LotteryDraw]:
         """取得分頁開獎資料"""
         db = self.get_db()
@@ -62,22 +400,78 @@ class DatabaseManager:
         finally:
             db.close()
     
+    @timed("db.get_draws_before")
+    def get_draws_before(self, before: Optional[str] = None, limit: int = 10) -> List[LotteryDraw]:
+        """以期數為游標取得分頁開獎資料（使用期數唯一索引，不受頁數深度影響）"""
+        db = self.get_db()
+        try:
+            query = db.query(LotteryDraw)
+            if before:
+                query = query.filter(LotteryDraw.period < before)
+            return query.order_by(LotteryDraw.period.desc()).limit(limit).all()
+        finally:
+            db.close()
+    
+    def iter_draws(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                   batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[tuple]]:
+        """依期序由舊到新逐批取得 (期數, 期序, 開獎日期, 號碼, 特別號)
+
+        以伺服器端游標（yield_per）讀取，記憶體用量只與 batch_size 有關；
+        session 在產生器結束或被關閉時才釋放，呼叫端應讀完或呼叫 close()。
+        """
+        db = self.get_db()
+        try:
+            query = db.query(
+                LotteryDraw.period, LotteryDraw.sequence, LotteryDraw.draw_date,
+                LotteryDraw.numbers, LotteryDraw.special_number
+            )
+            if date_from:
+                query = query.filter(LotteryDraw.draw_date >= date_from)
+            if date_to:
+                query = query.filter(LotteryDraw.draw_date <= date_to)
+            result = db.execute(
+                query.order_by(LotteryDraw.sequence).statement.execution_options(yield_per=batch_size)
+            )
+            for rows in result.partitions():
+                yield [tuple(row) for row in rows]
+        finally:
+            db.close()
+    
+    @timed("db.get_total_draws_count")
     def get_total_draws_count(self) -> int:
-        """取得開獎資料總數"""
+        """取得開獎資料總數（讀取寫入時維護的計數器，資料未變動時不查詢資料庫）"""
+        version = self.data_version
+        if self._total_cache and self._total_cache[0] == version:
+            return self._total_cache[1]
+        
         db = self.get_db()
         try:
-            return db.query(LotteryDraw).count()
+            counter = db.get(DataCounter, DRAW_COUNTER)
+            if counter is None:
+                # 第一次使用時由實際筆數初始化計數器
+                total = db.query(LotteryDraw).count()
+                db.add(DataCounter(name=DRAW_COUNTER, value=total))
+                try:
+                    db.commit()
+                except Exception:
+                    db.rollback()
+            else:
+                total = counter.value
+            self._total_cache = (version, total)
+            return total
         finally:
             db.close()
     
+    @timed("db.get_latest_draw")
     def get_latest_draw(self) -> Optional[LotteryDraw]:
         """取得最新一期開獎資料"""
         db = self.get_db()
         try:
-            return db.query(LotteryDraw).order_by(LotteryDraw.period.desc()).first()
+            return db.query(LotteryDraw).order_by(LotteryDraw.sequence.desc()).first()
         finally:
             db.close()
     
+    @timed("db.get_draws_by_date_range")
     def get_draws_by_date_range(self, start_date: date, end_date: date) -> List[LotteryDraw]:
         """根據日期範圍取得開獎資料"""
         db = self.get_db()
@@ -89,6 +483,7 @@ class DatabaseManager:
         finally:
             db.close()
     
+    @timed("db.save_analysis_result")
     def save_analysis_result(self, period: str, avoid_numbers: List[int], 
                            frequency_data: dict, gap_analysis: dict, total_periods: int) -> bool:
         """儲存分析結果"""
@@ -116,13 +511,14 @@ class DatabaseManager:
             
             db.commit()
             return True
-        except Exception as e:
+        except Exception:
             db.rollback()
-            print(f"儲存分析結果錯誤: {e}")
+            logger.exception("儲存分析結果錯誤")
             return False
         finally:
             db.close()
     
+    @timed("db.get_latest_analysis")
     def get_latest_analysis(self) -> Optional[AnalysisResult]:
         """取得最新分析結果"""
         db = self.get_db()
@@ -131,32 +527,34 @@ class DatabaseManager:
         finally:
             db.close()
     
-    def get_total_draws_count(self) -> int:
-        """取得總開獎期數"""
-        db = self.get_db()
-        try:
-            return db.query(LotteryDraw).count()
-        finally:
-            db.close()
-
+    @timed("db.clear_all_data")
     def clear_all_data(self) -> bool:
         """清理所有開獎資料和分析結果"""
         db = self.get_db()
         try:
             # 刪除所有分析結果
             db.query(AnalysisResult).delete()
-            # 刪除所有開獎資料
+            # 刪除所有開獎資料、統計彙總與爬取紀錄
+            db.query(NumberStatistic).delete()
+            db.query(DrawNumber).delete()
             db.query(LotteryDraw).delete()
-            db.commit()
-            print("已清理所有資料")
+            db.query(CrawlMonth).delete()
+            db.query(DataCounter).filter(DataCounter.name == DRAW_COUNTER).update(
+                {DataCounter.value: 0}, synchronize_session=False
+            )
+            # 重設增量分析狀態
+            self._save_state(db, IncrementalStats())
+            self._commit_data_change(db)
+            logger.info("已清理所有資料")
             return True
-        except Exception as e:
+        except Exception:
             db.rollback()
-            print(f"清理資料失敗: {e}")
+            logger.exception("清理資料失敗")
             return False
         finally:
             db.close()
 
+    @timed("db.clear_mock_data")
     def clear_mock_data(self) -> bool:
         """清理模擬資料（2025年或期數格式錯誤的資料）"""
         db = self.get_db()
@@ -176,16 +574,541 @@ class DatabaseManager:
                 LotteryDraw.draw_date.is_(None)
             ).delete()
             
-            db.commit()
             total_deleted = deleted_2025 + deleted_wrong_format + deleted_no_date
-            print(f"已清理模擬資料: {total_deleted} 筆")
+            if total_deleted:
+                # 刪除已不存在期數的正規化號碼
+                db.query(DrawNumber).filter(
+                    ~DrawNumber.draw_id.in_(db.query(LotteryDraw.id))
+                ).delete(synchronize_session=False)
+                self._adjust_draw_count(db, -total_deleted)
+                self._rebuild_statistics(db)
+                self._renumber_sequences(db)
+                self._mark_state_stale(db)
+                # 被刪除的月份需要重新爬取
+                db.query(CrawlMonth).delete()
+            
+            self._commit_data_change(db)
+            logger.info("已清理模擬資料", extra={'deleted': total_deleted})
             return True
-        except Exception as e:
+        except Exception:
             db.rollback()
-            print(f"清理模擬資料失敗: {e}")
+            logger.exception("清理模擬資料失敗")
             return False
         finally:
             db.close()
 
+    @timed("db.get_number_frequency")
+    def get_number_frequency(self, start_date: Optional[date] = None,
+                             end_date: Optional[date] = None) -> Dict[int, int]:
+        """以 SQL 彙總各號碼出現次數，可指定日期範圍"""
+        db = self.get_db()
+        try:
+            query = db.query(DrawNumber.number, func.count())
+            if start_date or end_date:
+                query = query.join(LotteryDraw, LotteryDraw.id == DrawNumber.draw_id)
+                if start_date:
+                    query = query.filter(LotteryDraw.draw_date >= start_date)
+                if end_date:
+                    query = query.filter(LotteryDraw.draw_date <= end_date)
+            return {number: count for number, count in query.group_by(DrawNumber.number)}
+        finally:
+            db.close()
+    
+    @timed("db.get_periods_with_number")
+    def get_periods_with_number(self, number: int, limit: Optional[int] = None) -> List[str]:
+        """取得開出指定號碼的期數（最新的在前）"""
+        db = self.get_db()
+        try:
+            query = db.query(LotteryDraw.period).join(
+                DrawNumber, DrawNumber.draw_id == LotteryDraw.id
+            ).filter(DrawNumber.number == number).order_by(LotteryDraw.sequence.desc())
+            if limit:
+                query = query.limit(limit)
+            return [row.period for row in query]
+        finally:
+            db.close()
+    
+    @timed("db.count_draws_with_numbers")
+    def count_draws_with_numbers(self, numbers: List[int], start_date: Optional[date] = None,
+                                 end_date: Optional[date] = None) -> int:
+        """以位元遮罩計算同時開出所有指定號碼的期數，可指定日期範圍"""
+        mask = numbers_to_mask(numbers)
+        db = self.get_db()
+        try:
+            query = db.query(func.count(LotteryDraw.id)).filter(
+                LotteryDraw.number_mask.op('&')(mask) == mask
+            )
+            if start_date:
+                query = query.filter(LotteryDraw.draw_date >= start_date)
+            if end_date:
+                query = query.filter(LotteryDraw.draw_date <= end_date)
+            return query.scalar()
+        finally:
+            db.close()
+    
+    @timed("db.count_draws_in_range")
+    def count_draws_in_range(self, start_date: date, end_date: date) -> int:
+        """計算日期範圍內的開獎期數（使用開獎日期索引）"""
+        db = self.get_db()
+        try:
+            return db.query(func.count(LotteryDraw.id)).filter(
+                LotteryDraw.draw_date >= start_date,
+                LotteryDraw.draw_date <= end_date
+            ).scalar()
+        finally:
+            db.close()
+    
+    @timed("db.get_statistics_rows")
+    def get_statistics_rows(self) -> List[NumberStatistic]:
+        """取得統計彙總（約 47 列）"""
+        db = self.get_db()
+        try:
+            return db.query(NumberStatistic).all()
+        finally:
+            db.close()
+    
+    @timed("db.rebuild_statistics")
+    def rebuild_statistics(self) -> bool:
+        """由開獎資料重建統計彙總（修復用）"""
+        db = self.get_db()
+        try:
+            self._rebuild_statistics(db)
+            self._commit_data_change(db)
+            logger.info("已重建統計彙總")
+            return True
+        except Exception:
+            db.rollback()
+            logger.exception("重建統計彙總失敗")
+            return False
+        finally:
+            db.close()
+    
+    @timed("db.get_crawl_watermark")
+    def get_crawl_watermark(self) -> dict:
+        """取得爬取水位：最新一期期數與日期，以及已完整爬取的月份"""
+        db = self.get_db()
+        try:
+            latest = db.query(LotteryDraw.period, LotteryDraw.draw_date).order_by(
+                LotteryDraw.sequence.desc()
+            ).first()
+            completed = db.query(CrawlMonth.year_month).filter(CrawlMonth.is_complete.is_(True)).all()
+            return {
+                'latest_period': latest.period if latest else None,
+                'latest_date': latest.draw_date if latest else None,
+                'completed_months': {row.year_month for row in completed}
+            }
+        finally:
+            db.close()
+    
+    @timed("db.record_crawl_months")
+    def record_crawl_months(self, months: List[dict]) -> bool:
+        """記錄各月份的爬取結果，每筆包含 year_month、draw_count、is_complete"""
+        db = self.get_db()
+        try:
+            year_months = [month['year_month'] for month in months]
+            existing = {
+                row.year_month: row
+                for row in db.query(CrawlMonth).filter(CrawlMonth.year_month.in_(year_months))
+            }
+            now = datetime.utcnow()
+            for month in months:
+                row = existing.get(month['year_month'])
+                if not row:
+                    row = CrawlMonth(year_month=month['year_month'])
+                    db.add(row)
+                row.draw_count = month['draw_count']
+                row.is_complete = month['is_complete']
+                row.fetched_at = now
+            db.commit()
+            return True
+        except Exception:
+            db.rollback()
+            logger.exception("記錄爬取月份錯誤")
+            return False
+        finally:
+            db.close()
+    
+    @timed("db.save_job")
+    def save_job(self, record: dict) -> bool:
+        """新增或更新背景工作紀錄；record 的欄位與 JobRecord 相同"""
+        db = self.get_db()
+        try:
+            db.merge(JobRecord(**record))
+            db.commit()
+            return True
+        except Exception:
+            db.rollback()
+            logger.exception("儲存工作紀錄錯誤")
+            return False
+        finally:
+            db.close()
+    
+    @timed("db.create_job")
+    def create_job(self, record: dict) -> bool:
+        """新增背景工作紀錄；相同 ID 已存在時回傳 False（多個行程爭取同一次排程時只有一個成功）"""
+        db = self.get_db()
+        try:
+            db.add(JobRecord(**record))
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+        except Exception:
+            db.rollback()
+            logger.exception("新增工作紀錄錯誤")
+            return False
+        finally:
+            db.close()
+    
+    @timed("db.get_job")
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """取得背景工作紀錄（格式與 Job.to_dict 相同）"""
+        db = self.get_db()
+        try:
+            row = db.get(JobRecord, job_id)
+            return self._job_to_dict(row) if row else None
+        finally:
+            db.close()
+    
+    @timed("db.get_recent_jobs")
+    def get_recent_jobs(self, limit: int = 20) -> List[dict]:
+        """最近加入的背景工作紀錄（新的在前）"""
+        db = self.get_db()
+        try:
+            rows = db.query(JobRecord).order_by(JobRecord.created_at.desc()).limit(limit).all()
+            return [self._job_to_dict(row) for row in rows]
+        finally:
+            db.close()
+    
+    @timed("db.prune_jobs")
+    def prune_jobs(self, keep: int) -> int:
+        """只保留最近的 keep 筆已完成工作紀錄，回傳刪除筆數"""
+        db = self.get_db()
+        try:
+            cutoff = db.query(JobRecord.created_at).order_by(JobRecord.created_at.desc()).offset(keep).first()
+            if cutoff is None:
+                return 0
+            deleted = db.query(JobRecord).filter(
+                JobRecord.created_at <= cutoff.created_at,
+                JobRecord.status.in_(("succeeded", "failed"))
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        except Exception:
+            db.rollback()
+            logger.exception("清理工作紀錄錯誤")
+            return 0
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _job_to_dict(row: JobRecord) -> dict:
+        return {
+            'id': row.id,
+            'kind': row.kind,
+            'params': row.params or {},
+            'trigger': row.trigger,
+            'status': row.status,
+            'created_at': row.created_at.isoformat(),
+            'started_at': row.started_at.isoformat() if row.started_at else None,
+            'finished_at': row.finished_at.isoformat() if row.finished_at else None,
+            'progress': row.progress or {},
+            'result': row.result,
+            'error': row.error
+        }
+    
+    @timed("db.get_analysis_state")
+    def get_analysis_state(self) -> Optional[IncrementalStats]:
+        """取得增量分析狀態，若不存在或已過期則回傳 None"""
+        db = self.get_db()
+        try:
+            row = db.query(AnalysisState).first()
+            if not row or row.is_stale or not IncrementalStats.is_compatible(row.state):
+                return None
+            return IncrementalStats.from_dict(row.state)
+        finally:
+            db.close()
+    
+    @timed("db.rebuild_analysis_state")
+    def rebuild_analysis_state(self, draws: Optional[List[LotteryDraw]] = None) -> IncrementalStats:
+        """重建增量分析狀態
+        
+        draws 為已載入的全部開獎資料（依期數遞增），未傳入時由資料庫讀取。
+        建立期間若有其他寫入新增資料，狀態維持過期，由下次分析重算。
+        """
+        db = self.get_db()
+        try:
+            if draws is None:
+                draws = db.query(LotteryDraw).order_by(LotteryDraw.sequence).all()
+            stats = IncrementalStats.from_draws(draws)
+            
+            # 先標記過期並送出以取得寫入鎖，再確認資料與建立狀態時相同
+            row = db.query(AnalysisState).with_for_update().first()
+            self._mark_state_stale(db, row)
+            db.flush()
+            latest = self._latest_sequence(db)
+            total = db.query(func.count(LotteryDraw.id)).scalar()
+            if total == stats.total_draws and (latest.period if latest else None) == stats.latest_period:
+                self._save_state(db, stats)
+                logger.info("已重建增量分析狀態", extra={'total_draws': stats.total_draws})
+            else:
+                logger.info("重建期間資料已變動，增量狀態維持過期", extra={
+                    'total_draws': total, 'state_draws': stats.total_draws
+                })
+            db.commit()
+            return stats
+        except Exception:
+            db.rollback()
+            logger.exception("重建增量分析狀態失敗")
+            raise
+        finally:
+            db.close()
+    
+    def _adjust_draw_count(self, db: Session, delta: int):
+        """在同一交易中調整開獎資料總數計數器（尚未初始化時於讀取時再計算）"""
+        if delta:
+            db.query(DataCounter).filter(DataCounter.name == DRAW_COUNTER).update(
+                {DataCounter.value: DataCounter.value + delta}, synchronize_session=False
+            )
+    
+    def _commit_data_change(self, db: Session, changed: bool = True):
+        """提交交易；開獎資料有異動時在同一交易中遞增資料版本，並讓本行程的版本快取失效"""
+        if changed:
+            updated = db.query(DataCounter).filter(DataCounter.name == DATA_VERSION_COUNTER).update(
+                {DataCounter.value: DataCounter.value + 1}, synchronize_session=False
+            )
+            if not updated:
+                db.add(DataCounter(name=DATA_VERSION_COUNTER, value=int(time.time())))
+        db.commit()
+        if changed:
+            self._version_cache = None
+    
+    def _latest_sequence(self, db: Session):
+        """取得目前最新一期的 (period, sequence)"""
+        return db.query(LotteryDraw.period, LotteryDraw.sequence).order_by(
+            LotteryDraw.sequence.desc()
+        ).first()
+    
+    def _assign_sequence(self, db: Session, draw: LotteryDraw) -> bool:
+        """為最新一期指定下一個期序；期數不是最新時回傳 False"""
+        latest = self._latest_sequence(db)
+        if latest is None:
+            draw.sequence = 0
+            return True
+        try:
+            is_newer = int(draw.period) > int(latest.period)
+        except ValueError:
+            is_newer = False
+        if not is_newer or latest.sequence is None:
+            return False
+        draw.sequence = latest.sequence + 1
+        return True
+    
+    def _renumber_sequences(self, db: Session):
+        """依期數重新編排所有開獎資料的連續期序"""
+        rows = db.query(LotteryDraw.id, LotteryDraw.period).all()
+        rows.sort(key=lambda row: int(row.period))
+        db.bulk_update_mappings(LotteryDraw, [
+            {'id': row.id, 'sequence': index} for index, row in enumerate(rows)
+        ])
+    
+    def _backfill_sequences(self):
+        """為尚未有期序的既有資料補上期序"""
+        db = self.get_db()
+        try:
+            missing = db.query(LotteryDraw.id).filter(LotteryDraw.sequence.is_(None)).first()
+            if missing is None:
+                return
+            self._renumber_sequences(db)
+            self._mark_state_stale(db)
+            db.commit()
+            logger.info("已補上開獎資料期序")
+        except Exception:
+            db.rollback()
+            logger.exception("補上開獎資料期序失敗")
+        finally:
+            db.close()
+    
+    def _ids_for_periods(self, db: Session, periods: List[str]) -> List[tuple]:
+        """取得期數對應的資料列 id，回傳 (id, period)"""
+        result = []
+        for start in range(0, len(periods), BULK_CHUNK_SIZE):
+            chunk = periods[start:start + BULK_CHUNK_SIZE]
+            result.extend(
+                (row.id, row.period)
+                for row in db.query(LotteryDraw.id, LotteryDraw.period).filter(LotteryDraw.period.in_(chunk))
+            )
+        return result
+    
+    def _replace_draw_numbers(self, db: Session, items: List[tuple]):
+        """以 (draw_id, numbers) 重寫正規化號碼表中的資料"""
+        if not items:
+            return
+        draw_ids = [draw_id for draw_id, _ in items]
+        for start in range(0, len(draw_ids), BULK_CHUNK_SIZE):
+            db.query(DrawNumber).filter(
+                DrawNumber.draw_id.in_(draw_ids[start:start + BULK_CHUNK_SIZE])
+            ).delete(synchronize_session=False)
+        db.execute(insert(DrawNumber), [
+            {'draw_id': draw_id, 'number': number}
+            for draw_id, numbers in items
+            for number in set(numbers)
+        ])
+    
+    def _backfill_number_index(self):
+        """為既有資料補上號碼位元遮罩與正規化號碼"""
+        db = self.get_db()
+        try:
+            rows = db.query(LotteryDraw.id, LotteryDraw.numbers).filter(
+                LotteryDraw.number_mask.is_(None)
+            ).all()
+            if not rows:
+                return
+            db.bulk_update_mappings(LotteryDraw, [
+                {'id': row.id, 'number_mask': numbers_to_mask(row.numbers)} for row in rows
+            ])
+            self._replace_draw_numbers(db, [(row.id, row.numbers) for row in rows])
+            db.commit()
+            logger.info("已補上開獎資料的號碼索引", extra={'rows': len(rows)})
+        except Exception:
+            db.rollback()
+            logger.exception("補上號碼索引失敗")
+        finally:
+            db.close()
+    
+    def _apply_draws_to_statistics(self, db: Session, draws: List[dict]):
+        """在同一交易中將新開獎資料累加到統計彙總，每筆包含 date、numbers、special_number"""
+        # 先彙總為 (類型, 號碼) -> [次數, 最早日期, 最晚日期]，每個統計列只更新一次
+        totals = {}
+        
+        def bump(kind: str, number: int, draw_date: date):
+            entry = totals.get((kind, number))
+            if entry is None:
+                totals[(kind, number)] = [1, draw_date, draw_date]
+                return
+            entry[0] += 1
+            if draw_date:
+                entry[1] = min(entry[1], draw_date) if entry[1] else draw_date
+                entry[2] = max(entry[2], draw_date) if entry[2] else draw_date
+        
+        for draw in draws:
+            for number in draw['numbers']:
+                bump('number', number, draw['date'])
+            if draw['special_number'] is not None:
+                bump('special', draw['special_number'], draw['date'])
+            bump('total', 0, draw['date'])
+        
+        rows = {(row.kind, row.number): row for row in db.query(NumberStatistic)}
+        for (kind, number), (count, first_date, last_date) in totals.items():
+            row = rows.get((kind, number))
+            if row is None:
+                row = NumberStatistic(kind=kind, number=number, count=0)
+                db.add(row)
+            row.count += count
+            if first_date:
+                row.first_date = min(row.first_date, first_date) if row.first_date else first_date
+            if last_date:
+                row.last_date = max(row.last_date, last_date) if row.last_date else last_date
+    
+    def _rebuild_statistics(self, db: Session):
+        """在同一交易中以 SQL 彙總重建統計彙總"""
+        db.flush()
+        db.query(NumberStatistic).delete()
+        
+        rows = []
+        number_stats = db.query(
+            DrawNumber.number, func.count(), func.min(LotteryDraw.draw_date), func.max(LotteryDraw.draw_date)
+        ).join(LotteryDraw, LotteryDraw.id == DrawNumber.draw_id).group_by(DrawNumber.number)
+        for number, count, first_date, last_date in number_stats:
+            rows.append(NumberStatistic(kind='number', number=number, count=count,
+                                        first_date=first_date, last_date=last_date))
+        
+        special_stats = db.query(
+            LotteryDraw.special_number, func.count(), func.min(LotteryDraw.draw_date), func.max(LotteryDraw.draw_date)
+        ).filter(LotteryDraw.special_number.isnot(None)).group_by(LotteryDraw.special_number)
+        for number, count, first_date, last_date in special_stats:
+            rows.append(NumberStatistic(kind='special', number=number, count=count,
+                                        first_date=first_date, last_date=last_date))
+        
+        total, first_date, last_date = db.query(
+            func.count(LotteryDraw.id), func.min(LotteryDraw.draw_date), func.max(LotteryDraw.draw_date)
+        ).one()
+        if total:
+            rows.append(NumberStatistic(kind='total', number=0, count=total,
+                                        first_date=first_date, last_date=last_date))
+        
+        db.add_all(rows)
+    
+    def _backfill_statistics(self):
+        """既有資料尚未建立統計彙總時補上"""
+        db = self.get_db()
+        try:
+            if db.query(NumberStatistic.kind).first() is not None:
+                return
+            if db.query(LotteryDraw.id).first() is None:
+                return
+            self._rebuild_statistics(db)
+            db.commit()
+            logger.info("已建立統計彙總")
+        except Exception:
+            db.rollback()
+            logger.exception("建立統計彙總失敗")
+        finally:
+            db.close()
+    
+    def _init_data_version(self):
+        """建立資料版本計數器；初始值為建立時間（秒），資料庫重建後不會與先前的版本（及 ETag）重複"""
+        db = self.get_db()
+        try:
+            if db.get(DataCounter, DATA_VERSION_COUNTER) is None:
+                db.add(DataCounter(name=DATA_VERSION_COUNTER, value=int(time.time())))
+                db.commit()
+        except Exception:
+            # 其他行程同時建立時以對方的計數器為準
+            db.rollback()
+        finally:
+            db.close()
+    
+    def _apply_draws_to_state(self, db: Session, draws: List[dict]):
+        """在同一交易中以每期 O(38) 更新增量狀態；期數不是最新時標記為需重算
+        
+        draws 需依期數遞增排列，每筆包含 period、numbers、special_number
+        """
+        row = db.query(AnalysisState).first()
+        if not row and db.query(LotteryDraw.id).first() is None:
+            # 資料庫中尚無開獎資料，從空狀態開始累積
+            row = AnalysisState(state=IncrementalStats().to_dict(), is_stale=False)
+            db.add(row)
+        if not row or row.is_stale or not IncrementalStats.is_compatible(row.state):
+            self._mark_state_stale(db, row)
+            return
+        
+        stats = IncrementalStats.from_dict(row.state)
+        for draw in draws:
+            if not stats.is_newer(draw['period']):
+                # 插入較舊的期數代表歷史被改寫
+                self._mark_state_stale(db, row)
+                return
+            stats.apply_draw(draw['period'], draw['numbers'], draw['special_number'])
+        self._save_state(db, stats, row)
+    
+    def _mark_state_stale(self, db: Session, row: Optional[AnalysisState] = None):
+        """標記增量狀態過期，下次分析時完整重算"""
+        row = row or db.query(AnalysisState).first()
+        if not row:
+            row = AnalysisState()
+            db.add(row)
+        row.is_stale = True
+    
+    def _save_state(self, db: Session, stats: IncrementalStats, row: Optional[AnalysisState] = None):
+        """儲存增量狀態"""
+        row = row or db.query(AnalysisState).first()
+        if not row:
+            row = AnalysisState()
+            db.add(row)
+        row.state = stats.to_dict()
+        row.is_stale = False
+
 # 全域資料庫管理員實例
 db_manager = DatabaseManager()
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""
+開獎矩陣 - 以 N x 38 的 uint8 矩陣表示歷史開獎，供分析器做向量化統計
+"""
+import numpy as np
+from typing import List, Optional, Tuple
+
+NUMBER_COUNT = 38  # 威力彩號碼 1-38
+SPECIAL_COUNT = 8  # 特別號 1-8
+
+class DrawMatrix:
+    """依期數遞增排列的開獎矩陣，第 i 列第 j 欄為 1 表示第 i 期開出號碼 j+1"""
+
+    def __init__(self, periods: List[str], dates: list, numbers: np.ndarray, specials: np.ndarray):
+        self.periods = periods
+        self.dates = dates
+        self.numbers = numbers
+        self.specials = specials  # 特別號，0 表示缺值
+        self._cumulative = None
+
+    @classmethod
+    def from_draws(cls, draws) -> "DrawMatrix":
+        """由 LotteryDraw 列表建立矩陣（輸入順序不限）"""
+        draws = sorted(draws, key=lambda d: int(d.period))
+        total = len(draws)
+
+        numbers = np.zeros((total, NUMBER_COUNT), dtype=np.uint8)
+        if total:
+            columns = np.array([draw.numbers for draw in draws], dtype=np.intp) - 1
+            numbers[np.arange(total)[:, None], columns] = 1
+
+        specials = np.array([draw.special_number or 0 for draw in draws], dtype=np.int8)
+        specials[(specials < 0) | (specials > SPECIAL_COUNT)] = 0
+
+        return cls(
+            periods=[draw.period for draw in draws],
+            dates=[draw.draw_date for draw in draws],
+            numbers=numbers,
+            specials=specials
+        )
+
+    @property
+    def total_draws(self) -> int:
+        return len(self.periods)
+
+    @property
+    def latest_period(self) -> Optional[str]:
+        return self.periods[-1] if self.periods else None
+
+    def counts(self, recent: Optional[int] = None) -> np.ndarray:
+        """各號碼出現次數；指定 recent 時只計算最近 recent 期"""
+        rows = self.numbers if recent is None else self.numbers[-recent:]
+        return rows.sum(axis=0, dtype=np.int64)
+
+    def cumulative_counts(self) -> np.ndarray:
+        """累積出現次數（(N+1) x 38），第 t 列為前 t 期各號碼出現次數，首次呼叫後快取"""
+        if self._cumulative is None:
+            cumulative = np.zeros((self.total_draws + 1, NUMBER_COUNT), dtype=np.int64)
+            np.cumsum(self.numbers, axis=0, out=cumulative[1:])
+            self._cumulative = cumulative
+        return self._cumulative
+
+    def window_counts(self, window: int, end: Optional[int] = None) -> np.ndarray:
+        """第 end 期（預設為全部）之前最近 window 期的出現次數，以累積陣列相減取得"""
+        cumulative = self.cumulative_counts()
+        end = self.total_draws if end is None else end
+        return cumulative[end] - cumulative[max(0, end - window)]
+
+    def pair_counts(self, recent: Optional[int] = None) -> np.ndarray:
+        """號碼共現矩陣 X.T @ X（38 x 38），對角線為各號碼出現次數"""
+        rows = self.numbers if recent is None else self.numbers[-recent:]
+        rows = rows.astype(np.int32)
+        return rows.T @ rows
+
+    def last_seen(self) -> np.ndarray:
+        """各號碼最後出現的列索引，從未出現為 -1"""
+        if not self.total_draws:
+            return np.full(NUMBER_COUNT, -1, dtype=np.int64)
+        reversed_hits = self.numbers[::-1].argmax(axis=0)
+        last_seen = self.total_draws - 1 - reversed_hits
+        return np.where(self.numbers.any(axis=0), last_seen, -1)
+
+    def gap_stats(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """各號碼相鄰兩次出現的期序間隔：(間隔總和, 間隔次數, 最大間隔)"""
+        columns, rows = np.nonzero(self.numbers.T)  # 依號碼、再依期序排列
+        same_number = columns[1:] == columns[:-1]
+        gaps = np.diff(rows)[same_number]
+        gap_columns = columns[1:][same_number]
+
+        gap_sum = np.bincount(gap_columns, weights=gaps, minlength=NUMBER_COUNT).astype(np.int64)
+        gap_count = np.bincount(gap_columns, minlength=NUMBER_COUNT)
+        gap_max = np.zeros(NUMBER_COUNT, dtype=np.int64)
+        np.maximum.at(gap_max, gap_columns, gaps)
+        return gap_sum, gap_count, gap_max
+
+    def special_counts(self) -> np.ndarray:
+        """各特別號出現次數（索引 0 對應特別號 1）"""
+        return np.bincount(self.specials, minlength=SPECIAL_COUNT + 1)[1:SPECIAL_COUNT + 1]
+
+    def special_last_seen(self) -> np.ndarray:
+        """各特別號最後出現的列索引，從未出現為 -1"""
+        last_seen = np.full(SPECIAL_COUNT + 1, -1, dtype=np.int64)
+        np.maximum.at(last_seen, self.specials, np.arange(self.total_draws))
+        return last_seen[1:SPECIAL_COUNT + 1]
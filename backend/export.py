@@ -0,0 +1,128 @@
+"""
+開獎資料匯出 - 以資料庫游標逐批讀取並編碼為 CSV、NDJSON 或 Parquet，記憶體用量不隨歷史期數增加
+
+每種格式都是產生位元組區塊的產生器，可直接交給 StreamingResponse；
+CSV 的標題列在查詢資料庫之前就送出，讓用戶端立即收到第一個位元組。
+"""
+import csv
+import io
+from datetime import date
+from typing import Iterator, List, Optional
+
+from database import db_manager
+from serialization import dumps_json
+
+try:
+    import pyarrow  # 選用：未安裝時不提供 Parquet 匯出
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+PICK_COUNT = 6  # 每期開出 6 個號碼
+
+COLUMNS = ["period", "sequence", "draw_date"] + [f"number_{index}" for index in range(1, PICK_COUNT + 1)] \
+    + ["special_number"]
+
+# 格式 -> (Content-Type, 副檔名)
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+def format_available(export_format: str) -> bool:
+    """Parquet 需要 pyarrow，其餘格式一律可用"""
+    return export_format != "parquet" or pyarrow is not None
+
+def _flatten(row: tuple) -> list:
+    """(期數, 期序, 開獎日期, 號碼, 特別號) 轉為 COLUMNS 順序的欄位值"""
+    period, sequence, draw_date, numbers, special_number = row
+    return [period, sequence, draw_date.isoformat(), *numbers, special_number]
+
+def _csv_chunks(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue().encode("utf-8")
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_flatten(row) for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+
+def _ndjson_chunks(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    for rows in batches:
+        yield b"".join(
+            dumps_json({
+                'period': period,
+                'sequence': sequence,
+                'draw_date': draw_date.isoformat(),
+                'numbers': numbers,
+                'special_number': special_number
+            }) + b"\n"
+            for period, sequence, draw_date, numbers, special_number in rows
+        )
+
+class _ChunkSink(io.RawIOBase):
+    """只往後寫入的輸出檔，寫入的內容可隨時取出送出（ParquetWriter 以 tell() 計算欄位偏移）"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _parquet_chunks(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """每批寫成一個 row group，寫完即送出；檔尾的 metadata 在最後一批之後送出"""
+    schema = pyarrow.schema(
+        [("period", pyarrow.string()), ("sequence", pyarrow.int32()), ("draw_date", pyarrow.date32())]
+        + [(name, pyarrow.int8()) for name in COLUMNS[3:]]
+    )
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    try:
+        yield sink.drain()
+        for rows in batches:
+            columns = [
+                [row[0] for row in rows],
+                [row[1] for row in rows],
+                [row[2] for row in rows],
+                *([row[3][index] for row in rows] for index in range(PICK_COUNT)),
+                [row[4] for row in rows]
+            ]
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+_ENCODERS = {"csv": _csv_chunks, "ndjson": _ndjson_chunks, "parquet": _parquet_chunks}
+
+def export_draws(export_format: str, date_from: Optional[date] = None,
+                 date_to: Optional[date] = None) -> Iterator[bytes]:
+    """依期序由舊到新串流匯出開獎資料（date_from、date_to 皆包含當日）"""
+    batches = db_manager.iter_draws(date_from, date_to)
+    try:
+        yield from _ENCODERS[export_format](batches)
+    finally:
+        # 用戶端中途斷線時立即釋放資料庫游標
+        batches.close()
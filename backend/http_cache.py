@@ -0,0 +1,44 @@
+"""
+HTTP 條件式請求 - 以資料版本產生 ETag，If-None-Match 相符時不做資料庫或分析工作直接回應 304
+"""
+import hashlib
+import os
+from typing import Dict
+
+from fastapi import Request, Response
+
+# 瀏覽器與 CDN 可直接使用快取的秒數；預設 0，每次都以 ETag 重新驗證
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "0"))
+
+def cache_control() -> str:
+    """回應的 Cache-Control 標頭"""
+    return f"public, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate"
+
+def make_etag(*parts) -> str:
+    """由版本資訊產生弱 ETag（資料版本保存在資料庫，各 worker 與重啟後產生相同的 ETag）"""
+    digest = hashlib.blake2b("|".join(str(part) for part in parts).encode(), digest_size=12)
+    return f'W/"{digest.hexdigest()}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """檢查 If-None-Match 是否包含目前的 ETag（以弱比較判斷）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    current = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == current:
+            return True
+    return False
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    """回應的 ETag 與 Cache-Control 標頭"""
+    return {"ETag": etag, "Cache-Control": cache_control(), "Vary": "Accept, Accept-Encoding"}
+
+def not_modified(etag: str) -> Response:
+    """304 回應（不含內容，保留快取相關標頭）"""
+    return Response(status_code=304, headers=cache_headers(etag))
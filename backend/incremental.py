@@ -0,0 +1,135 @@
+"""
+增量分析狀態 - 每新增一期只需 O(38) 更新，不必重新掃描全部歷史資料
+"""
+import os
+from typing import Dict, List, Optional
+
+NUMBER_RANGE = range(1, 39)  # 威力彩號碼範圍 1-38
+SPECIAL_RANGE = range(1, 9)  # 特別號範圍 1-8
+RECENT_WINDOW = int(os.getenv("ANALYSIS_TREND_PERIODS", "20"))  # 趨勢分析使用的最近期數
+STATE_VERSION = 3  # 狀態格式版本，格式變更時舊狀態視為過期
+
+class IncrementalStats:
+    """累積統計：各號碼出現次數、最後出現位置與最近期數的環狀緩衝區"""
+
+    def __init__(self, window: int = RECENT_WINDOW):
+        self.window = window
+        self.total_draws = 0
+        self.latest_period = None
+        # 以號碼作為索引（索引 0 不使用）
+        self.counts = [0] * 39
+        self.last_seen = [-1] * 39  # 最後出現的期序（從 0 開始）
+        self.last_seen_period = [None] * 39
+        # 間隔歷史（以期序計算）：間隔總和、間隔次數、最大間隔
+        self.gap_sum = [0] * 39
+        self.gap_count = [0] * 39
+        self.gap_max = [0] * 39
+        self.special_counts = [0] * 9
+        self.special_last_seen = [-1] * 9
+        # 號碼共現次數（X.T @ X），對角線為各號碼出現次數
+        self.pair_counts = [[0] * 39 for _ in range(39)]
+        # 最近 window 期的環狀緩衝區
+        self.recent = []
+        self.recent_head = 0
+        self.recent_counts = [0] * 39
+
+    @classmethod
+    def from_draws(cls, draws, window: int = RECENT_WINDOW) -> "IncrementalStats":
+        """由依期數遞增排序的開獎資料建立完整狀態"""
+        stats = cls(window)
+        for draw in draws:
+            stats.apply_draw(draw.period, draw.numbers, draw.special_number)
+        return stats
+
+    def apply_draw(self, period: str, numbers: List[int], special_number: Optional[int]):
+        """套用新的一期開獎（必須比目前最新期數更新）"""
+        index = self.total_draws
+
+        for number in numbers:
+            if self.last_seen[number] >= 0:
+                gap = index - self.last_seen[number]
+                self.gap_sum[number] += gap
+                self.gap_count[number] += 1
+                self.gap_max[number] = max(self.gap_max[number], gap)
+            self.counts[number] += 1
+            self.last_seen[number] = index
+            self.last_seen_period[number] = period
+
+        # 共現矩陣加上本期號碼向量的外積
+        for first in numbers:
+            row = self.pair_counts[first]
+            for second in numbers:
+                row[second] += 1
+
+        if special_number in SPECIAL_RANGE:
+            self.special_counts[special_number] += 1
+            self.special_last_seen[special_number] = index
+
+        # 更新環狀緩衝區，移出最舊的一期
+        if len(self.recent) < self.window:
+            self.recent.append(list(numbers))
+        else:
+            for number in self.recent[self.recent_head]:
+                self.recent_counts[number] -= 1
+            self.recent[self.recent_head] = list(numbers)
+            self.recent_head = (self.recent_head + 1) % self.window
+        for number in numbers:
+            self.recent_counts[number] += 1
+
+        self.total_draws += 1
+        self.latest_period = period
+
+    def is_newer(self, period: str) -> bool:
+        """判斷期數是否比目前最新期數更新"""
+        if self.latest_period is None:
+            return True
+        try:
+            return int(period) > int(self.latest_period)
+        except ValueError:
+            return False
+
+    def to_dict(self) -> Dict:
+        """轉換為可儲存的 JSON 格式"""
+        return {
+            'version': STATE_VERSION,
+            'window': self.window,
+            'total_draws': self.total_draws,
+            'latest_period': self.latest_period,
+            'counts': self.counts,
+            'last_seen': self.last_seen,
+            'last_seen_period': self.last_seen_period,
+            'gap_sum': self.gap_sum,
+            'gap_count': self.gap_count,
+            'gap_max': self.gap_max,
+            'special_counts': self.special_counts,
+            'special_last_seen': self.special_last_seen,
+            'pair_counts': self.pair_counts,
+            'recent': self.recent,
+            'recent_head': self.recent_head,
+            'recent_counts': self.recent_counts
+        }
+
+    @staticmethod
+    def is_compatible(data: Dict) -> bool:
+        """檢查儲存的狀態格式是否為目前版本，且趨勢期數與目前設定相同"""
+        return bool(data) and data.get('version') == STATE_VERSION and data.get('window') == RECENT_WINDOW
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "IncrementalStats":
+        """由儲存的 JSON 格式還原"""
+        stats = cls(data['window'])
+        stats.total_draws = data['total_draws']
+        stats.latest_period = data['latest_period']
+        stats.counts = list(data['counts'])
+        stats.last_seen = list(data['last_seen'])
+        stats.last_seen_period = list(data['last_seen_period'])
+        stats.gap_sum = list(data['gap_sum'])
+        stats.gap_count = list(data['gap_count'])
+        stats.gap_max = list(data['gap_max'])
+        stats.special_counts = list(data['special_counts'])
+        stats.special_last_seen = list(data['special_last_seen'])
+        stats.pair_counts = [list(row) for row in data['pair_counts']]
+        stats.recent = [list(numbers) for numbers in data['recent']]
+        stats.recent_head = data['recent_head']
+        stats.recent_counts = list(data['recent_counts'])
+        return stats
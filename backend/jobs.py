@@ -0,0 +1,310 @@
+"""
+背景工作 - 所有寫入工作（爬取更新、重新分析、清理資料）依序由單一寫入執行緒執行，並可查詢進度
+
+工作佇列與排程只存在於各行程內；工作狀態與進度另外寫入資料庫（job_records），
+多個 worker 或 serverless 執行個體時，任一行程都能查詢其他行程加入的工作。
+"""
+import itertools
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from database import db_manager
+from logging_config import get_logger
+
+logger = get_logger("jobs")
+
+# 保留最近的工作紀錄數
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "100"))
+# 執行中工作的進度寫入資料庫的最短間隔（秒），狀態改變時一律立即寫入
+JOB_PROGRESS_PERSIST_SECONDS = float(os.getenv("JOB_PROGRESS_PERSIST_SECONDS", "1.0"))
+
+# 定期爬取：威力彩每週一、四晚上開獎，開獎後一小時爬取（台灣時間，無日光節約時間）
+CRAWL_SCHEDULE_ENABLED = os.getenv("CRAWL_SCHEDULE_ENABLED", "1") != "0"
+CRAWL_SCHEDULE_DAYS = [int(day) for day in os.getenv("CRAWL_SCHEDULE_DAYS", "0,3").split(",") if day]  # 0 為週一
+CRAWL_SCHEDULE_TIME = os.getenv("CRAWL_SCHEDULE_TIME", "21:30")
+TAIPEI = timezone(timedelta(hours=8))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+class Job:
+    """單一背景工作的狀態與進度"""
+
+    def __init__(self, kind: str, params: Dict, trigger: str = "manual", job_id: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.trigger = trigger  # manual 或 schedule
+        self.status = QUEUED
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.progress: Dict = {}
+        self.result = None
+        self.error: Optional[str] = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[["Job"], None]] = []
+        self._on_progress: Optional[Callable[["Job"], None]] = None  # 進度更新時通知 JobManager 寫入資料庫
+        self._persisted_at = 0.0
+
+    @property
+    def dedupe_key(self) -> tuple:
+        return (self.kind, tuple(sorted(self.params.items())))
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def update_progress(self, **values):
+        """更新進度欄位（由工作執行緒呼叫）"""
+        with self._lock:
+            self.progress.update(values)
+        if self._on_progress:
+            self._on_progress(self)
+
+    def increment_progress(self, name: str, amount: int = 1):
+        with self._lock:
+            self.progress[name] = self.progress.get(name, 0) + amount
+        if self._on_progress:
+            self._on_progress(self)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待工作完成，逾時回傳 False"""
+        return self._done.wait(timeout)
+
+    def add_done_callback(self, callback: Callable[["Job"], None]):
+        """工作完成時在寫入執行緒呼叫 callback(job)，已完成時立即呼叫"""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _finish(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                logger.exception("工作完成通知失敗", extra={'job_id': self.id})
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            progress = dict(self.progress)
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'trigger': self.trigger,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'progress': progress,
+            'result': self.result,
+            'error': self.error
+        }
+
+    def to_record(self) -> Dict:
+        """資料庫紀錄欄位（時間保留為 datetime）"""
+        with self._lock:
+            progress = dict(self.progress)
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'trigger': self.trigger,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': progress,
+            'result': self.result,
+            'error': self.error
+        }
+
+class JobManager:
+    """單一寫入者的工作佇列：同時只執行一個工作，相同的工作在排隊或執行中時不會重複加入
+
+    store 提供 create_job、save_job、get_job、get_recent_jobs、prune_jobs（DatabaseManager），為 None 時只保存在記憶體。
+    """
+
+    def __init__(self, history_limit: int = JOB_HISTORY_LIMIT, store=None):
+        self._handlers: Dict[str, Callable[[Job], object]] = {}
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active: Dict[tuple, Job] = {}  # 排隊或執行中的工作，用於去除重複
+        self._queue: "queue.Queue[Job]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._history_limit = history_limit
+        self._store = store
+        self._worker: Optional[threading.Thread] = None
+        self._scheduler: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def register(self, kind: str, handler: Callable[[Job], object]):
+        """登記工作類型的處理函式，回傳值會成為工作結果"""
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, trigger: str = "manual", job_id: Optional[str] = None, **params) -> Optional[Job]:
+        """加入工作；相同類型與參數的工作尚未完成時直接回傳該工作
+
+        指定 job_id 時先在資料庫新增該 ID 的紀錄，已由其他行程加入時回傳 None。
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"未知的工作類型: {kind}")
+
+        job = Job(kind, params, trigger, job_id)
+        with self._lock:
+            existing = self._active.get(job.dedupe_key)
+            if existing is not None:
+                return existing
+            if job_id is not None and self._store is not None and not self._store.create_job(job.to_record()):
+                logger.info("工作已由其他行程加入", extra={'job_id': job_id, 'kind': kind})
+                return None
+            self._active[job.dedupe_key] = job
+            self._jobs[job.id] = job
+            self._trim_history()
+
+        job._on_progress = self._persist_progress
+        if job_id is None:
+            self._persist(job)
+        self._ensure_worker()
+        self._queue.put(job)
+        logger.info("已加入工作", extra={'job_id': job.id, 'kind': kind, 'trigger': trigger})
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def recent(self, limit: int = 20) -> List[Job]:
+        """最近加入的工作（新的在前）"""
+        with self._lock:
+            return list(itertools.islice(reversed(self._jobs.values()), limit))
+
+    def lookup(self, job_id: str) -> Optional[Dict]:
+        """查詢工作狀態：本行程的工作直接回傳最新進度，否則查詢資料庫中其他行程的紀錄"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self._store is None:
+            return None
+        return self._store.get_job(job_id)
+
+    def history(self, limit: int = 20) -> List[Dict]:
+        """最近加入的工作狀態（新的在前），包含其他行程的工作；本行程的工作以記憶體中的進度為準"""
+        if self._store is None:
+            return [job.to_dict() for job in self.recent(limit)]
+        records = self._store.get_recent_jobs(limit)
+        for index, record in enumerate(records):
+            job = self.get(record['id'])
+            if job is not None:
+                records[index] = job.to_dict()
+        return records
+
+    def _persist(self, job: Job, prune: bool = False):
+        """寫入工作紀錄；資料庫錯誤只記錄日誌，不影響工作本身"""
+        if self._store is None:
+            return
+        job._persisted_at = time.monotonic()
+        try:
+            self._store.save_job(job.to_record())
+            if prune:
+                self._store.prune_jobs(self._history_limit)
+        except Exception:
+            logger.exception("寫入工作紀錄失敗", extra={'job_id': job.id})
+
+    def _persist_progress(self, job: Job):
+        if time.monotonic() - job._persisted_at >= JOB_PROGRESS_PERSIST_SECONDS:
+            self._persist(job)
+
+    def _trim_history(self):
+        """只保留最近的已完成工作"""
+        while len(self._jobs) > self._history_limit:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.is_finished:
+                break
+            del self._jobs[oldest_id]
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_worker, name="job-writer", daemon=True)
+                self._worker.start()
+
+    def _run_worker(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            self._run_job(job)
+
+    def _run_job(self, job: Job):
+        job.status = RUNNING
+        job.started_at = datetime.now()
+        self._persist(job)
+        started = time.perf_counter()
+        try:
+            job.result = self._handlers[job.kind](job)
+            job.status = SUCCEEDED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+            logger.exception("工作失敗", extra={'job_id': job.id, 'kind': job.kind})
+        finally:
+            job.finished_at = datetime.now()
+            job.update_progress(duration_ms=round((time.perf_counter() - started) * 1000, 1))
+            with self._lock:
+                self._active.pop(job.dedupe_key, None)
+            self._persist(job, prune=True)
+            job._finish()
+        logger.info("工作完成", extra={
+            'job_id': job.id, 'kind': job.kind, 'status': job.status,
+            'duration_ms': job.progress.get('duration_ms')
+        })
+
+    def start_scheduler(self, kind: str = "update"):
+        """啟動定期爬取排程（依 CRAWL_SCHEDULE_DAYS 與 CRAWL_SCHEDULE_TIME）"""
+        if not CRAWL_SCHEDULE_ENABLED or not CRAWL_SCHEDULE_DAYS:
+            return
+        with self._lock:
+            if self._scheduler is not None and self._scheduler.is_alive():
+                return
+            self._scheduler = threading.Thread(
+                target=self._run_scheduler, args=(kind,), name="job-scheduler", daemon=True
+            )
+            self._scheduler.start()
+
+    def _run_scheduler(self, kind: str):
+        while True:
+            next_run = next_scheduled_run(datetime.now(TAIPEI))
+            logger.info("下次定期爬取", extra={'next_run': next_run.isoformat()})
+            wait_seconds = (next_run - datetime.now(TAIPEI)).total_seconds()
+            if self._stopping.wait(max(0, wait_seconds)):
+                return
+            # 以排程時間作為工作 ID，多個 worker 同時啟用排程時只有一個行程執行
+            self.submit(kind, trigger="schedule", job_id=f"{kind}-{next_run:%Y%m%d%H%M}")
+
+    def stop(self):
+        self._stopping.set()
+
+def next_scheduled_run(now: datetime, days: List[int] = None, at: str = None) -> datetime:
+    """now（台灣時間）之後的下一個排程時間"""
+    days = CRAWL_SCHEDULE_DAYS if days is None else days
+    hour, minute = (int(part) for part in (at or CRAWL_SCHEDULE_TIME).split(":"))
+    for offset in range(8):
+        candidate = (now + timedelta(days=offset)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate.weekday() in days and candidate > now:
+            return candidate
+    raise ValueError("CRAWL_SCHEDULE_DAYS 沒有有效的星期")
+
+# 全域工作管理實例（工作紀錄寫入資料庫）
+job_manager = JobManager(store=db_manager)
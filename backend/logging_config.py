@@ -0,0 +1,91 @@
+"""
+日誌設定 - 呼叫端只把紀錄放進佇列，由背景執行緒寫出，不在寫入或分析的迴圈中直接做 stdout I/O
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOGGER_NAME = "lottery"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # DEBUG 會輸出逐月份與逐筆的細節
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text 或 json
+
+# LogRecord 本身的屬性，其餘屬性視為 extra 傳入的結構化欄位
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class StructuredFormatter(logging.Formatter):
+    """在訊息後附加 extra 欄位（key=value）；json 模式下每筆紀錄輸出一行 JSON"""
+
+    def __init__(self, as_json: bool = False):
+        super().__init__(datefmt="%Y-%m-%d %H:%M:%S")
+        self.as_json = as_json
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+        exception = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+
+        if self.as_json:
+            payload = {
+                'time': self.formatTime(record, self.datefmt),
+                'level': record.levelname,
+                'logger': record.name,
+                'message': record.getMessage(),
+                **fields
+            }
+            if exception:
+                payload['exception'] = exception
+            return json.dumps(payload, ensure_ascii=False, default=str)
+
+        line = f"{self.formatTime(record, self.datefmt)} {record.levelname:<7} {record.name} {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if exception:
+            line += "\n" + exception
+        return line
+
+class StructuredQueueHandler(QueueHandler):
+    """放進佇列前只合併訊息參數，保留 extra 欄位與例外內容給背景的 StructuredFormatter"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # 在呼叫端先把 traceback 轉為文字，佇列中不保留整個呼叫堆疊
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_listener: Optional[QueueListener] = None
+_configure_lock = threading.Lock()
+
+def configure_logging(level: Optional[str] = None, log_format: Optional[str] = None):
+    """設定 lottery 日誌：佇列處理器加上背景寫出的 QueueListener（只會設定一次）"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(StructuredFormatter(as_json=(log_format or LOG_FORMAT) == "json"))
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+        _listener.start()
+        # 程式結束前寫出佇列中剩餘的紀錄
+        atexit.register(_listener.stop)
+
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.setLevel(level or LOG_LEVEL)
+        logger.addHandler(StructuredQueueHandler(log_queue))
+        logger.propagate = False
+
+def get_logger(name: str) -> logging.Logger:
+    """取得模組使用的 logger，例如 get_logger("crawler") 對應 lottery.crawler"""
+    configure_logging()
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
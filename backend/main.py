@@ -1,10 +1,12 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, date
-import uvicorn
+import time
 
+import asyncio
 import os
 import sys
 
@@ -13,10 +15,25 @@ backend_dir = os.path.dirname(os.path.abspath(__file__))
 if backend_dir not in sys.path:
     sys.path.insert(0, backend_dir)
 
-from database import db_manager
-from crawler import crawler
-from analyzer import analyzer
-from models import create_tables
+from database import db_manager, LAZY_INIT
+from cache import analysis_cache
+from concurrency import run_db, run_heavy
+from metrics import observe_request, render_metrics
+from http_cache import make_etag, etag_matches, not_modified, cache_headers
+from serialization import PreparedPayload, build_response, negotiate_media_type
+from logging_config import get_logger
+from jobs import job_manager, Job, JOB_HISTORY_LIMIT
+
+logger = get_logger("main")
+
+# 歷史資料每頁筆數上限
+HISTORY_MAX_LIMIT = int(os.getenv("HISTORY_MAX_LIMIT", "100"))
+# 清理資料與重新分析等待工作完成的最長秒數，逾時回傳 202 與工作 ID
+JOB_WAIT_TIMEOUT = float(os.getenv("JOB_WAIT_TIMEOUT", "30"))
+# 共現統計與多期數分析的分析期數上限（限制快取鍵的可能值）
+ANALYSIS_WINDOW_MAX = int(os.getenv("ANALYSIS_WINDOW_MAX", "1000"))
+# /api/analysis/windows 一次比較的期數上限
+WINDOWS_MAX_COUNT = 10
 
 # 建立 FastAPI 應用
 app = FastAPI(
@@ -34,6 +51,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """記錄每個路由的請求耗時（以路由樣板為標籤，避免路徑參數造成過多序列）"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        observe_request(
+            request.method, route.path if route else "unmatched", status, time.perf_counter() - started
+        )
+
 # 資料模型
 class LotteryDrawResponse(BaseModel):
     period: str
@@ -57,12 +89,52 @@ class HistoryResponse(BaseModel):
     total: int
     page: int
     per_page: int
+    next_before: Optional[str] = None  # 下一頁的游標（?before=），沒有更多資料時為 None
 
 class UpdateResponse(BaseModel):
     success: bool
     message: str
     updated_count: int
     last_period: Optional[str] = None
+    job_id: Optional[str] = None  # 以 /api/jobs/{job_id} 查詢進度
+    status: Optional[str] = None
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    params: dict
+    trigger: str
+    status: str  # queued、running、succeeded、failed
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    progress: dict  # months_total、months_fetched、rows_written、analysis_ms、duration_ms
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+class PairCount(BaseModel):
+    numbers: List[int]
+    count: int
+
+class PairsResponse(BaseModel):
+    window: Optional[int] = None
+    total_periods: int
+    most_common: List[PairCount]
+    least_common: List[PairCount]
+
+class WindowAnalysis(BaseModel):
+    window: Optional[int] = None  # None 表示全部歷史
+    total_periods: int
+    frequency_analysis: dict
+    trend_analysis: dict
+    avoid_number_sets: List[List[int]]
+    likely_number_sets: List[List[int]]
+
+class WindowsAnalysisResponse(BaseModel):
+    latest_period: str
+    trend_periods: int
+    windows: List[WindowAnalysis]
+    analysis_date: str
 
 class StatisticsResponse(BaseModel):
     total_periods: int
@@ -74,51 +146,47 @@ class StatisticsResponse(BaseModel):
 # 初始化資料庫
 @app.on_event("startup")
 async def startup_event():
-    """應用啟動時初始化資料庫"""
-    print("開始初始化資料庫...")
+    """應用啟動時初始化資料庫（延遲初始化時跳過，第一次存取資料庫才檢查資料表）"""
+    if LAZY_INIT:
+        # 延遲初始化（serverless）模式不啟動定期爬取，需由外部排程呼叫 POST /api/update
+        logger.info("啟動完成", extra={'lazy_init': True, 'scheduled_crawl': False})
+        return
+    
     try:
-        create_tables()
-        print("資料庫初始化完成")
+        await run_db(db_manager.ensure_schema)
         
         # 簡單檢查資料庫連線
-        total_draws = db_manager.get_total_draws_count()
-        print(f"資料庫現有開獎資料: {total_draws} 筆")
+        total_draws = await run_db(db_manager.get_total_draws_count)
+        logger.info("資料庫初始化完成", extra={'total_draws': total_draws})
         
         if total_draws == 0:
-            print("資料庫為空，自動載入真實開獎資料...")
-            try:
-                # 直接執行爬蟲載入真實資料
-                result = crawler.update_database(max_pages=3)
-                print(f"自動載入結果: {result}")
-                
-                # 檢查載入結果
-                new_total = db_manager.get_total_draws_count()
-                print(f"載入後資料庫共有: {new_total} 筆資料")
-                
-                if new_total > 0:
-                    print("✅ 真實資料載入成功")
-                else:
-                    print("⚠️ 真實資料載入失敗，載入範例資料...")
-                    from setup_db import create_sample_data
-                    sample_count = create_sample_data()
-                    print(f"已載入 {sample_count} 筆範例資料")
-                    
-            except Exception as e:
-                print(f"自動載入真實資料失敗: {e}")
-                # 載入範例資料作為備案
-                try:
-                    from setup_db import create_sample_data
-                    sample_count = create_sample_data()
-                    print(f"已載入 {sample_count} 筆範例資料")
-                except Exception as e2:
-                    print(f"載入範例資料也失敗: {e2}")
+            # 不在啟動流程中爬取，交給背景工作載入，服務可以立即接受請求
+            job = await run_db(job_manager.submit, "initial-load")
+            logger.info("資料庫為空，已加入初始載入工作", extra={'job_id': job.id})
         
-        print("啟動完成")
+        # 開獎日定期爬取
+        job_manager.start_scheduler()
         
-    except Exception as e:
-        print(f"啟動時發生錯誤: {e}")
+        logger.info("啟動完成")
+        
+    except Exception:
+        logger.exception("啟動時發生錯誤")
         # 不要讓錯誤阻止服務啟動
 
+async def read_data_version() -> int:
+    """在資料庫執行緒池中讀取資料版本（快取過期或延遲初始化時會查詢資料庫）"""
+    return await run_db(lambda: db_manager.data_version)
+
+def get_crawler():
+    """延遲載入爬蟲（建立時會修補 requests 的 SSL 設定），只有更新工作需要"""
+    from crawler import crawler
+    return crawler
+
+def get_analyzer():
+    """延遲載入分析器（NumPy），查詢歷史資料與健康檢查不需要"""
+    from analyzer import analyzer
+    return analyzer
+
 # API 端點
 @app.get("/", summary="根路徑")
 async def root():
@@ -130,124 +198,263 @@ async def root():
     }
 
 @app.get("/api/latest-number", response_model=LatestAnalysisResponse, summary="取得最新分析結果")
-async def get_latest_analysis():
+async def get_latest_analysis(request: Request):
     """取得最新一期資料與推薦避免號碼"""
     try:
-        # 取得最新開獎資料
-        latest_draw = db_manager.get_latest_draw()
-        if not latest_draw:
-            raise HTTPException(status_code=404, detail="找不到開獎資料")
-        
-        # 取得最新分析結果
-        analysis = analyzer.get_latest_analysis()
-        analysis_result = None
-        if not analysis:
-            # 如果沒有分析結果，立即進行分析
-            print("沒有找到分析結果，正在進行新分析...")
-            analysis_result = analyzer.analyze_avoid_numbers()
-            if analysis_result:
-                analysis = {
-                    'avoid_numbers': analysis_result['avoid_number_sets'][0],  # 第一組作為主要推薦
-                    'total_periods': analysis_result['total_periods'],
-                    'analysis_date': analysis_result['analysis_date']
-                }
-        
-        if not analysis:
-            raise HTTPException(status_code=500, detail="無法產生分析結果")
+        # 資料版本未變動時直接回應 304 或回傳快取結果（含序列化後的內容），只有新資料後的第一個請求需要分析
+        version = await read_data_version()
+        etag = make_etag(version, negotiate_media_type(request))
+        if etag_matches(request, etag):
+            return not_modified(etag)
         
-        # 如果沒有完整分析結果，重新進行分析以獲取所有組合
-        if not analysis_result:
-            analysis_result = analyzer.analyze_avoid_numbers()
+        payload = analysis_cache.get('latest-number', version)
+        if payload is None:
+            payload = await run_heavy(
+                analysis_cache.get_or_compute, 'latest-number', version, prepare_latest_analysis
+            )
         
-        avoid_sets = analysis_result['avoid_number_sets'] if analysis_result else [analysis['avoid_numbers']]
-        likely_sets = analysis_result['likely_number_sets'] if analysis_result else []
-        
-        return LatestAnalysisResponse(
-            latest_period=latest_draw.period,
-            latest_date=latest_draw.draw_date.isoformat(),
-            latest_numbers=latest_draw.numbers,
-            latest_special=latest_draw.special_number,
-            recommended_avoid_numbers=analysis['avoid_numbers'],
-            recommended_avoid_sets=avoid_sets,
-            recommended_likely_numbers=likely_sets[0] if likely_sets else [],
-            recommended_likely_sets=likely_sets,
-            analysis_summary={
-                "total_periods": analysis['total_periods'],
-                "last_update": analysis['analysis_date']
-            }
-        )
+        return build_response(request, payload, headers=cache_headers(etag))
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"取得分析結果失敗: {str(e)}")
 
+def prepare_latest_analysis() -> PreparedPayload:
+    """執行分析並保存為可直接輸出的回應內容"""
+    return PreparedPayload(build_latest_analysis().model_dump())
+
+def build_latest_analysis() -> LatestAnalysisResponse:
+    """取得最新開獎資料並執行一次完整分析"""
+    # 取得最新開獎資料
+    latest_draw = db_manager.get_latest_draw()
+    if not latest_draw:
+        raise HTTPException(status_code=404, detail="找不到開獎資料")
+    
+    analysis_result = get_analyzer().analyze_avoid_numbers()
+    if not analysis_result:
+        raise HTTPException(status_code=500, detail="無法產生分析結果")
+    
+    avoid_sets = analysis_result['avoid_number_sets']
+    likely_sets = analysis_result['likely_number_sets']
+    
+    return LatestAnalysisResponse(
+        latest_period=latest_draw.period,
+        latest_date=latest_draw.draw_date.isoformat(),
+        latest_numbers=latest_draw.numbers,
+        latest_special=latest_draw.special_number,
+        recommended_avoid_numbers=avoid_sets[0],  # 第一組作為主要推薦
+        recommended_avoid_sets=avoid_sets,
+        recommended_likely_numbers=likely_sets[0] if likely_sets else [],
+        recommended_likely_sets=likely_sets,
+        analysis_summary={
+            "total_periods": analysis_result['total_periods'],
+            "last_update": analysis_result['analysis_date']
+        }
+    )
+
 @app.get("/api/history", response_model=HistoryResponse, summary="取得歷史開獎資料")
-async def get_history(page: int = 1, limit: int = 10):
-    """取得歷史開獎資料"""
+async def get_history(request: Request, page: int = Query(1, ge=1),
+                      limit: int = Query(10, ge=1, le=HISTORY_MAX_LIMIT), before: Optional[str] = None):
+    """取得歷史開獎資料
+    
+    傳入 before（期數）時使用游標分頁，回應時間不受頁數深度影響；否則沿用頁碼分頁。
+    """
     try:
-        # 取得總數
-        total = db_manager.get_total_draws_count()
+        # 資料未變動時直接回應 304，不查詢資料庫
+        etag = make_etag(await read_data_version())
+        if etag_matches(request, etag):
+            return not_modified(etag)
         
-        # 取得分頁資料
-        draws = db_manager.get_draws_paginated(page=page, limit=limit)
+        total, draws = await run_db(load_history_page, page, limit, before)
         
-        # 轉換為回應格式
-        draw_responses = []
-        for draw in draws:
-            draw_responses.append(LotteryDrawResponse(
-                period=draw.period,
-                draw_date=draw.draw_date.isoformat(),
-                numbers=draw.numbers,
-                special_number=draw.special_number
-            ))
+        # 轉換為回應格式（欄位與 HistoryResponse 相同，直接以 orjson 輸出）
+        draw_responses = [
+            {
+                'period': draw.period,
+                'draw_date': draw.draw_date.isoformat(),
+                'numbers': draw.numbers,
+                'special_number': draw.special_number
+            }
+            for draw in draws
+        ]
         
-        return HistoryResponse(
-            data=draw_responses,
-            total=total,
-            page=page,
-            per_page=limit
-        )
+        return build_response(request, {
+            'data': draw_responses,
+            'total': total,
+            'page': page,
+            'per_page': limit,
+            'next_before': draws[-1].period if draws and len(draws) == limit else None
+        }, headers=cache_headers(etag))
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"取得歷史資料失敗: {str(e)}")
 
+def load_history_page(page: int, limit: int, before: Optional[str]):
+    """取得總數與分頁資料（在資料庫執行緒池中執行）"""
+    # 取得總數（寫入時維護的計數器）
+    total = db_manager.get_total_draws_count()
+    
+    # 取得分頁資料
+    if before is not None:
+        draws = db_manager.get_draws_before(before=before, limit=limit)
+    else:
+        draws = db_manager.get_draws_paginated(page=page, limit=limit)
+    return total, draws
+
+@app.get("/api/export", summary="串流匯出開獎資料")
+async def export_history(export_format: str = Query("csv", alias="format"),
+                         date_from: Optional[date] = Query(None, alias="from"),
+                         date_to: Optional[date] = Query(None, alias="to")):
+    """依期序由舊到新匯出開獎資料（format 為 csv、ndjson 或 parquet，from/to 為開獎日期且包含當日）
+    
+    以資料庫游標逐批讀取並邊編碼邊送出，記憶體用量不隨歷史期數增加。
+    """
+    # 匯出模組（與選用的 pyarrow）在第一次匯出時才載入，不影響冷啟動
+    from export import EXPORT_FORMATS, export_draws, format_available
+    
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支援的匯出格式: {export_format}")
+    if not format_available(export_format):
+        raise HTTPException(status_code=501, detail=f"伺服器未安裝 {export_format} 匯出所需的套件（pyarrow）")
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="from 不可晚於 to")
+    
+    media_type, extension = EXPORT_FORMATS[export_format]
+    return StreamingResponse(
+        export_draws(export_format, date_from, date_to),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="powerball-draws.{extension}"'}
+    )
+
 @app.post("/api/update", response_model=UpdateResponse, summary="手動更新資料")
-async def manual_update(background_tasks: BackgroundTasks):
-    """手動觸發資料更新"""
+async def manual_update(full_resync: bool = False):
+    """手動觸發資料更新（預設只爬取當月與未完成的月份，full_resync=true 時重新爬取全部月份）
+    
+    更新在背景的寫入佇列中執行，立即回傳工作 ID；更新進行中再次觸發會回傳同一個工作。
+    """
+    job = await run_db(job_manager.submit, "update", full_resync=full_resync)
+    return UpdateResponse(
+        success=True,
+        message="已加入更新工作",
+        updated_count=0,
+        job_id=job.id,
+        status=job.status
+    )
+
+@app.get("/api/jobs", response_model=List[JobResponse], summary="取得最近的背景工作")
+async def list_jobs(limit: int = Query(20, ge=1, le=JOB_HISTORY_LIMIT)):
+    """最近加入的背景工作（新的在前），包含其他 worker 加入的工作"""
+    return await run_db(job_manager.history, limit)
+
+@app.get("/api/jobs/{job_id}", response_model=JobResponse, summary="取得背景工作進度")
+async def get_job(job_id: str):
+    """查詢背景工作的狀態與進度（其他 worker 或執行個體加入的工作由資料庫中的紀錄回應）"""
+    job = await run_db(job_manager.lookup, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="找不到工作")
+    return job
+
+def run_update_job(job: Job) -> dict:
+    """更新工作：爬取資料寫入資料庫，再預先計算最新分析"""
+    result = get_crawler().update_database(
+        max_pages=3, full_resync=job.params.get('full_resync', False), progress=job.update_progress
+    )
+    
+    latest_draw = db_manager.get_latest_draw()
+    if latest_draw:
+        started = time.perf_counter()
+        analysis_cache.get_or_compute('latest-number', db_manager.data_version, prepare_latest_analysis)
+        job.update_progress(analysis_ms=round((time.perf_counter() - started) * 1000, 1))
+    
+    return {
+        'updated_count': result.get('added_count', 0) + result.get('updated_count', 0),
+        'last_period': latest_draw.period if latest_draw else None
+    }
+
+def run_initial_load_job(job: Job) -> dict:
+    """資料庫為空時的初始載入：先載入快照（SEED_SNAPSHOT），再爬取真實資料，都沒有資料時載入範例資料"""
+    from snapshot import SEED_SNAPSHOT
+    
+    snapshot_rows = 0
+    if SEED_SNAPSHOT and os.path.exists(SEED_SNAPSHOT):
+        snapshot_rows = db_manager.import_snapshot(SEED_SNAPSHOT)['added_count']
+        job.update_progress(snapshot_rows=snapshot_rows)
+        logger.info("已載入快照", extra={'path': SEED_SNAPSHOT, 'rows': snapshot_rows})
+    
     try:
-        # 清理所有資料，重新開始
-        print("開始清理所有資料...")
-        db_manager.clear_all_data()
-        
-        # 執行爬蟲更新
-        print("開始手動更新資料...")
-        result = crawler.update_database(max_pages=3)
-        
-        # 背景執行分析
-        background_tasks.add_task(run_analysis)
-        
-        # 取得最新期數
-        latest_draw = db_manager.get_latest_draw()
-        last_period = latest_draw.period if latest_draw else None
-        
-        return UpdateResponse(
-            success=True,
-            message="資料更新完成",
-            updated_count=result.get('added_count', 0),
-            last_period=last_period
-        )
+        result = run_update_job(job)
+        if result['last_period']:
+            return {**result, 'snapshot_rows': snapshot_rows}
+        logger.warning("真實資料載入失敗，載入範例資料")
+    except Exception:
+        if snapshot_rows:
+            # 已有快照資料時不載入範例資料，下次更新再補上最新期數
+            logger.exception("爬取最新資料失敗，保留快照資料")
+            latest_draw = db_manager.get_latest_draw()
+            return {'updated_count': 0, 'last_period': latest_draw.period, 'snapshot_rows': snapshot_rows}
+        logger.exception("自動載入真實資料失敗，載入範例資料")
     
-    except Exception as e:
-        return UpdateResponse(
-            success=False,
-            message=f"更新失敗: {str(e)}",
-            updated_count=0
-        )
+    from setup_db import create_sample_data
+    sample_count = create_sample_data()
+    logger.info("已載入範例資料", extra={'rows': sample_count})
+    latest_draw = db_manager.get_latest_draw()
+    return {
+        'updated_count': sample_count,
+        'last_period': latest_draw.period if latest_draw else None,
+        'sample_data': True
+    }
+
+def run_analyze_job(job: Job) -> Optional[dict]:
+    """重新分析工作：完整重算並重建增量狀態"""
+    started = time.perf_counter()
+    result = get_analyzer().analyze_avoid_numbers(full_recompute=True)
+    job.update_progress(analysis_ms=round((time.perf_counter() - started) * 1000, 1))
+    # 讓 /api/latest-number 取得重新分析後的結果
+    analysis_cache.invalidate('latest-number')
+    if not result:
+        raise RuntimeError("沒有可分析的資料")
+    return {
+        'avoid_number_sets': result['avoid_number_sets'],
+        'likely_number_sets': result['likely_number_sets'],
+        'total_periods': result['total_periods']
+    }
+
+job_manager.register("update", run_update_job)
+job_manager.register("initial-load", run_initial_load_job)
+job_manager.register("analyze", run_analyze_job)
+job_manager.register("clear-mock-data", lambda job: db_manager.clear_mock_data())
+job_manager.register("clear-all-data", lambda job: db_manager.clear_all_data())
+
+async def run_job(kind: str, **params) -> Job:
+    """經由寫入佇列執行工作並等待完成（與更新工作依序執行，不會交錯寫入）
+    
+    等待期間不占用執行緒；超過 JOB_WAIT_TIMEOUT 時回傳尚未完成的工作，由呼叫端回應 job_accepted。
+    """
+    job = await run_db(job_manager.submit, kind, **params)
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    job.add_done_callback(lambda _: loop.call_soon_threadsafe(done.set_result, None))
+    await asyncio.wait([done], timeout=JOB_WAIT_TIMEOUT)
+    return job
+
+def job_accepted(job: Job) -> JSONResponse:
+    """工作在等待時間內未完成：回傳 202 與工作 ID，以 /api/jobs/{job_id} 查詢結果"""
+    return JSONResponse(status_code=202, content={
+        "success": True,
+        "message": "工作仍在執行中",
+        "job_id": job.id,
+        "status": job.status
+    })
 
 @app.post("/api/clear-mock-data", summary="清理模擬資料")
 async def clear_mock_data():
     """清理資料庫中的模擬資料"""
     try:
-        success = db_manager.clear_mock_data()
+        job = await run_job("clear-mock-data")
+        if not job.is_finished:
+            return job_accepted(job)
+        success = job.result
         if success:
             return {
                 "success": True,
@@ -265,7 +472,10 @@ async def clear_mock_data():
 async def clear_all_data():
     """清理資料庫中的所有資料"""
     try:
-        success = db_manager.clear_all_data()
+        job = await run_job("clear-all-data")
+        if not job.is_finished:
+            return job_accepted(job)
+        success = job.result
         if success:
             return {
                 "success": True,
@@ -280,46 +490,111 @@ async def clear_all_data():
         raise HTTPException(status_code=500, detail=f"清理失敗: {str(e)}")
 
 @app.get("/api/statistics", response_model=StatisticsResponse, summary="取得統計資料")
-async def get_statistics():
+async def get_statistics(request: Request):
     """取得號碼統計資料"""
     try:
-        stats = analyzer.get_statistics()
-        if not stats:
+        version = await read_data_version()
+        etag = make_etag(version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        
+        payload = analysis_cache.get('statistics', version)
+        if payload is None:
+            payload = await run_heavy(analysis_cache.get_or_compute, 'statistics', version, prepare_statistics)
+        if not payload:
             raise HTTPException(status_code=404, detail="沒有統計資料")
         
-        return StatisticsResponse(**stats)
+        return build_response(request, payload, headers=cache_headers(etag))
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"取得統計資料失敗: {str(e)}")
 
-@app.post("/api/analyze", summary="重新執行分析")
-async def run_analysis_endpoint():
-    """手動觸發重新分析"""
+def prepare_statistics() -> Optional[PreparedPayload]:
+    """取得統計資料並保存為可直接輸出的回應內容"""
+    stats = get_analyzer().get_statistics()
+    return PreparedPayload(StatisticsResponse(**stats).model_dump()) if stats else None
+
+@app.get("/api/pairs", response_model=PairsResponse, summary="取得號碼共現統計")
+async def get_pairs(request: Request, window: Optional[int] = Query(None, ge=1, le=ANALYSIS_WINDOW_MAX),
+                    top_k: int = 10):
+    """取得最常與最少一起開出的號碼組合（window 為最近期數，未指定時使用全部歷史）"""
     try:
-        result = analyzer.analyze_avoid_numbers()
-        if result:
-            return {
-                "success": True,
-                "message": "分析完成",
-                "avoid_number_sets": result['avoid_number_sets'],
-                "likely_number_sets": result['likely_number_sets'],
-                "total_periods": result['total_periods']
-            }
-        else:
-            raise HTTPException(status_code=500, detail="分析失敗")
+        top_k = max(1, min(top_k, 703))  # 38 取 2 共 703 組
+        
+        cache_key = f"pairs:{window}:{top_k}"
+        version = await read_data_version()
+        payload = analysis_cache.get(cache_key, version)
+        if payload is None:
+            payload = await run_heavy(
+                analysis_cache.get_or_compute, cache_key, version,
+                lambda: prepare_payload(get_analyzer().analyze_pairs(window=window, top_k=top_k))
+            )
+        if not payload:
+            raise HTTPException(status_code=404, detail="沒有開獎資料")
+        
+        return build_response(request, payload)
     
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"分析失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"取得共現統計失敗: {str(e)}")
 
-# 背景任務函數
-async def run_analysis():
-    """背景執行分析任務"""
+@app.get("/api/analysis/windows", response_model=WindowsAnalysisResponse, summary="取得多個分析期數的比較")
+async def get_window_analysis(request: Request, windows: str = "10,20,50,100,all",
+                              trend_periods: Optional[int] = None):
+    """一次取得多個分析期數的頻率、趨勢與推薦號碼（windows 以逗號分隔，all 表示全部歷史）"""
     try:
-        print("背景執行分析任務...")
-        analyzer.analyze_avoid_numbers()
-        print("背景分析完成")
+        try:
+            window_list = [None if item.strip() == 'all' else int(item) for item in windows.split(',') if item.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="windows 格式錯誤，例如 10,20,50,100,all")
+        if not window_list or len(window_list) > WINDOWS_MAX_COUNT:
+            raise HTTPException(status_code=400, detail=f"windows 需包含 1 到 {WINDOWS_MAX_COUNT} 個期數")
+        if len(set(window_list)) != len(window_list):
+            raise HTTPException(status_code=400, detail="windows 不可重複")
+        if any(window is not None and not 3 <= window <= ANALYSIS_WINDOW_MAX for window in window_list):
+            raise HTTPException(status_code=400, detail=f"分析期數需介於 3 到 {ANALYSIS_WINDOW_MAX}")
+        if trend_periods is not None and not 1 <= trend_periods <= ANALYSIS_WINDOW_MAX:
+            raise HTTPException(status_code=400, detail=f"trend_periods 需介於 1 到 {ANALYSIS_WINDOW_MAX}")
+        
+        cache_key = f"windows:{','.join(str(window) for window in window_list)}:{trend_periods}"
+        version = await read_data_version()
+        payload = analysis_cache.get(cache_key, version)
+        if payload is None:
+            payload = await run_heavy(
+                analysis_cache.get_or_compute, cache_key, version,
+                lambda: prepare_payload(get_analyzer().analyze_windows(window_list, trend_periods=trend_periods))
+            )
+        if not payload:
+            raise HTTPException(status_code=404, detail="歷史資料不足，無法進行分析")
+        
+        return build_response(request, payload)
+    
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"背景分析失敗: {e}")
+        raise HTTPException(status_code=500, detail=f"取得多期數分析失敗: {str(e)}")
+
+def prepare_payload(result: Optional[dict]) -> Optional[PreparedPayload]:
+    """將分析結果保存為可直接輸出的回應內容（沒有結果時回傳 None，不寫入快取）"""
+    return PreparedPayload(result) if result else None
+
+@app.post("/api/analyze", summary="重新執行分析")
+async def run_analysis_endpoint(request: Request):
+    """手動觸發重新分析"""
+    job = await run_job("analyze")
+    if not job.is_finished:
+        return job_accepted(job)
+    if job.error:
+        raise HTTPException(status_code=500, detail=f"分析失敗: {job.error}")
+    return build_response(request, {"success": True, "message": "分析完成", **job.result})
+
+@app.get("/metrics", response_class=PlainTextResponse, summary="效能指標")
+async def metrics_endpoint():
+    """以 Prometheus 文字格式輸出各階段與各路由的耗時直方圖"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # 健康檢查端點
 @app.get("/health", summary="健康檢查")
@@ -327,7 +602,7 @@ async def health_check():
     """API 健康檢查"""
     try:
         # 檢查資料庫連線
-        total_draws = db_manager.get_total_draws_count()
+        total_draws = await run_db(db_manager.get_total_draws_count)
         
         return {
             "status": "healthy",
@@ -343,6 +618,7 @@ async def health_check():
         }
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
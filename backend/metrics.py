@@ -0,0 +1,124 @@
+"""
+效能指標 - 記錄分析階段、資料庫呼叫、爬蟲月份與 API 請求的耗時，以 Prometheus 文字格式輸出
+"""
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+# 設為 0 可完全停用計時
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# 直方圖的上界（秒），涵蓋快取命中的毫秒級請求到數十秒的完整爬取
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """依標籤分組的累積直方圖，與 Prometheus histogram 的格式相同"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # 標籤值 -> [各區間次數..., +Inf 區間次數, 總和]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        """記錄一次觀測值（秒）"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        """輸出 Prometheus 文字格式的各行"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+
+        for labels, series in sorted(snapshot.items()):
+            label_text = ",".join(
+                f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)
+            )
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+def _escape(value: str) -> str:
+    """跳脫標籤值中的反斜線、引號與換行"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+stage_duration = Histogram(
+    "lottery_stage_duration_seconds",
+    "Duration of analyzer stages, database calls and crawler month fetches",
+    ("stage",)
+)
+request_duration = Histogram(
+    "lottery_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ("method", "route", "status")
+)
+
+class timed:
+    """記錄區塊或函式的耗時，可作為 context manager 或裝飾器使用
+
+        with timed("analysis.frequency"):
+            ...
+
+        @timed("db.get_all_draws")
+        def get_all_draws(...):
+            ...
+    """
+
+    __slots__ = ("stage", "_started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._started: Optional[float] = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if METRICS_ENABLED:
+            stage_duration.observe(time.perf_counter() - self._started, self.stage)
+        return False
+
+    def __call__(self, function):
+        stage = self.stage
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not METRICS_ENABLED:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stage_duration.observe(time.perf_counter() - started, stage)
+        return wrapper
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    """記錄一次 HTTP 請求的耗時"""
+    if METRICS_ENABLED:
+        request_duration.observe(seconds, method, route, str(status))
+
+def render_metrics() -> str:
+    """輸出所有指標的 Prometheus 文字格式"""
+    lines = stage_duration.render() + request_duration.render()
+    return "\n".join(lines) + "\n"
@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Integer, String, Date, JSON, DateTime, create_engine
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, JSON, DateTime, Boolean, ForeignKey, Index, create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 import os
+from logging_config import get_logger
 
 Base = declarative_base()
+logger = get_logger("models")
 
 class LotteryDraw(Base):
     __tablename__ = "lottery_draws"
@@ -14,9 +16,32 @@ class LotteryDraw(Base):
     draw_date = Column(Date, index=True)  # 開獎日期
     numbers = Column(JSON)  # 開獎號碼 [1, 12, 23, 25, 33, 35]
     special_number = Column(Integer)  # 特別號
+    sequence = Column(Integer, index=True)  # 依期數排序的連續期序（從 0 開始），跨年度也連續
+    number_mask = Column(BigInteger)  # 開獎號碼位元遮罩，號碼 n 對應第 n-1 位元
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class DrawNumber(Base):
+    __tablename__ = "draw_numbers"
+    
+    # 正規化的開獎號碼，每期 6 列，供 SQL 直接彙總
+    draw_id = Column(Integer, ForeignKey("lottery_draws.id", ondelete="CASCADE"), primary_key=True)
+    number = Column(Integer, primary_key=True)
+    
+    __table_args__ = (
+        Index("ix_draw_numbers_number_draw_id", "number", "draw_id"),
+    )
+
+class NumberStatistic(Base):
+    __tablename__ = "number_statistics"
+    
+    # 統計彙總：kind 為 "number"（號碼 1-38）、"special"（特別號 1-8）或 "total"（number 為 0）
+    kind = Column(String(10), primary_key=True)
+    number = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0)  # 出現次數；total 列為總期數
+    first_date = Column(Date)  # 第一次出現的開獎日期
+    last_date = Column(Date)  # 最後一次出現的開獎日期
+
 class AnalysisResult(Base):
     __tablename__ = "analysis_results"
     
@@ -28,6 +53,45 @@ class AnalysisResult(Base):
     total_periods = Column(Integer)  # 分析的總期數
     analysis_date = Column(DateTime, default=datetime.utcnow)
 
+class AnalysisState(Base):
+    __tablename__ = "analysis_state"
+    
+    id = Column(Integer, primary_key=True)
+    state = Column(JSON)  # 增量統計狀態（次數、最後出現期序、最近期數緩衝區）
+    is_stale = Column(Boolean, default=False)  # 歷史資料被改寫時需完整重算
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CrawlMonth(Base):
+    __tablename__ = "crawl_months"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    year_month = Column(String(7), unique=True, index=True)  # 年月 例如: "2024-01"
+    draw_count = Column(Integer, default=0)  # 該月取得的開獎筆數
+    is_complete = Column(Boolean, default=False)  # 已結束的月份且成功取得資料
+    fetched_at = Column(DateTime, default=datetime.utcnow)
+
+class DataCounter(Base):
+    __tablename__ = "data_counters"
+    
+    name = Column(String(50), primary_key=True)  # 計數器名稱 例如: "lottery_draws"
+    value = Column(Integer, default=0)
+
+class JobRecord(Base):
+    __tablename__ = "job_records"
+    
+    # 背景工作的狀態與進度，讓其他 worker 或執行個體也能查詢
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(30))  # 工作類型 例如: "update"
+    params = Column(JSON)
+    trigger = Column(String(20))  # manual 或 schedule
+    status = Column(String(20))  # queued、running、succeeded、failed
+    created_at = Column(DateTime, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    progress = Column(JSON)
+    result = Column(JSON)
+    error = Column(Text)
+
 # 資料庫設置
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./lottery.db")
 
@@ -45,6 +109,28 @@ def get_database():
     finally:
         db.close()
 
+# 後來新增、需要在既有資料庫補上的欄位: (資料表, 欄位, SQL 型別)
+ADDED_COLUMNS = [
+    ("lottery_draws", "sequence", "INTEGER"),
+    ("lottery_draws", "number_mask", "BIGINT"),
+]
+
 def create_tables():
     """建立所有資料表"""
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    migrate_schema()
+
+def migrate_schema():
+    """為既有資料表補上新增欄位（create_all 不會修改已存在的資料表）"""
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+    with engine.begin() as conn:
+        for table, column, column_type in ADDED_COLUMNS:
+            if table not in existing_tables:
+                continue
+            columns = {col['name'] for col in inspector.get_columns(table)}
+            if column in columns:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"))
+            logger.info("已新增欄位", extra={'table': table, 'column': column})
\ No newline at end of file
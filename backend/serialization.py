@@ -0,0 +1,94 @@
+"""
+回應序列化 - 以 orjson 輸出 JSON，依 Accept 選用 MessagePack，超過門檻的內容以 gzip 壓縮
+
+快取的分析結果以 PreparedPayload 保存，各種編碼只在第一次請求時產生，之後直接回傳相同的位元組。
+"""
+import gzip
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import Request, Response
+
+try:
+    import msgpack  # 選用：未安裝時只提供 JSON
+except ImportError:
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_ACCEPT_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+
+# 超過此位元組數的回應才壓縮
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+
+# 號碼頻率等字典以整數為鍵，輸出為字串鍵（與標準 JSON 編碼相同）
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+def dumps_json(data: Any) -> bytes:
+    """以 orjson 序列化"""
+    return orjson.dumps(data, option=ORJSON_OPTIONS)
+
+def negotiate_media_type(request: Request) -> str:
+    """依 Accept 標頭選擇輸出格式，未安裝 msgpack 時一律為 JSON"""
+    if msgpack is not None:
+        accept = request.headers.get("accept", "")
+        if any(media_type in accept for media_type in MSGPACK_ACCEPT_TYPES):
+            return MSGPACK_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+def accepts_gzip(request: Request) -> bool:
+    """檢查 Accept-Encoding 是否接受 gzip"""
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+class PreparedPayload:
+    """預先序列化的回應內容，各編碼在第一次使用時產生並保存"""
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self._bodies: Dict[tuple, bytes] = {}
+        self._lock = threading.RLock()  # gzip 編碼會再取得未壓縮的內容
+
+    def body(self, media_type: str = JSON_MEDIA_TYPE, compressed: bool = False) -> bytes:
+        key = (media_type, compressed)
+        body = self._bodies.get(key)
+        if body is None:
+            with self._lock:
+                body = self._bodies.get(key)
+                if body is None:
+                    body = self._encode(media_type, compressed)
+                    self._bodies[key] = body
+        return body
+
+    def _encode(self, media_type: str, compressed: bool) -> bytes:
+        if compressed:
+            return gzip.compress(self.body(media_type), compresslevel=GZIP_LEVEL)
+        json_body = self._bodies.get((JSON_MEDIA_TYPE, False)) or dumps_json(self.data)
+        if media_type == MSGPACK_MEDIA_TYPE:
+            # 由 JSON 結果轉換，讓兩種格式的鍵與日期表示方式一致
+            return msgpack.packb(orjson.loads(json_body))
+        return json_body
+
+def build_response(request: Request, payload: Any, status_code: int = 200,
+                   headers: Optional[Dict[str, str]] = None) -> Response:
+    """依請求的 Accept 與 Accept-Encoding 建立回應；payload 可為 PreparedPayload 或一般資料"""
+    if not isinstance(payload, PreparedPayload):
+        payload = PreparedPayload(payload)
+
+    media_type = negotiate_media_type(request)
+    body = payload.body(media_type)
+    response_headers = {"Vary": "Accept, Accept-Encoding"}
+    if headers:
+        response_headers.update(headers)
+
+    if len(body) >= GZIP_MIN_SIZE and accepts_gzip(request):
+        body = payload.body(media_type, compressed=True)
+        response_headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=response_headers)
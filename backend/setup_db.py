@@ -106,6 +106,12 @@ def setup_database():
     return True
 
 if __name__ == "__main__":
+    if "--rebuild-statistics" in sys.argv:
+        # 修復用：由開獎資料重建統計彙總與增量分析狀態
+        success = db_manager.rebuild_statistics()
+        db_manager.rebuild_analysis_state()
+        sys.exit(0 if success else 1)
+    
     try:
         success = setup_database()
         if success:
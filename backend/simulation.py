@@ -0,0 +1,209 @@
+"""
+蒙地卡羅模擬 - 以大量隨機開獎（38 選 6 加 8 選 1）估計號碼組合的命中分佈，作為推薦號碼與隨機選號的比較基準
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from math import comb, sqrt
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+NUMBER_COUNT = 38  # 威力彩號碼 1-38
+PICK_COUNT = 6  # 每期開出 6 個號碼
+SPECIAL_COUNT = 8  # 特別號 1-8
+
+SIMULATION_MEMORY_MB = int(os.getenv("SIMULATION_MEMORY_MB", "256"))  # 每個行程的記憶體預算
+SIMULATION_TARGET_DRAWS_PER_SECOND = int(os.getenv("SIMULATION_TARGET_DRAWS_PER_SECOND", "1000000"))
+BATCH_DRAWS = 1_000_000  # 每個批次（獨立亂數種子）的模擬期數
+Z_95 = 1.959963984540054
+
+# 每期暫存的位元組數：float32 亂數鍵、argpartition 索引、前 6 欄索引的連續複本、取出的 6 個號碼位元、
+# 開獎遮罩（本塊與上一塊）與特別號
+_BYTES_PER_DRAW = NUMBER_COUNT * 4 + NUMBER_COUNT * 8 + PICK_COUNT * 8 * 2 + 8 * 2 + 2
+# 每期每組號碼的暫存：AND 結果、popcount 的位移與遮罩暫存、加上位移的 int64 命中索引、
+# uint8 命中數（本塊與上一塊）與特別號比較結果
+_BYTES_PER_SET_DRAW = 8 + 8 * 2 + 8 + 1 * 2 + 1
+# 16 位元查表計算 popcount（NumPy 1.x 沒有 bitwise_count）
+_POPCOUNT = np.array([bin(value).count('1') for value in range(1 << 16)], dtype=np.uint8)
+
+def sets_to_masks(number_sets: Sequence[Sequence[int]]) -> np.ndarray:
+    """將號碼組合轉為位元遮罩（號碼 n 對應第 n-1 位元，與 number_mask 欄位相同）"""
+    masks = np.zeros(len(number_sets), dtype=np.uint64)
+    for index, numbers in enumerate(number_sets):
+        mask = 0
+        for number in numbers:
+            mask |= 1 << (number - 1)
+        masks[index] = mask
+    return masks
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """計算 38 位元以內遮罩的 1 位元數（與 sets_to_masks 產生的遮罩搭配使用）"""
+    low = np.uint64(0xFFFF)
+    return (_POPCOUNT[values & low]
+            + _POPCOUNT[(values >> np.uint64(16)) & low]
+            + _POPCOUNT[values >> np.uint64(32)])
+
+def chunk_size_for(set_count: int, memory_mb: int = SIMULATION_MEMORY_MB) -> int:
+    """依記憶體預算計算每次向量化處理的期數"""
+    bytes_per_draw = _BYTES_PER_DRAW + set_count * _BYTES_PER_SET_DRAW
+    return max(1000, memory_mb * 1024 * 1024 // bytes_per_draw)
+
+def _simulate_batch(task):
+    """模擬一個批次，回傳各組命中 0-6 個號碼的次數與特別號命中次數（可在子行程中執行）"""
+    masks, specials, draws, seed_sequence, chunk_size = task
+    # 號碼與特別號使用各自的亂數流，結果不受分塊大小影響
+    number_seed, special_seed = seed_sequence.spawn(2)
+    number_rng = np.random.default_rng(number_seed)
+    special_rng = np.random.default_rng(special_seed)
+
+    set_count = len(masks)
+    offsets = (np.arange(set_count, dtype=np.intp) * (PICK_COUNT + 1))[:, None]
+    hit_counts = np.zeros(set_count * (PICK_COUNT + 1), dtype=np.int64)
+    special_hits = np.zeros(set_count, dtype=np.int64)
+    keys = np.empty((min(chunk_size, draws), NUMBER_COUNT), dtype=np.float32)
+    bits = np.left_shift(np.uint64(1), np.arange(NUMBER_COUNT, dtype=np.uint64))
+
+    remaining = draws
+    while remaining:
+        size = min(chunk_size, remaining)
+        chunk_keys = keys[:size]
+        number_rng.random(out=chunk_keys, dtype=np.float32)
+        # 亂數鍵最小的 6 欄即為不重複的 6 個號碼；不保留 argpartition 的完整索引陣列，
+        # 避免上一塊的索引與下一塊同時存在
+        draw_masks = bits[np.argpartition(chunk_keys, PICK_COUNT, axis=1)[:, :PICK_COUNT]].sum(axis=1, dtype=np.uint64)
+
+        hits = popcount(draw_masks[None, :] & masks[:, None])
+        hit_counts += np.bincount((hits + offsets).ravel(), minlength=hit_counts.size)
+
+        drawn_specials = special_rng.integers(1, SPECIAL_COUNT + 1, size=size, dtype=np.int8)
+        special_hits += (drawn_specials[None, :] == specials[:, None]).sum(axis=1)
+
+        remaining -= size
+
+    return hit_counts.reshape(set_count, PICK_COUNT + 1), special_hits
+
+def simulate_sets(number_sets: Sequence[Sequence[int]], draws: int = BATCH_DRAWS,
+                  specials: Optional[Sequence[Optional[int]]] = None, seed: int = 0,
+                  processes: Optional[int] = None, memory_mb: int = SIMULATION_MEMORY_MB) -> Dict:
+    """模擬 draws 期隨機開獎，回傳每組號碼的命中分佈與 95% 信賴區間
+
+    相同 seed 與 draws 的結果固定，不受行程數與記憶體預算影響。
+    """
+    if not number_sets:
+        raise ValueError("至少需要一組號碼")
+    for numbers in number_sets:
+        if len(set(numbers)) != PICK_COUNT or not all(1 <= number <= NUMBER_COUNT for number in numbers):
+            raise ValueError(f"號碼組合必須為 {PICK_COUNT} 個 1-{NUMBER_COUNT} 的不重複號碼: {numbers}")
+    if draws < 1:
+        raise ValueError(f"模擬期數至少為 1: {draws}")
+
+    masks = sets_to_masks(number_sets)
+    special_array = np.array([special or 0 for special in (specials or [None] * len(number_sets))], dtype=np.int8)
+    chunk_size = chunk_size_for(len(number_sets), memory_mb)
+
+    batch_sizes = [BATCH_DRAWS] * (draws // BATCH_DRAWS)
+    if draws % BATCH_DRAWS:
+        batch_sizes.append(draws % BATCH_DRAWS)
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    tasks = [
+        (masks, special_array, size, seed_sequence, chunk_size)
+        for size, seed_sequence in zip(batch_sizes, seeds)
+    ]
+
+    workers = min(processes or os.cpu_count() or 1, len(tasks))
+    started = time.perf_counter()
+    if workers <= 1:
+        results = [_simulate_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_simulate_batch, tasks))
+    elapsed = time.perf_counter() - started
+
+    hit_counts = sum(result[0] for result in results)
+    special_hits = sum(result[1] for result in results)
+    draws_per_second = draws / elapsed if elapsed else None
+
+    return {
+        'draws': draws,
+        'seed': seed,
+        'chunk_size': chunk_size,
+        'processes': max(workers, 1),
+        'elapsed_seconds': round(elapsed, 3),
+        'draws_per_second': round(draws_per_second) if draws_per_second else None,
+        'target_draws_per_second': SIMULATION_TARGET_DRAWS_PER_SECOND,
+        'meets_target': bool(draws_per_second and draws_per_second >= SIMULATION_TARGET_DRAWS_PER_SECOND),
+        'expected': {
+            'mean_hits': round(PICK_COUNT * PICK_COUNT / NUMBER_COUNT, 4),
+            'zero_hit_rate': round(comb(NUMBER_COUNT - PICK_COUNT, PICK_COUNT) / comb(NUMBER_COUNT, PICK_COUNT), 4),
+            'special_hit_rate': round(1 / SPECIAL_COUNT, 4)
+        },
+        'sets': [
+            _build_set_report(numbers, int(special_array[index]) or None, hit_counts[index],
+                              int(special_hits[index]), draws)
+            for index, numbers in enumerate(number_sets)
+        ]
+    }
+
+def simulate_analysis(analysis: Dict, draws: int = BATCH_DRAWS, **kwargs) -> Dict:
+    """模擬 analyze_avoid_numbers 產生的避免號碼與可能開出號碼組合"""
+    avoid_sets = analysis['avoid_number_sets']
+    likely_sets = analysis['likely_number_sets']
+    result = simulate_sets(avoid_sets + likely_sets, draws=draws, **kwargs)
+
+    set_reports = result.pop('sets')
+    result['avoid_sets'] = set_reports[:len(avoid_sets)]
+    result['likely_sets'] = set_reports[len(avoid_sets):]
+    return result
+
+def _build_set_report(numbers: Sequence[int], special: Optional[int], distribution: np.ndarray,
+                      special_hits: int, draws: int) -> Dict:
+    """整理單組號碼的命中分佈、平均命中數與信賴區間"""
+    hits_axis = np.arange(PICK_COUNT + 1)
+    mean = float((distribution * hits_axis).sum() / draws)
+    variance = float((distribution * (hits_axis - mean) ** 2).sum() / max(draws - 1, 1))
+    margin = Z_95 * sqrt(variance / draws)
+
+    report = {
+        'numbers': sorted(int(number) for number in numbers),
+        'hit_distribution': distribution.tolist(),
+        'mean_hits': round(mean, 5),
+        'mean_hits_ci': [round(mean - margin, 5), round(mean + margin, 5)],
+        'zero_hit_rate': round(int(distribution[0]) / draws, 5),
+        'zero_hit_rate_ci': _wilson_interval(int(distribution[0]), draws)
+    }
+    if special:
+        report['special'] = special
+        report['special_hit_rate'] = round(special_hits / draws, 5)
+        report['special_hit_rate_ci'] = _wilson_interval(special_hits, draws)
+    return report
+
+def _wilson_interval(successes: int, trials: int) -> List[float]:
+    """比例的 Wilson 95% 信賴區間"""
+    rate = successes / trials
+    denominator = 1 + Z_95 ** 2 / trials
+    center = (rate + Z_95 ** 2 / (2 * trials)) / denominator
+    margin = Z_95 * sqrt(rate * (1 - rate) / trials + Z_95 ** 2 / (4 * trials ** 2)) / denominator
+    return [round(center - margin, 5), round(center + margin, 5)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="威力彩推薦號碼蒙地卡羅模擬")
+    parser.add_argument("--draws", type=int, default=BATCH_DRAWS, help="模擬期數")
+    parser.add_argument("--sets", default=None, help="號碼組合，例如 1,2,3,4,5,6;7,8,9,10,11,12（預設使用最新分析結果）")
+    parser.add_argument("--processes", type=int, default=None, help="並行行程數")
+    parser.add_argument("--seed", type=int, default=0, help="隨機種子")
+    parser.add_argument("--memory-mb", type=int, default=SIMULATION_MEMORY_MB, help="每個行程的記憶體預算（MB）")
+    args = parser.parse_args()
+    if args.draws < 1:
+        parser.error("--draws 至少為 1")
+
+    options = dict(draws=args.draws, seed=args.seed, processes=args.processes, memory_mb=args.memory_mb)
+    if args.sets:
+        number_sets = [[int(number) for number in group.split(',')] for group in args.sets.split(';')]
+        result = simulate_sets(number_sets, **options)
+    else:
+        from analyzer import analyzer
+        result = simulate_analysis(analyzer.analyze_avoid_numbers(), **options)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
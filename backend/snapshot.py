@@ -0,0 +1,73 @@
+"""
+開獎資料快照 - 以 NumPy .npz 欄位格式保存完整歷史，新環境不需連網即可在一秒內載入
+
+快照欄位：
+    period          期數（字串）
+    ordinal         期序（0 為最早一期，與 lottery_draws.sequence 相同）
+    draw_date       開獎日期（datetime64[D]）
+    numbers         開獎號碼（N x 6）
+    special_number  特別號
+"""
+import argparse
+import json
+import os
+from datetime import date
+from typing import Dict, List
+
+import numpy as np
+
+SNAPSHOT_FORMAT_VERSION = 1
+PICK_COUNT = 6  # 每期開出 6 個號碼
+
+# 新環境初始載入時使用的快照檔（未設定或檔案不存在時直接爬取）
+SEED_SNAPSHOT = os.getenv("SEED_SNAPSHOT")
+
+def write_snapshot(path: str, rows: List[tuple]):
+    """寫入快照；rows 為依期序排列的 (期數, 開獎日期, 號碼, 特別號)"""
+    count = len(rows)
+    periods = np.array([row[0] for row in rows], dtype=str)
+    draw_dates = np.array([row[1] for row in rows], dtype="datetime64[D]")
+    numbers = np.array([row[2] for row in rows], dtype=np.int8).reshape(count, PICK_COUNT)
+    special_numbers = np.array([row[3] for row in rows], dtype=np.int8)
+
+    # np.savez_compressed 會自動補上 .npz 副檔名，先寫入檔案物件以保留原本的路徑
+    with open(path, "wb") as file:
+        np.savez_compressed(
+            file,
+            format_version=np.array(SNAPSHOT_FORMAT_VERSION),
+            period=periods,
+            ordinal=np.arange(count, dtype=np.int32),
+            draw_date=draw_dates,
+            numbers=numbers,
+            special_number=special_numbers
+        )
+
+def read_snapshot(path: str) -> List[Dict]:
+    """讀取快照，回傳依期序排列、與爬蟲輸出格式相同的開獎資料"""
+    with np.load(path, allow_pickle=False) as data:
+        version = int(data["format_version"])
+        if version != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"不支援的快照格式版本: {version}")
+        order = np.argsort(data["ordinal"], kind="stable")
+        periods = data["period"][order].tolist()
+        draw_dates = data["draw_date"][order].astype(date).tolist()
+        numbers = data["numbers"][order].tolist()
+        special_numbers = data["special_number"][order].tolist()
+
+    return [
+        {'period': period, 'date': draw_date, 'numbers': draw_numbers, 'special_number': special_number}
+        for period, draw_date, draw_numbers, special_number in zip(periods, draw_dates, numbers, special_numbers)
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="匯出或匯入開獎資料快照（.npz）")
+    parser.add_argument("command", choices=("export", "import"), help="export 匯出目前資料庫，import 載入快照")
+    parser.add_argument("path", help="快照檔案路徑")
+    args = parser.parse_args()
+
+    from database import db_manager
+    if args.command == "export":
+        result = db_manager.export_snapshot(args.path)
+    else:
+        result = db_manager.import_snapshot(args.path)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,43 @@
+"""
+測試共用設定 - 匯入任何後端模組前先指向暫存 SQLite 資料庫，並關閉排程與延遲初始化
+
+在 backend 目錄下執行：python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+_temp_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_temp_dir.name, 'test.db')}"
+os.environ["LAZY_INIT"] = "0"
+os.environ["CRAWL_SCHEDULE_ENABLED"] = "0"
+os.environ["DATA_VERSION_TTL"] = "0"
+os.environ["LOG_LEVEL"] = "WARNING"
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+from benchmarks.synthetic import generate_draws, load_draws  # noqa: E402
+from cache import analysis_cache  # noqa: E402
+from database import db_manager  # noqa: E402
+
+@pytest.fixture
+def manager():
+    """清空資料後的 DatabaseManager"""
+    assert db_manager.clear_all_data()
+    analysis_cache.invalidate()
+    return db_manager
+
+@pytest.fixture
+def synthetic_draws():
+    """300 期固定種子的合成開獎資料（依期數遞增）"""
+    return generate_draws(300, seed=1)
+
+@pytest.fixture
+def seeded(manager, synthetic_draws):
+    """已載入合成資料的 DatabaseManager"""
+    load_draws(manager, synthetic_draws)
+    return manager
@@ -0,0 +1,53 @@
+"""
+增量分析 - 逐期或批次寫入後，由增量狀態產生的分析結果必須與完整重算相同
+"""
+from analyzer import analyzer
+
+COMPARED_KEYS = ('frequency_analysis', 'gap_analysis', 'trend_analysis', 'special_analysis', 'total_periods')
+
+def _assert_incremental_matches_full():
+    incremental = analyzer.analyze_avoid_numbers()
+    full = analyzer.analyze_avoid_numbers(full_recompute=True)
+    for key in COMPARED_KEYS:
+        assert incremental[key] == full[key], key
+
+def test_incremental_matches_full_after_single_inserts(manager, synthetic_draws):
+    manager.bulk_upsert_draws(synthetic_draws[:200])
+    analyzer.analyze_avoid_numbers(full_recompute=True)
+
+    for draw in synthetic_draws[200:230]:
+        assert manager.add_lottery_draw(draw['period'], draw['date'], draw['numbers'], draw['special_number'])
+    assert manager.get_analysis_state() is not None
+    _assert_incremental_matches_full()
+
+def test_incremental_matches_full_after_bulk_upserts(manager, synthetic_draws):
+    manager.bulk_upsert_draws(synthetic_draws[:150])
+    analyzer.analyze_avoid_numbers(full_recompute=True)
+
+    for start in range(150, 300, 50):
+        manager.bulk_upsert_draws(synthetic_draws[start:start + 50])
+    assert manager.get_analysis_state() is not None
+    _assert_incremental_matches_full()
+
+def test_out_of_order_insert_marks_state_stale(manager, synthetic_draws):
+    manager.bulk_upsert_draws(synthetic_draws[10:100])
+    analyzer.analyze_avoid_numbers(full_recompute=True)
+
+    # 插入較舊的期數需要重新編排期序，增量狀態必須失效
+    draw = synthetic_draws[0]
+    manager.add_lottery_draw(draw['period'], draw['date'], draw['numbers'], draw['special_number'])
+    assert manager.get_analysis_state() is None
+    _assert_incremental_matches_full()
+
+def test_rebuild_with_outdated_draws_keeps_state_stale(manager, synthetic_draws):
+    manager.bulk_upsert_draws(synthetic_draws[:100])
+    loaded = manager.get_all_draws()[::-1]
+
+    # 讀取後才寫入的資料不在 loaded 中，重建結果不可覆蓋為最新狀態
+    manager.bulk_upsert_draws(synthetic_draws[100:110])
+    stats = manager.rebuild_analysis_state(loaded)
+    assert stats.total_draws == 100
+    assert manager.get_analysis_state() is None
+
+    assert manager.rebuild_analysis_state().total_draws == 110
+    assert manager.get_analysis_state().total_draws == 110
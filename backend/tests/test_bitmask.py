@@ -0,0 +1,30 @@
+"""
+號碼位元遮罩與正規化號碼 - SQL 彙總結果必須與直接計算開獎資料相同
+"""
+from collections import Counter
+
+from database import numbers_to_mask
+
+def test_numbers_to_mask():
+    assert numbers_to_mask([1]) == 1
+    assert numbers_to_mask([38]) == 1 << 37
+    assert numbers_to_mask([1, 2, 3, 4, 5, 6]) == 0b111111
+
+def test_count_draws_with_numbers_uses_mask(seeded, synthetic_draws):
+    for numbers in ([7], [3, 17], [1, 2, 3]):
+        expected = sum(1 for draw in synthetic_draws if set(numbers) <= set(draw['numbers']))
+        assert seeded.count_draws_with_numbers(numbers) == expected
+
+    start, end = synthetic_draws[100]['date'], synthetic_draws[199]['date']
+    expected = sum(
+        1 for draw in synthetic_draws[100:200] if {3, 17} <= set(draw['numbers'])
+    )
+    assert seeded.count_draws_with_numbers([3, 17], start_date=start, end_date=end) == expected
+
+def test_number_frequency_and_periods_with_number(seeded, synthetic_draws):
+    expected = Counter(number for draw in synthetic_draws for number in draw['numbers'])
+    assert seeded.get_number_frequency() == dict(expected)
+
+    periods = [draw['period'] for draw in reversed(synthetic_draws) if 5 in draw['numbers']]
+    assert seeded.get_periods_with_number(5) == periods
+    assert seeded.get_periods_with_number(5, limit=3) == periods[:3]
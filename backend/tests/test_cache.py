@@ -0,0 +1,27 @@
+"""
+分析快取 - 依查詢參數產生的快取名稱有數量上限，超過時移除最久未使用的
+"""
+from cache import VersionedCache
+
+def test_least_recently_used_entry_is_evicted():
+    cache = VersionedCache(max_entries=2)
+    cache.get_or_compute("pairs:10", 1, lambda: "a")
+    cache.get_or_compute("pairs:20", 1, lambda: "b")
+    assert cache.get("pairs:10", 1) == "a"
+
+    cache.get_or_compute("pairs:30", 1, lambda: "c")
+    assert len(cache) == 2
+    assert cache.get("pairs:20", 1) is None
+    assert cache.get("pairs:10", 1) == "a"
+    assert cache.get("pairs:30", 1) == "c"
+
+def test_window_analysis_rejects_unbounded_keys(seeded):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    client = TestClient(main.app)
+    assert client.get("/api/analysis/windows", params={'windows': "10,all"}).status_code == 200
+    for windows in ("10,10", f"{main.ANALYSIS_WINDOW_MAX + 1}", ",".join(str(3 + n) for n in range(11))):
+        assert client.get("/api/analysis/windows", params={'windows': windows}).status_code == 400
+    assert client.get("/api/pairs", params={'window': main.ANALYSIS_WINDOW_MAX + 1}).status_code == 422
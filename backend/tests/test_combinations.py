@@ -0,0 +1,65 @@
+"""
+號碼組合評分 - top_combinations 的結果必須與「全部 C(38,6) 組依 (分數, 遮罩) 由高到低排序後依序挑選」相同
+"""
+import itertools
+
+import numpy as np
+import pytest
+
+from combinations import NUMBER_COUNT, PICK_COUNT, TOTAL_COMBINATIONS, mask_to_numbers, top_combinations
+
+@pytest.fixture(scope="module")
+def all_combinations():
+    """全部組合的號碼索引（0-37）與位元遮罩"""
+    indices = np.fromiter(
+        itertools.chain.from_iterable(itertools.combinations(range(NUMBER_COUNT), PICK_COUNT)),
+        dtype=np.int8, count=TOTAL_COMBINATIONS * PICK_COUNT
+    ).reshape(TOTAL_COMBINATIONS, PICK_COUNT)
+    masks = np.bitwise_or.reduce(np.left_shift(np.uint64(1), indices.astype(np.uint64)), axis=1)
+    return indices, masks
+
+def brute_force(all_combinations, number_scores, pair_matrix, pair_penalty, k, max_overlap):
+    indices, masks = all_combinations
+    scores = number_scores[indices].sum(axis=1)
+    for first, second in itertools.combinations(range(PICK_COUNT), 2):
+        scores -= pair_penalty * pair_matrix[indices[:, first], indices[:, second]]
+
+    selected = []
+    for index in np.lexsort((masks, scores))[::-1]:
+        mask = int(masks[index])
+        if all(bin(mask & chosen).count('1') <= max_overlap for _, chosen in selected):
+            selected.append((float(scores[index]), mask))
+            if len(selected) == k:
+                break
+    return [{'numbers': mask_to_numbers(mask), 'score': round(score, 4)} for score, mask in selected]
+
+def random_inputs(seed):
+    rng = np.random.default_rng(seed)
+    number_scores = rng.normal(size=NUMBER_COUNT)
+    pair_matrix = rng.normal(scale=0.2, size=(NUMBER_COUNT, NUMBER_COUNT))
+    pair_matrix = (pair_matrix + pair_matrix.T) / 2
+    np.fill_diagonal(pair_matrix, 0)
+    return number_scores, pair_matrix
+
+@pytest.mark.parametrize("pair_penalty", [0.0, 5.0, -5.0])
+def test_matches_brute_force(all_combinations, pair_penalty):
+    number_scores, pair_matrix = random_inputs(seed=7)
+    expected = brute_force(all_combinations, number_scores, pair_matrix, pair_penalty, k=10, max_overlap=2)
+    result = top_combinations(number_scores, pair_matrix, pair_penalty=pair_penalty, k=10, max_overlap=2, processes=1)
+    assert result == expected
+
+def test_small_pool_falls_back_to_all_combinations(all_combinations):
+    # 候選池太小時必須改為在全部組合中繼續挑選，結果仍與窮舉相同
+    number_scores, pair_matrix = random_inputs(seed=11)
+    expected = brute_force(all_combinations, number_scores, pair_matrix, 5.0, k=10, max_overlap=1)
+    result = top_combinations(number_scores, pair_matrix, pair_penalty=5.0, k=10, max_overlap=1,
+                              pool_size=20, processes=1)
+    assert result == expected
+
+def test_ties_are_broken_by_mask(all_combinations):
+    number_scores = np.ones(NUMBER_COUNT)
+    pair_matrix = np.zeros((NUMBER_COUNT, NUMBER_COUNT))
+    expected = brute_force(all_combinations, number_scores, pair_matrix, 0.0, k=5, max_overlap=3)
+    result = top_combinations(number_scores, pair_matrix, pair_penalty=0.0, k=5, max_overlap=3,
+                              pool_size=50, processes=1)
+    assert result == expected
@@ -0,0 +1,95 @@
+"""
+爬蟲 - 以本地替身取代 TaiwanLotteryCrawler，驗證並行爬取、限速與增量更新
+"""
+import threading
+from datetime import date
+
+from crawler import PowerballCrawler, TokenBucket
+
+class StubClient:
+    """與 TaiwanLotteryCrawler 相同介面的替身：每月 3 期，failing 中的月份拋出例外"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def super_lotto(self, year_month=None):
+        today = date.today()
+        year, month = (int(part) for part in year_month) if year_month else (today.year, today.month)
+        with self._lock:
+            self.calls.append(f"{year}-{month:02d}")
+        if (year, month) in self.failing:
+            raise ConnectionError("upstream unavailable")
+        return [
+            {
+                '期別': int(f"{year - 1911}{month:02d}{index + 1:02d}"),
+                '開獎日期': f"{year}-{month:02d}-{index * 7 + 1:02d}T00:00:00",
+                '第一區': [index + 1, 10, 20, 30, 35, 38 - index],
+                '第二區': index + 1
+            }
+            for index in range(3)
+        ]
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def make_crawler(client):
+    return PowerballCrawler(client=client, max_workers=4, requests_per_second=0)
+
+def test_token_bucket_limits_rate_after_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock, sleep=clock.sleep)
+    for _ in range(6):
+        bucket.acquire()
+    # 前 2 個請求使用突發容量，之後每個請求等待 0.5 秒
+    assert clock.sleeps == [0.5] * 4
+    assert clock.now == 2.0
+
+def test_failed_month_does_not_affect_others():
+    client = StubClient(failing={(2024, 3)})
+    crawler = make_crawler(client)
+    results = dict(
+        (tuple(year_month), draws)
+        for year_month, draws in crawler.fetch_months([["2024", "02"], ["2024", "03"], ["2024", "04"]])
+    )
+    assert results[("2024", "03")] is None
+    assert len(results[("2024", "02")]) == 3
+    assert len(results[("2024", "04")]) == 3
+
+def test_update_database_only_refetches_incomplete_months(manager):
+    client = StubClient()
+    crawler = make_crawler(client)
+    progress = {}
+
+    first = crawler.update_database(progress=lambda **values: progress.update(values))
+    months = len(crawler._full_month_list())
+    assert first['added_count'] == 3 * months
+    assert progress['months_total'] == months and progress['months_fetched'] == months
+
+    # 已結束的月份都已完整爬取，第二次只取當月
+    client.calls.clear()
+    second = crawler.update_database()
+    today = date.today()
+    assert client.calls == [f"{today.year}-{today.month:02d}"]
+    assert second['added_count'] == 0
+
+def test_failed_month_is_retried_on_next_update(manager):
+    client = StubClient(failing={(2024, 5)})
+    crawler = make_crawler(client)
+    crawler.update_database()
+
+    client.failing.clear()
+    client.calls.clear()
+    result = crawler.update_database()
+    assert "2024-05" in client.calls
+    assert result['added_count'] == 3
@@ -0,0 +1,18 @@
+"""
+資料版本 - 寫入開獎資料後版本遞增，總數快取隨之失效
+"""
+from datetime import date
+
+def test_total_count_and_data_version_follow_writes(seeded, synthetic_draws):
+    version = seeded.data_version
+    assert seeded.get_total_draws_count() == len(synthetic_draws)
+
+    assert seeded.add_lottery_draw("999001", date(2030, 1, 2), [1, 2, 3, 4, 5, 6], 1)
+    assert seeded.data_version > version
+    assert seeded.get_total_draws_count() == len(synthetic_draws) + 1
+
+def test_unchanged_upsert_keeps_version(seeded, synthetic_draws):
+    version = seeded.data_version
+    result = seeded.bulk_upsert_draws(synthetic_draws[:10])
+    assert result['unchanged_count'] == 10
+    assert seeded.data_version == version
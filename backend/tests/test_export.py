@@ -0,0 +1,26 @@
+"""
+串流匯出 - 依期序逐批讀取，CSV 與 NDJSON 格式與日期篩選
+"""
+from fastapi.testclient import TestClient
+
+import main
+
+def test_iter_draws_filters_by_date_in_sequence_order(seeded, synthetic_draws):
+    start, end = synthetic_draws[20]['date'], synthetic_draws[59]['date']
+    rows = [row for batch in seeded.iter_draws(start, end, batch_size=7) for row in batch]
+    assert [row[0] for row in rows] == [draw['period'] for draw in synthetic_draws[20:60]]
+    assert [row[1] for row in rows] == list(range(20, 60))
+
+def test_export_csv_and_ndjson(seeded, synthetic_draws):
+    client = TestClient(main.app)
+    response = client.get("/api/export", params={'format': 'csv'})
+    lines = response.text.splitlines()
+    assert response.headers['content-type'].startswith("text/csv")
+    assert lines[0].startswith("period,sequence,draw_date")
+    assert len(lines) == len(synthetic_draws) + 1
+
+    start, end = synthetic_draws[10]['date'], synthetic_draws[19]['date']
+    response = client.get("/api/export", params={'format': 'ndjson', 'from': str(start), 'to': str(end)})
+    assert len(response.text.splitlines()) == 10
+
+    assert client.get("/api/export", params={'format': 'xml'}).status_code == 400
@@ -0,0 +1,30 @@
+"""
+條件式請求 - 資料未變動時回應 304，寫入後 ETag 改變
+"""
+from fastapi.testclient import TestClient
+
+import main
+
+def test_history_etag_changes_after_write(seeded):
+    client = TestClient(main.app)
+    etag = client.get("/api/history").headers['etag']
+    assert client.get("/api/history", headers={'If-None-Match': etag}).status_code == 304
+
+    draw = seeded.get_latest_draw()
+    seeded.add_lottery_draw("999001", draw.draw_date, [1, 2, 3, 4, 5, 6], 1)
+    assert client.get("/api/history", headers={'If-None-Match': etag}).status_code == 200
+
+def test_latest_number_etag_depends_only_on_version_and_format(seeded):
+    from cache import analysis_cache
+
+    client = TestClient(main.app)
+    etag = client.get("/api/latest-number").headers['etag']
+
+    # 其他行程（或快取失效後）重新分析時分析時間不同，ETag 仍相同
+    analysis_cache.invalidate()
+    assert client.get("/api/latest-number").headers['etag'] == etag
+    assert client.get("/api/latest-number", headers={'If-None-Match': etag}).status_code == 304
+
+    draw = seeded.get_latest_draw()
+    seeded.add_lottery_draw("999001", draw.draw_date, [1, 2, 3, 4, 5, 6], 1)
+    assert client.get("/api/latest-number", headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,66 @@
+"""
+背景工作 - 工作紀錄寫入資料庫，其他行程的 JobManager 也能查詢
+"""
+import threading
+
+from jobs import JobManager
+
+def test_job_status_is_visible_to_other_managers(manager):
+    writer = JobManager(store=manager)
+    writer.register("echo", lambda job: {'value': job.params['value']})
+    job = writer.submit("echo", value=3)
+    assert job.wait(timeout=10)
+    writer.stop()
+
+    # 其他行程的 JobManager 只能經由資料庫查詢
+    reader = JobManager(store=manager)
+    record = reader.lookup(job.id)
+    assert record['status'] == "succeeded"
+    assert record['result'] == {'value': 3}
+    assert record['id'] in [item['id'] for item in reader.history(limit=5)]
+    assert reader.lookup("unknown") is None
+
+def test_duplicate_submit_returns_active_job(manager):
+    jobs = JobManager(store=manager)
+    gate = threading.Event()
+    jobs.register("blocked", lambda job: gate.wait(10))
+    first = jobs.submit("blocked", value=1)
+    assert jobs.submit("blocked", value=1) is first
+    assert jobs.submit("blocked", value=2) is not first
+    gate.set()
+    assert first.wait(timeout=10)
+    jobs.stop()
+
+def test_run_job_waits_without_blocking_and_times_out(manager, monkeypatch):
+    import asyncio
+
+    import main
+
+    gate = threading.Event()
+    main.job_manager.register("test-blocked", lambda job: gate.wait(10) and {'done': True})
+    monkeypatch.setattr(main, "JOB_WAIT_TIMEOUT", 0.2)
+
+    # 逾時回傳尚未完成的工作，由端點回應 202 與工作 ID
+    pending = asyncio.run(main.run_job("test-blocked"))
+    assert not pending.is_finished
+    response = main.job_accepted(pending)
+    assert response.status_code == 202
+
+    gate.set()
+    assert pending.wait(timeout=10)
+    finished = asyncio.run(main.run_job("test-blocked", value=1))
+    assert finished.is_finished and finished.result == {'done': True}
+
+def test_scheduled_slot_runs_in_one_process(manager):
+    first, second = JobManager(store=manager), JobManager(store=manager)
+    for jobs in (first, second):
+        jobs.register("update", lambda job: {'ok': True})
+
+    # 兩個行程的排程在同一時間觸發，只有先新增紀錄的行程加入工作
+    job = first.submit("update", trigger="schedule", job_id="update-202601012130")
+    assert job is not None
+    assert second.submit("update", trigger="schedule", job_id="update-202601012130") is None
+    assert job.wait(timeout=10)
+    assert second.lookup(job.id)['status'] == "succeeded"
+    first.stop()
+    second.stop()
@@ -0,0 +1,93 @@
+"""
+資料表升級 - 由最初版本的資料庫（只有 lottery_draws 與 analysis_results）啟動時，
+migrate_schema 補上新欄位，並補齊期序、位元遮罩、正規化號碼與統計彙總
+
+資料庫引擎在匯入 models 時建立，因此在子行程中以另一個資料庫執行。
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+from conftest import backend_dir
+
+BASELINE_SCHEMA = """
+CREATE TABLE lottery_draws (
+    id INTEGER NOT NULL PRIMARY KEY,
+    period VARCHAR(20),
+    draw_date DATE,
+    numbers JSON,
+    special_number INTEGER,
+    created_at DATETIME,
+    updated_at DATETIME
+);
+CREATE UNIQUE INDEX ix_lottery_draws_period ON lottery_draws (period);
+CREATE INDEX ix_lottery_draws_draw_date ON lottery_draws (draw_date);
+CREATE TABLE analysis_results (
+    id INTEGER NOT NULL PRIMARY KEY,
+    period VARCHAR(20),
+    avoid_numbers JSON,
+    frequency_data JSON,
+    gap_analysis JSON,
+    total_periods INTEGER,
+    analysis_date DATETIME
+);
+"""
+
+# 期數跨年度且插入順序不是期數順序
+BASELINE_DRAWS = [
+    ("113103", "2024-12-26", [3, 8, 15, 22, 30, 38], 2),
+    ("112001", "2023-01-02", [1, 2, 3, 4, 5, 6], 1),
+    ("113104", "2024-12-30", [1, 9, 15, 27, 33, 38], 8),
+    ("114001", "2025-01-02", [5, 6, 7, 20, 21, 22], 4),
+]
+
+CHECK_SCRIPT = """
+import json
+from database import db_manager
+from models import DrawNumber, LotteryDraw, NumberStatistic
+
+db = db_manager.get_db()
+try:
+    rows = db.query(LotteryDraw).order_by(LotteryDraw.sequence).all()
+    print(json.dumps({
+        'periods': [row.period for row in rows],
+        'sequences': [row.sequence for row in rows],
+        'masks': [row.number_mask for row in rows],
+        'draw_numbers': db.query(DrawNumber).count(),
+        'total': db.query(NumberStatistic).filter_by(kind='total').one().count,
+        'number_38': db.query(NumberStatistic).filter_by(kind='number', number=38).one().count,
+        'count_15_38': db_manager.count_draws_with_numbers([15, 38]),
+        'total_draws': db_manager.get_total_draws_count(),
+    }))
+finally:
+    db.close()
+"""
+
+def test_upgrade_from_baseline_schema(tmp_path):
+    path = tmp_path / "baseline.db"
+    connection = sqlite3.connect(path)
+    connection.executescript(BASELINE_SCHEMA)
+    connection.executemany(
+        "INSERT INTO lottery_draws (period, draw_date, numbers, special_number) VALUES (?, ?, ?, ?)",
+        [(period, draw_date, json.dumps(numbers), special) for period, draw_date, numbers, special in BASELINE_DRAWS]
+    )
+    connection.commit()
+    connection.close()
+
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}", LAZY_INIT="0")
+    completed = subprocess.run(
+        [sys.executable, "-c", CHECK_SCRIPT], cwd=backend_dir, env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    ordered = sorted(BASELINE_DRAWS)
+    assert result['periods'] == [draw[0] for draw in ordered]
+    assert result['sequences'] == [0, 1, 2, 3]
+    assert result['masks'] == [sum(1 << (number - 1) for number in draw[2]) for draw in ordered]
+    assert result['draw_numbers'] == 6 * len(BASELINE_DRAWS)
+    assert result['total'] == len(BASELINE_DRAWS)
+    assert result['number_38'] == 2
+    assert result['count_15_38'] == 2
+    assert result['total_draws'] == len(BASELINE_DRAWS)
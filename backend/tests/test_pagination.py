@@ -0,0 +1,56 @@
+"""
+歷史資料分頁 - 以期數為游標的分頁與 /api/history 的參數驗證
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+def test_keyset_pagination_walks_every_period_once(seeded, synthetic_draws):
+    periods = []
+    before = None
+    while True:
+        page = seeded.get_draws_before(before=before, limit=7)
+        periods.extend(draw.period for draw in page)
+        if len(page) < 7:
+            break
+        before = page[-1].period
+
+    expected = sorted((draw['period'] for draw in synthetic_draws), reverse=True)
+    assert periods == expected
+
+def test_keyset_pagination_matches_offset_pagination(seeded):
+    offset_pages = [draw.period for page in range(1, 4) for draw in seeded.get_draws_paginated(page=page, limit=10)]
+    keyset_pages = []
+    before = None
+    for _ in range(3):
+        page = seeded.get_draws_before(before=before, limit=10)
+        keyset_pages.extend(draw.period for draw in page)
+        before = page[-1].period
+    assert keyset_pages == offset_pages
+
+def test_history_cursor_walks_all_pages(seeded, synthetic_draws, client):
+    periods = []
+    before = None
+    while True:
+        params = {'limit': 40}
+        if before:
+            params['before'] = before
+        body = client.get("/api/history", params=params).json()
+        periods.extend(draw['period'] for draw in body['data'])
+        before = body['next_before']
+        if before is None:
+            break
+    assert periods == sorted((draw['period'] for draw in synthetic_draws), reverse=True)
+
+@pytest.mark.parametrize("query", ["limit=0", "limit=-1", f"limit={main.HISTORY_MAX_LIMIT + 1}", "page=0"])
+def test_history_rejects_invalid_paging(manager, client, query):
+    assert client.get(f"/api/history?{query}").status_code == 422
+
+def test_history_empty_page_has_no_cursor(seeded, client):
+    body = client.get("/api/history?page=1000&limit=10").json()
+    assert body['data'] == [] and body['next_before'] is None
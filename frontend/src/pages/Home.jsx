@@ -29,12 +29,24 @@ const Home = ({ navigateTo }) => {
     setUpdateMessage('');
     try {
       const result = await lotteryAPI.updateData();
-      if (result.success) {
-        setUpdateMessage(`✅ ${result.message}，更新了 ${result.updated_count} 筆資料`);
-        // 重新載入最新資料
-        await fetchLatestData();
-      } else {
+      if (!result.success) {
         setUpdateMessage(`❌ ${result.message}`);
+      } else {
+        // 更新在背景執行，輪詢工作進度直到完成
+        let job = await lotteryAPI.getJob(result.job_id);
+        while (job.status === 'queued' || job.status === 'running') {
+          const { months_fetched = 0, months_total } = job.progress;
+          setUpdateMessage(months_total ? `⏳ 更新中：已爬取 ${months_fetched}/${months_total} 個月份` : '⏳ 等待更新');
+          await new Promise((resolve) => setTimeout(resolve, 1000));
+          job = await lotteryAPI.getJob(result.job_id);
+        }
+        if (job.status === 'succeeded') {
+          setUpdateMessage(`✅ 資料更新完成，更新了 ${job.result.updated_count} 筆資料`);
+          // 重新載入最新資料
+          await fetchLatestData();
+        } else {
+          setUpdateMessage(`❌ 更新失敗: ${job.error}`);
+        }
       }
     } catch (err) {
       setUpdateMessage(`❌ 更新失敗: ${err.message}`);
@@ -69,6 +69,16 @@ export const lotteryAPI = {
     }
   },
   
+  // 取得背景工作進度
+  getJob: async (jobId) => {
+    try {
+      const response = await api.get(`/api/jobs/${jobId}`);
+      return response.data;
+    } catch (error) {
+      throw new Error(error.response?.data?.detail || '取得工作進度失敗');
+    }
+  },
+  
   // 取得統計資料
   getStatistics: async () => {
     try {